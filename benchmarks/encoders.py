@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput and output size of the output formats.
+
+Renders the bundled examples once, then writes each sound chunk by
+chunk with every writer of spectrographic.writers to a temporary file.
+Prints the encode throughput in seconds of sound per second and in MiB
+of samples per second, and the output size relative to the samples, e.g.
+
+python benchmarks/encoders.py --duration 60
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.writers import FORMATS, open_writer
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--height", type=int, default=150)
+    parser.add_argument("--chunk-samples", type=int, default=2 ** 16)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def encode(sound, sample_rate: int, path: Path, format: str, chunk_samples: int):
+    """Writes the sound chunk by chunk, returns the wall time."""
+    start = time.perf_counter()
+    with open_writer(path, sample_rate, len(sound), format) as writer:
+        for offset in range(0, len(sound), chunk_samples):
+            writer.write(sound[offset : offset + chunk_samples])
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+
+    print(
+        "{:>10}  {:>6}  {:>12}  {:>10}  {:>10}  {:>7}".format(
+            "image", "format", "sound s / s", "MiB / s", "size MiB", "ratio"
+        )
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for image in sorted(EXAMPLES.glob("*.png")):
+            sg = SpectroGraphic(
+                image,
+                height=args.height,
+                duration=args.duration,
+                normalization="bound",
+            )
+            sound = sg.sound_array
+
+            for format in FORMATS:
+                path = Path(directory) / ("sound." + format)
+                try:
+                    seconds = min(
+                        encode(sound, sg.SAMPLE_RATE, path, format, args.chunk_samples)
+                        for _ in range(args.repeat)
+                    )
+                except ImportError as error:
+                    print("{:>10}  {:>6}  {}".format(image.stem, format, error))
+                    continue
+
+                size = path.stat().st_size
+                print(
+                    "{:>10}  {:>6}  {:12.0f}  {:10.1f}  {:10.2f}  {:7.3f}".format(
+                        image.stem,
+                        format,
+                        sg.DURATION / seconds,
+                        sound.nbytes / seconds / 2 ** 20,
+                        size / 2 ** 20,
+                        size / sound.nbytes,
+                    ),
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
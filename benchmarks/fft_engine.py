@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+The fft engine against the bank engine at growing image heights.
+
+Renders one of the bundled examples with both engines and prints the
+best wall time of the fft engine, of the bank engine with the oscillator
+bank built as part of the render (cold) and with the bank already cached
+(warm), along with the largest difference of the samples, e.g.
+
+python benchmarks/fft_engine.py --heights 150 500 1000 2000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from spectrographic.banks import BANK_CACHE
+from spectrographic.base import SpectroGraphic
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", type=Path, default=EXAMPLES / "shrek.png")
+    parser.add_argument("--heights", type=int, nargs="+", default=[150, 500, 1000])
+    parser.add_argument("--duration", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def render(args, height: int, engine: str, cold: bool = False):
+    """Best wall time of rendering the sound with the engine, and the sound."""
+    best = float("inf")
+    for _ in range(args.repeat):
+        if cold:
+            BANK_CACHE.clear()
+        sg = SpectroGraphic(
+            args.image, height=height, duration=args.duration, engine=engine
+        )
+        start = time.perf_counter()
+        sound = sg.sound_array
+        best = min(best, time.perf_counter() - start)
+    return best, sound
+
+
+def main():
+    args = parse_args()
+
+    print("height  fft      bank cold  bank warm  max difference")
+    for height in args.heights:
+        fft, fft_sound = render(args, height, "fft")
+        cold, bank_sound = render(args, height, "bank", cold=True)
+        warm, _ = render(args, height, "bank")
+        difference = np.max(np.abs(fft_sound.astype(np.int32) - bank_sound))
+        print(
+            "{:6d}  {:7.3f}  {:9.3f}  {:9.3f}  {:14d}".format(
+                height, fft, cold, warm, difference
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Preprocessing of large source images.
+
+Blows one of the bundled examples up to a large JPEG and PNG, then
+preprocesses them the plain way (full decode, LANCZOS resample of all
+channels, grey-scale conversion) and the way SpectroGraphic does it
+(reduced JPEG decoding, early grey-scale, integer reduction). Prints the
+wall time, peak memory and the largest difference of the columns, e.g.
+
+python benchmarks/large_images.py --megapixels 50 --height 150
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from spectrographic.base import SpectroGraphic
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", type=Path, default=EXAMPLES / "shrek.png")
+    parser.add_argument("--megapixels", type=float, default=50)
+    parser.add_argument("--height", type=int, default=150)
+    return parser.parse_args()
+
+
+def plain_columns(path: Path, height: int):
+    """Columns the way SpectroGraphic used to preprocess images."""
+    image = Image.open(path)
+    width = int(image.width * (height / image.height))
+    image = image.resize(size=(width, height), resample=Image.LANCZOS)
+    return np.transpose(np.array(image.convert(mode="L")))
+
+
+def spectrographic_columns(path: Path, height: int):
+    sg = SpectroGraphic(path, height=height)
+    sg._preprocess()
+    return sg.columns
+
+
+def measure(method, path: Path, height: int):
+    """Runs in a fresh process so the peak memory is its own.
+
+    Returns:
+        tuple -- seconds, peak memory in MiB above the baseline and columns
+    """
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    columns = method(path, height)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return seconds, peak / 1024, columns
+
+
+def main():
+    args = parse_args()
+
+    image = Image.open(args.image).convert("RGB")
+    scale = (args.megapixels * 1e6 / (image.width * image.height)) ** 0.5
+    image = image.resize(
+        (int(image.width * scale), int(image.height * scale)), Image.BICUBIC
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = []
+        for suffix, options in [(".jpg", {"quality": 90}), (".png", {})]:
+            path = Path(directory) / ("large" + suffix)
+            image.save(path, **options)
+            sources.append(path)
+        print("source: {}x{} pixels".format(image.width, image.height))
+        del image
+
+        print("format  method          seconds  peak MiB  max diff  mean diff")
+        for path in sources:
+            plain = None
+            for name, method in [
+                ("plain", plain_columns),
+                ("spectrographic", spectrographic_columns),
+            ]:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    seconds, peak, columns = pool.submit(
+                        measure, method, path, args.height
+                    ).result()
+                plain = columns if plain is None else plain
+                diff = np.abs(columns.astype(int) - plain.astype(int))
+                print(
+                    "{:6}  {:14}  {:7.3f}  {:8.1f}  {:8d}  {:9.3f}".format(
+                        path.suffix[1:], name, seconds, peak, diff.max(), diff.mean()
+                    )
+                )
+
+
+if __name__ == "__main__":
+    main()
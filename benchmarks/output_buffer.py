@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory of rendering a whole sound into sound_array.
+
+Renders one of the bundled examples the way SpectroGraphic used to
+(all raw sound walls, a peak over all of them, in place scaling and a
+16-bit copy) and the way it does now (16-bit samples written window by
+window into a preallocated buffer, optionally memory mapped to a scratch
+file). Every render runs in a fresh process, which reports its wall time
+and peak RSS above what it started with, e.g.
+
+python benchmarks/output_buffer.py --duration 600
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.normalization import NormalizationReport
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", type=Path, default=EXAMPLES / "happy.png")
+    parser.add_argument("--duration", type=float, default=300)
+    parser.add_argument("--height", type=int, default=150)
+    return parser.parse_args()
+
+
+def plain_sound(sg: SpectroGraphic):
+    """sound_array the way SpectroGraphic used to render it."""
+    sg._preprocess()
+    if sg.NORMALIZATION != "peak":
+        scale = sg._scale(sg.NORMALIZATION, 32767)
+
+    with sg._renderer() as renderer:
+        audio_array = renderer.render(sg.columns).ravel()
+        if sg.NORMALIZATION == "peak":
+            peak = np.max(np.abs(audio_array))
+            scale = 32767 / peak if peak else 0.0
+        NormalizationReport(sg.NORMALIZATION, scale, 32767).normalize(audio_array)
+        return audio_array.astype(np.int16)
+
+
+def spectrographic_sound(sg: SpectroGraphic):
+    return sg.sound_array
+
+
+def measure(method, image: Path, params: dict):
+    """Runs in a fresh process so the peak memory is its own.
+
+    Returns:
+        tuple -- seconds, peak RSS in MiB above the baseline and the sound
+    """
+    sg = SpectroGraphic(image, **params)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    sound = method(sg)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return seconds, peak / 1024, np.array(sound)
+
+
+def main():
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        print("normalization  method          scratch  seconds  peak MiB  same")
+        for normalization in ("peak", "bound"):
+            params = dict(
+                height=args.height,
+                duration=args.duration,
+                normalization=normalization,
+            )
+            plain = None
+            for name, method, scratch in [
+                ("plain", plain_sound, None),
+                ("spectrographic", spectrographic_sound, None),
+                ("spectrographic", spectrographic_sound, scratch_dir),
+            ]:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    seconds, peak, sound = pool.submit(
+                        measure, method, args.image, dict(params, scratch_dir=scratch)
+                    ).result()
+                plain = sound if plain is None else plain
+                print(
+                    "{:13}  {:14}  {:7}  {:7.3f}  {:8.1f}  {}".format(
+                        normalization,
+                        name,
+                        "yes" if scratch else "no",
+                        seconds,
+                        peak,
+                        np.array_equal(sound, plain),
+                    ),
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory of streaming a long sound to a file.
+
+Saves one of the bundled examples with every engine in a fresh process
+each and prints the wall time and the peak resident memory of that
+process, e.g.
+
+python benchmarks/streaming_memory.py --duration 3600 --normalization bound
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", type=Path, default=EXAMPLES / "python.png")
+    parser.add_argument("--height", type=int, default=150)
+    parser.add_argument("--duration", type=int, default=3600)
+    parser.add_argument("--normalization", default="bound")
+    parser.add_argument("--engines", nargs="+", default=["phasor", "bank"])
+    parser.add_argument("--output", default="/dev/null")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args(args)
+
+
+def save(args):
+    """Saves the sound with the engine args.child, prints the seconds
+    it took and the peak resident memory in MB.
+    """
+    from spectrographic.base import SpectroGraphic
+
+    sg = SpectroGraphic(
+        args.image,
+        height=args.height,
+        duration=args.duration,
+        engine=args.child,
+        normalization=args.normalization,
+    )
+    start = time.perf_counter()
+    sg.save(args.output, format="wav")
+    seconds = time.perf_counter() - start
+
+    # kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(seconds, peak)
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        return save(args)
+
+    print("engine  seconds  peak MB")
+    for engine in args.engines:
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", engine] + sys.argv[1:],
+            check=True,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+        ).stdout
+        seconds, peak = map(float, output.split())
+        print("{:6s}  {:7.2f}  {:7.0f}".format(engine, seconds, peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Wall time and peak memory of the synthesis hot paths.
+
+Times ColumnToSound._get_wave, pixel_to_sound, gen_soundwall,
+SpectroGraphic._process and save over a grid of heights, durations,
+sample rates, numbers of tones and the bundled example images, e.g.
+
+python benchmarks/suite.py --save baseline.json
+python benchmarks/suite.py --compare baseline.json --threshold 0.15
+
+Comparing exits with status 1 if a case got slower or needs more
+memory than the baseline by more than the threshold.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from spectrographic.base import ColumnToSound, SpectroGraphic
+from spectrographic.costmodel import machine_key
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+# grid of the parameters each hot path is benchmarked over
+GRID = {
+    "height": [50, 150, 300],
+    "duration": [5, 20],
+    "sample_rate": [22050, 44100],
+    "num_tones": [1, 3],
+    "image": sorted(path.name for path in EXAMPLES.glob("*.png")),
+}
+
+# smaller grid for a quick check
+QUICK_GRID = {
+    "height": [50, 150],
+    "duration": [5],
+    "sample_rate": [44100],
+    "num_tones": [3],
+    "image": ["happy.png"],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--quick", action="store_true", help="use a smaller grid")
+    parser.add_argument("--filter", default="", help="only run cases containing this")
+    parser.add_argument("--engine", default="auto")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", type=Path, help="write the results to this file")
+    parser.add_argument("--compare", type=Path, help="compare to this baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative regression, e.g. 0.2 for 20%%",
+    )
+    return parser.parse_args()
+
+
+def _col_to_sound(engine: str, **params):
+    params.setdefault("duration", 0.1)
+    params.setdefault("sample_rate", 44100)
+    params.setdefault("y_resolution", 150)
+    params.setdefault("num_tones", 3)
+    return ColumnToSound(
+        min_freq=1000, max_freq=8000, contrast=5, engine=engine, **params
+    )
+
+
+def get_wave_cases(grid, engine):
+    """_get_wave of one pixel for a whole column."""
+    for duration, sample_rate in itertools.product(
+        grid["duration"], grid["sample_rate"]
+    ):
+        col_to_sound = _col_to_sound(engine, sample_rate=sample_rate)
+        yield (
+            "get_wave duration={} sample_rate={}".format(duration, sample_rate),
+            lambda c=col_to_sound, d=duration: c._get_wave(4000, 0.5, d),
+        )
+
+
+def pixel_to_sound_cases(grid, engine):
+    """pixel_to_sound of one pixel in a column lasting 0.1s."""
+    for sample_rate, num_tones in itertools.product(
+        grid["sample_rate"], grid["num_tones"]
+    ):
+        col_to_sound = _col_to_sound(
+            engine, sample_rate=sample_rate, num_tones=num_tones
+        )
+        yield (
+            "pixel_to_sound sample_rate={} num_tones={}".format(sample_rate, num_tones),
+            lambda c=col_to_sound: c.pixel_to_sound(10, 0.5),
+        )
+
+
+def gen_soundwall_cases(grid, engine):
+    """gen_soundwall of one random column, the bank is built up front."""
+    rng = np.random.default_rng(0)
+    for height, sample_rate, num_tones in itertools.product(
+        grid["height"], grid["sample_rate"], grid["num_tones"]
+    ):
+        col_to_sound = _col_to_sound(
+            engine, sample_rate=sample_rate, num_tones=num_tones, y_resolution=height
+        )
+        column = rng.integers(0, 256, height, dtype=np.uint8)
+        col_to_sound.gen_soundwall(column)
+        yield (
+            "gen_soundwall height={} sample_rate={} num_tones={}".format(
+                height, sample_rate, num_tones
+            ),
+            lambda c=col_to_sound, column=column: c.gen_soundwall(column),
+        )
+
+
+def _spectrographic(image, height, duration, engine):
+    sg = SpectroGraphic(
+        EXAMPLES / image, height=height, duration=duration, engine=engine
+    )
+    sg._preprocess()
+    return sg
+
+
+def process_cases(grid, engine):
+    """_process of a preprocessed example image."""
+    for image, height, duration in itertools.product(
+        grid["image"], grid["height"], grid["duration"]
+    ):
+        sg = _spectrographic(image, height, duration, engine)
+        yield (
+            "process image={} height={} duration={}".format(image, height, duration),
+            sg._process,
+        )
+
+
+def save_cases(grid, engine):
+    """save of a preprocessed example image to a temporary file."""
+    for image, height, duration in itertools.product(
+        grid["image"], grid["height"], grid["duration"]
+    ):
+        sg = _spectrographic(image, height, duration, engine)
+        wav_file = Path(tempfile.gettempdir()) / "spectrographic-bench.wav"
+        yield (
+            "save image={} height={} duration={}".format(image, height, duration),
+            lambda sg=sg, wav_file=wav_file: sg.save(wav_file),
+        )
+
+
+CASES = [
+    get_wave_cases,
+    pixel_to_sound_cases,
+    gen_soundwall_cases,
+    process_cases,
+    save_cases,
+]
+
+
+def measure(func, repeat: int):
+    """Best wall time in seconds and peak traced memory in bytes of func()."""
+
+    # warm up caches, e.g. the oscillator bank
+    func()
+
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds = min(seconds, time.perf_counter() - start)
+
+    # tracing slows the call down, so memory is measured in a separate run
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": seconds, "peak_bytes": peak_bytes}
+
+
+def compare(results, baseline, threshold: float):
+    """Lines describing every regression beyond threshold."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, value in result.items():
+            before = baseline[name][metric]
+            if before and value > before * (1 + threshold):
+                regressions.append(
+                    "{}: {} {:.4g} -> {:.4g} (+{:.0%})".format(
+                        name, metric, before, value, value / before - 1
+                    )
+                )
+    return regressions
+
+
+def main():
+    args = parse_args()
+    grid = QUICK_GRID if args.quick else GRID
+
+    results = {}
+    print("{:>10}  {:>10}  case".format("seconds", "peak MiB"))
+    for cases in CASES:
+        for name, func in cases(grid, args.engine):
+            if args.filter not in name:
+                continue
+            result = results[name] = measure(func, args.repeat)
+            print(
+                "{:10.4f}  {:10.1f}  {}".format(
+                    result["seconds"], result["peak_bytes"] / 2 ** 20, name
+                ),
+                flush=True,
+            )
+
+    if args.save is not None:
+        with open(args.save, "w") as file:
+            json.dump({"machine": machine_key(), "results": results}, file, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline["machine"] != machine_key():
+            print("warning: the baseline was recorded on another machine.")
+
+        regressions = compare(results, baseline["results"], args.threshold)
+        for line in regressions:
+            print("regression:", line)
+        if regressions:
+            sys.exit(1)
+        print("no regressions beyond {:.0%}.".format(args.threshold))
+
+
+if __name__ == "__main__":
+    main()
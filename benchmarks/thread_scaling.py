@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling of the thread backend with the number of threads.
+
+Renders one of the bundled examples with 1, 2, 4, ... threads
+and prints the wall time and speed-up of each run, e.g.
+
+python benchmarks/thread_scaling.py --engine bank --max-threads 8
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+from spectrographic.base import SpectroGraphic
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--image", type=Path, default=EXAMPLES / "shrek.png")
+    parser.add_argument("--engine", default="bank")
+    parser.add_argument("--height", type=int, default=300)
+    parser.add_argument("--duration", type=int, default=120)
+    parser.add_argument("--max-threads", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def render_time(args, threads: int):
+    """Best wall time of rendering the sound with threads threads."""
+    best = float("inf")
+    for _ in range(args.repeat):
+        sg = SpectroGraphic(
+            args.image,
+            height=args.height,
+            duration=args.duration,
+            engine=args.engine,
+            workers=threads,
+            backend="thread",
+        )
+        start = time.perf_counter()
+        sg.sound_array
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    args = parse_args()
+
+    threads = [1]
+    while threads[-1] * 2 <= args.max_threads:
+        threads.append(threads[-1] * 2)
+    if threads[-1] != args.max_threads:
+        threads.append(args.max_threads)
+
+    # warm up the bank cache so we only time the rendering
+    render_time(args, 1)
+
+    print("threads  seconds  speed-up")
+    baseline = None
+    for num_threads in threads:
+        seconds = render_time(args, num_threads)
+        baseline = baseline or seconds
+        print(
+            "{:7d}  {:7.3f}  {:8.2f}".format(num_threads, seconds, baseline / seconds)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Running renders from asyncio.
+
+The CPU heavy work runs in an executor so the event loop stays free.
+Cancelling the awaiting task cancels the render through a
+CancellationToken, and the task only finishes once the render has
+stopped and let go of its memory. A RenderLimiter bounds how many
+renders run at the same time, however many are awaited, and renders of
+the same SpectroGraphic run one after the other.
+"""
+import asyncio
+import os
+import weakref
+
+from spectrographic.progress import CancellationToken
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class RenderLimiter(object):
+    """Async context manager letting at most max_concurrent
+    renders run at the same time, per event loop.
+
+    Arguments:
+        max_concurrent {int} -- number of renders running at once
+    """
+
+    def __init__(self, max_concurrent: int):
+        super(RenderLimiter, self).__init__()
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1.")
+        self.max_concurrent = max_concurrent
+
+        # a semaphore belongs to the loop it is used in
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphores[loop]
+
+    async def __aenter__(self):
+        await self._semaphore().acquire()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore().release()
+
+
+# limiter used when none is given, one render per core
+RENDER_LIMITER = RenderLimiter(os.cpu_count() or 1)
+
+# lock of every SpectroGraphic being rendered, per event loop
+_render_locks = weakref.WeakKeyDictionary()
+
+
+def _render_lock(sg):
+    """Lock held while sg is rendered in the running loop."""
+    locks = _render_locks.setdefault(
+        asyncio.get_running_loop(), weakref.WeakKeyDictionary()
+    )
+    if sg not in locks:
+        locks[sg] = asyncio.Lock()
+    return locks[sg]
+
+
+async def run_cancellable(sg, func, limiter: RenderLimiter = None, executor=None):
+    """Calls func() in the executor once the limiter lets it run.
+
+    While func runs, sg.cancel_token is replaced by a token that is also
+    cancelled when the awaiting task is. On cancellation, this waits for
+    func to stop at its next batch of columns before raising. Calls for
+    the same sg wait for each other, so they never swap its token under
+    one another's feet.
+
+    Arguments:
+        sg {SpectroGraphic} -- the SpectroGraphic func renders
+        func {callable} -- blocking call doing the work
+
+    Keyword Arguments:
+        limiter {RenderLimiter} -- bounds the concurrent renders
+        (default: {RENDER_LIMITER})
+        executor {Executor} -- where func runs (default: {the loop's
+        default executor})
+
+    Returns:
+        whatever func returns
+    """
+
+    limiter = RENDER_LIMITER if limiter is None else limiter
+
+    async with _render_lock(sg), limiter:
+        previous = sg.cancel_token
+        token = CancellationToken(parent=previous)
+        sg.cancel_token = token
+
+        future = asyncio.get_running_loop().run_in_executor(executor, func)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            token.cancel()
+            try:
+                await future
+            except Exception:
+                pass
+            raise
+        finally:
+            sg.cancel_token = previous
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide cache of oscillator banks.
+
+Building the oscillator bank of a ColumnToSound is by far the most
+expensive part of setting it up. Since most renders reuse the same few
+parameter sets, the banks are kept in a size-bounded LRU cache that is
+shared by every ColumnToSound in the process.
+"""
+import threading
+from collections import OrderedDict
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class BankCache(object):
+    """Keyed, size-bounded LRU cache of oscillator banks.
+
+    Banks are stored read-only so that they can safely be shared
+    between instances and threads.
+
+    Keyword Arguments:
+        max_bytes {int} -- Memory cap of the cache in bytes. Banks
+        larger than this are built but never cached.
+        (default: {256 MiB})
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20):
+        super(BankCache, self).__init__()
+
+        self._banks = OrderedDict()
+        self._lock = threading.Lock()
+
+        # bytes currently held by the cache
+        self.nbytes = 0
+
+        # counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._max_bytes = max_bytes
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, max_bytes: int):
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        """Drops least recently used banks until we are below max_bytes.
+        Must be called with the lock held.
+        """
+        while self._banks and self.nbytes > self._max_bytes:
+            _, bank = self._banks.popitem(last=False)
+            self.nbytes -= bank.nbytes
+            self.evictions += 1
+
+    def get(self, key, build):
+        """Returns the bank stored under key, building it
+        with build() on a miss.
+
+        Arguments:
+            key {tuple} -- hashable synthesis parameters of the bank
+            build {callable} -- builds the bank if it is not cached
+
+        Returns:
+            np.ndarray -- read-only oscillator bank
+        """
+
+        with self._lock:
+            bank = self._banks.get(key)
+            if bank is not None:
+                self._banks.move_to_end(key)
+                self.hits += 1
+                return bank
+            self.misses += 1
+
+        # building happens outside the lock so that other
+        # parameter sets are not blocked by it.
+        bank = build()
+        bank.setflags(write=False)
+
+        if bank.nbytes > self._max_bytes:
+            return bank
+
+        with self._lock:
+            # another thread might have built it in the meantime
+            if key in self._banks:
+                self._banks.move_to_end(key)
+                return self._banks[key]
+
+            self._banks[key] = bank
+            self.nbytes += bank.nbytes
+            self._evict()
+
+        return bank
+
+    def clear(self):
+        """Empties the cache. Counters are kept.
+        """
+        with self._lock:
+            self._banks.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._banks
+
+    def __len__(self):
+        return len(self._banks)
+
+    @property
+    def stats(self):
+        """Counters and memory usage of the cache as a dict.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "banks": len(self),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# cache shared by all ColumnToSound instances in this process
+BANK_CACHE = BankCache()
@@ -1,14 +1,43 @@
+import asyncio
+import tempfile
+import threading
+import traceback
+import weakref
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 
 import numpy as np
 import simpleaudio as sa
-import wavio
 from PIL import Image
 
+from spectrographic.aio import RenderLimiter, run_cancellable
+from spectrographic.banks import BANK_CACHE, BankCache
+from spectrographic.engines import ENGINES, select_engine
+from spectrographic.normalization import (
+    NORMALIZATIONS,
+    NormalizationReport,
+    analytic_bound,
+    peak_amplitude,
+)
+from spectrographic.parallel import (
+    ProcessRenderer,
+    SerialRenderer,
+    ThreadRenderer,
+    process_pool,
+)
+from spectrographic.playback import ProgressivePlayer, SoundDeviceSink
+from spectrographic.profiling import RenderStats
+from spectrographic.progress import ProgressTracker, RenderCancelled
+from spectrographic.rendercache import RenderCache, render_key
+from spectrographic.writers import open_writer
+
 __author__ = "Levi Borodenko"
 __copyright__ = "Levi Borodenko"
 __license__ = "mit"
 
+# stand-in for a stage timer when profiling is disabled
+_NO_STAGE = nullcontext()
+
 
 class SpectroGraphic(object):
     """
@@ -29,8 +58,57 @@ class SpectroGraphic(object):
         (default: {3})
         contrast {float} -- Contrast between loud and quiet pixels
         (default: {5})
+        use_black_and_white {bool} -- Turn image into pure black and white
+        (default: {False})
+        engine {str} -- Synthesis engine, one of spectrographic.engines.ENGINES
+        or "auto" to pick the fastest exact one (default: {"auto"})
+        normalization {str} -- How the sound is scaled to full volume, one of
+        spectrographic.normalization.NORMALIZATIONS (default: {"peak"})
+        gain {float} -- Scale of the raw sound relative to full scale, used by
+        the "fixed" normalization (default: {None})
+        workers {int} -- Number of processes or threads that render the
+        columns (default: {1})
+        backend {str} -- "process" or "thread", what the workers are. Worker
+        processes are kept for all renders until close (default: {"process"})
+        blas_threads {int} -- BLAS threads of every worker of the "thread"
+        backend, None to leave BLAS alone (default: {1})
+        dtype {np.dtype} -- Float type the sound is rendered in, np.float32
+        halves memory traffic (default: {np.float64})
+        prune_threshold {float} -- Pixels whose intensity to the power of
+        contrast is below this are silenced as inaudible, see ColumnToSound
+        for when their oscillators are skipped (default: {0})
+        profile {bool} -- Record a RenderStats of every render in stats
+        (default: {False})
+        on_stats {callable} -- Called with the RenderStats after every
+        render, implies profile (default: {None})
+        progress {callable} -- Called with a spectrographic.progress.Progress
+        after every batch of columns (default: {None})
+        cancel_token {CancellationToken} -- Checked after every batch of
+        columns, once cancelled the render raises RenderCancelled
+        (default: {None})
+        cache {RenderCache} -- On-disk cache of rendered sounds, or the
+        path of its directory (default: {None})
+        scratch_dir {Path} -- Directory of a scratch file that holds the
+        rendered sound instead of memory, for sounds larger than memory
+        (default: {None})
     """
 
+    # number of columns rendered together in one batch, fewer if
+    # their samples would not fit into BATCH_SAMPLES
+    BATCH_COLUMNS = 64
+    BATCH_SAMPLES = 2 ** 25
+
+    # number of columns rendered by the "sampled" normalization
+    SAMPLED_COLUMNS = 32
+
+    # batches each worker renders per window when streaming
+    WINDOW_BATCHES = 4
+
+    # large images are decoded at a reduced size and shrunk by an
+    # integer factor as long as they stay this many times larger than
+    # the target, before the final LANCZOS resample
+    REDUCING_GAP = 3.0
+
     def __init__(
         self,
         path: Path,
@@ -42,6 +120,20 @@ class SpectroGraphic(object):
         num_tones: int = 3,
         contrast: float = 5,
         use_black_and_white: bool = False,
+        engine: str = "auto",
+        normalization: str = "peak",
+        gain: float = None,
+        workers: int = 1,
+        backend: str = "process",
+        blas_threads: int = 1,
+        dtype=np.float64,
+        prune_threshold: float = 0,
+        profile: bool = False,
+        on_stats=None,
+        progress=None,
+        cancel_token=None,
+        cache: RenderCache = None,
+        scratch_dir: Path = None,
     ):
 
         super(SpectroGraphic, self).__init__()
@@ -58,6 +150,13 @@ class SpectroGraphic(object):
         # duration per column
         self.DURATION_COL = self.DURATION / self.WIDTH
 
+        # columns per batch, so that a batch of raw sound walls stays
+        # within BATCH_SAMPLES samples however long the columns are
+        column_samples = max(int(self.DURATION_COL * sample_rate), 1)
+        self.COLUMNS_PER_BATCH = max(
+            1, min(self.BATCH_COLUMNS, self.BATCH_SAMPLES // column_samples)
+        )
+
         # instance of ColumnToSound that will generate
         # the sounds for each column of the image
         self.col_to_sound = ColumnToSound(
@@ -68,14 +167,74 @@ class SpectroGraphic(object):
             y_resolution=height,
             num_tones=num_tones,
             contrast=contrast,
+            engine=engine,
+            num_columns=self.WIDTH,
+            batch_columns=self.COLUMNS_PER_BATCH,
+            dtype=dtype,
+            prune_threshold=prune_threshold,
         )
 
+        # total number of columns and samples of the sound
+        self.NUM_COLUMNS = self.WIDTH
+        self.NUM_SAMPLES = self.NUM_COLUMNS * self.col_to_sound.NUM_SAMPLES
+
+        # columns of the preprocessed image
+        self.columns = None
+
         # Flag whether we have processed the image yet
         self.is_processed = False
 
         # if true, then we do not use grey-scale with only 0 and 1
         self.USE_BLACK_AND_WHITE = use_black_and_white
 
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(
+                "normalization must be one of {}.".format(", ".join(NORMALIZATIONS))
+            )
+        if normalization == "fixed" and gain is None:
+            raise ValueError("fixed normalization needs a gain.")
+        self.NORMALIZATION = normalization
+        self.GAIN = gain
+
+        # how the last render was normalised
+        self.normalization_report = None
+
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        self.WORKERS = workers
+
+        if backend not in ("process", "thread"):
+            raise ValueError("backend must be process or thread.")
+        self.BACKEND = backend
+
+        if blas_threads is not None and blas_threads < 1:
+            raise ValueError("blas_threads must be at least 1.")
+        self.BLAS_THREADS = blas_threads
+
+        # pool of the worker processes, started on the first render
+        self._pool = None
+        self._close_pool = None
+
+        self.PROFILE = profile or on_stats is not None
+        self.on_stats = on_stats
+
+        # stats of the last profiled render and of the one in progress
+        self.stats = None
+        self._stats = None
+
+        self.progress = progress
+        self.cancel_token = cancel_token
+
+        # ProgressTracker of the render in progress
+        self._tracker = None
+
+        if cache is not None and not isinstance(cache, RenderCache):
+            cache = RenderCache(cache)
+        self.cache = cache
+        self._cache_key = None
+
+        self.SCRATCH_DIR = None if scratch_dir is None else Path(scratch_dir)
+
     def _resize(self):
         """[summary]
         We resize the image to be at most self.HEIGHT pixels tall.
@@ -83,64 +242,551 @@ class SpectroGraphic(object):
         [description]
         The reason is to put a limit on the frequency resolution that
         we would need to draw it in on the spectrograph.
+
+        JPEGs are decoded at 1/2, 1/4 or 1/8 of their size if that stays
+        REDUCING_GAP times larger than the target. RGB and grey-scale images
+        are converted to grey-scale first, which resampling commutes with.
+        Others keep their mode, since e.g. RGBA is resampled premultiplied
+        and palette images with the nearest neighbour.
         """
 
-        # resizing image
-        self.image = self.image.resize(
-            size=(self.WIDTH, self.HEIGHT), resample=Image.LANCZOS
+        size = (self.WIDTH, self.HEIGHT)
+        grey_first = self.image.mode in ("RGB", "L")
+
+        # JPEGs decode straight to the luma channel when going grey. The
+        # last block of a reduced decode may only be partly covered, draft
+        # returns what the original covers.
+        drafted = self.image.draft(
+            "L" if grey_first else None,
+            (int(self.WIDTH * self.REDUCING_GAP), int(self.HEIGHT * self.REDUCING_GAP)),
         )
+        if drafted is None:
+            covered = self.image.size
+        else:
+            covered = drafted[1][2:]
+
+        # box reduction by integer factors, before going grey so that the
+        # full size image is never copied. Like resize, palette and bilevel
+        # images are left to the nearest neighbour.
+        factor = tuple(
+            max(1, int(have / want / self.REDUCING_GAP))
+            for have, want in zip(self.image.size, size)
+        )
+        if self.image.mode in ("1", "P"):
+            factor = (1, 1)
+
+        # the original image in the coordinates of the reduced one,
+        # whose last row and column may only be partly covered
+        box = (0, 0, covered[0] / factor[0], covered[1] / factor[1])
+
+        if factor != (1, 1):
+            self.image = self.image.reduce(factor)
+
+        if grey_first:
+            self.image = self.image.convert(mode="L")
+
+        # resizing image
+        self.image = self.image.resize(size=size, resample=Image.LANCZOS, box=box)
 
     def _preprocess(self):
         """Resizes the image, converts it to grey-scale
         and returns the columns as a np.ndarray.
+
+        The columns keep the 8-bit grey values of the image, ColumnToSound
+        turns them into intensities between 0 and 1 when weighting them.
         """
 
         # resize image
-        self._resize()
+        with self._stage("resize"):
+            self._resize()
+        self._account("resize", self.WIDTH * self.HEIGHT * len(self.image.getbands()))
 
-        # convert to gray scale
-        self.image = self.image.convert(mode="L")
+        with self._stage("convert"):
 
-        # get pixels as array and normalise them to be
-        # between 0 and 1
-        self.image_array = np.array(self.image) / 255
+            # convert to gray scale
+            self.image = self.image.convert(mode="L")
 
-        # transpose image to get list of columns
-        self.columns = np.transpose(self.image_array)
+            # get pixels as 8-bit array
+            self.image_array = np.array(self.image)
 
-        if self.USE_BLACK_AND_WHITE:
-            self.columns[self.columns >= 0.5] = 1
-            self.columns[self.columns < 0.5] = 0
-            self.columns = 1 - self.columns
+            # transpose image to get list of columns
+            self.columns = np.ascontiguousarray(np.transpose(self.image_array))
+
+            # dark pixels (intensity below 0.5) become fully loud,
+            # light ones silent.
+            if self.USE_BLACK_AND_WHITE:
+                self.columns = np.where(self.columns >= 128, 0, 255).astype(np.uint8)
+
+        self._account("convert", self.image_array.nbytes + self.columns.nbytes)
+
+    @contextmanager
+    def _profiled(self):
+        """Collects the RenderStats of one render into stats and hands
+        them to on_stats. Does nothing if profiling is disabled or a
+        render is already being profiled, e.g. iter_chunks within save.
+        """
+
+        if not self.PROFILE or self._stats is not None:
+            yield
+            return
+
+        col_to_sound = self.col_to_sound
+        counters = col_to_sound.counters
+
+        stats = RenderStats()
+        self._stats = stats
+        try:
+            yield
+        finally:
+            self._stats = None
+
+        for name, value in col_to_sound.counters.items():
+            setattr(stats, name, value - counters[name])
+        self.stats = stats
+
+        if self.on_stats is not None:
+            self.on_stats(stats)
+
+    def _stage(self, name: str):
+        """Times a stage of the render being profiled."""
+        if self._stats is None:
+            return _NO_STAGE
+        return self._stats.stage(name)
+
+    def _account(self, name: str, nbytes: int, columns: int = 0):
+        """Adds bytes and rendered columns to the render being profiled."""
+        if self._stats is not None:
+            self._stats.add(name, nbytes=nbytes)
+            self._stats.columns_rendered += columns
+
+    @contextmanager
+    def _tracked(self, normalization: str, streaming: bool):
+        """Reports the progress of one render and lets it be cancelled.
+        Does nothing if there is nothing to report to or cancel with, or
+        a render is already being tracked.
+
+        On cancellation the frames of the traceback are cleared, so the
+        partly rendered sound is freed even if the caller holds on to the
+        RenderCancelled.
+
+        Arguments:
+            normalization {str} -- normalization of the render
+            streaming {bool} -- whether the columns are rendered window by
+            window, see _windowed
+        """
+
+        tracking = self.progress is not None or self.cancel_token is not None
+        if not tracking or self._tracker is not None:
+            yield
+            return
+
+        # peak normalization renders twice when streaming and
+        # sampled normalization renders its sample up front
+        total = self.NUM_COLUMNS
+        if normalization == "peak" and streaming:
+            total += self.NUM_COLUMNS
+        elif normalization == "sampled":
+            total += len(range(0, self.NUM_COLUMNS, self._sample_step()))
+
+        self._tracker = ProgressTracker(total, self.progress, self.cancel_token)
+        try:
+            yield
+        except RenderCancelled as error:
+            traceback.clear_frames(error.__traceback__)
+            raise
+        finally:
+            self._tracker = None
+
+    @property
+    def _on_batch(self):
+        """on_batch callback of the renderers."""
+        return None if self._tracker is None else self._tracker.advance
+
+    def _renderer(self, batch: int = None):
+        """Renderer for the columns, spread over WORKERS processes
+        or threads if there is more than one.
+
+        Keyword Arguments:
+            batch {int} -- columns per batch (default: {COLUMNS_PER_BATCH})
+        """
+        batch = batch or self.COLUMNS_PER_BATCH
+        if self.WORKERS == 1:
+            return SerialRenderer(self.col_to_sound, batch)
+        if self.BACKEND == "thread":
+            return ThreadRenderer(
+                self.col_to_sound, batch, self.WORKERS, self.BLAS_THREADS
+            )
+        return ProcessRenderer(
+            self.col_to_sound, batch, self.WORKERS, pool=self._process_pool()
+        )
+
+    def _process_pool(self):
+        """Pool of the worker processes, kept for all renders of this
+        instance until close.
+        """
+        if self._pool is None:
+            self._pool = process_pool(self.col_to_sound, self.WORKERS)
+            # the workers are shut down once the instance is gone
+            self._close_pool = weakref.finalize(self, self._pool.shutdown)
+        return self._pool
+
+    def close(self):
+        """Shuts down the worker processes of the "process" backend.
+        The next render starts new ones.
+        """
+        if self._pool is not None:
+            self._close_pool()
+            self._pool = None
+
+    def _iter_soundwalls(self, lead_columns: int = 0):
+        """Renders the columns window by window, see _windows.
+
+        Keyword Arguments:
+            lead_columns {int} -- the first lead_columns columns are
+            rendered in a window of their own, so they come out sooner
+            (default: {0})
+
+        Yields:
+            np.ndarray -- (n, samples per column) sound walls of the
+            next n columns, only valid until the next one is requested
+        """
+
+        if self.columns is None:
+            self._preprocess()
+
+        with self._renderer() as renderer:
+            yield from self._windows(renderer, self.columns, lead_columns)
+
+    def _windows(self, renderer, columns: np.ndarray, lead_columns: int = 0):
+        """Renders columns with the renderer window by window. A window
+        is a single batch of COLUMNS_PER_BATCH columns, or WINDOW_BATCHES
+        batches per worker when rendering in parallel.
+
+        Arguments:
+            renderer {SerialRenderer} -- an open renderer, see _renderer
+            columns {np.ndarray} -- (n, height) columns to render
+
+        Keyword Arguments:
+            lead_columns {int} -- see _iter_soundwalls (default: {0})
+
+        Yields:
+            np.ndarray -- sound walls, see _iter_soundwalls
+        """
+
+        window = self.COLUMNS_PER_BATCH
+        if self.WORKERS > 1:
+            window *= self.WORKERS * self.WINDOW_BATCHES
+
+        width = len(columns)
+        lead_columns = min(lead_columns, width)
+        starts = list(range(lead_columns, width, window))
+        if lead_columns:
+            starts.insert(0, 0)
+        stops = starts[1:] + [width]
+
+        for start, stop in zip(starts, stops):
+            with self._stage("synthesis"):
+                waves = renderer.render(columns[start:stop], on_batch=self._on_batch)
+            self._account("synthesis", waves.nbytes, stop - start)
+            yield waves
+            del waves
+
+    def _peak(self, columns: np.ndarray = None):
+        """Largest absolute amplitude of the sound. Renders the
+        columns batch by batch without keeping them around.
+
+        Keyword Arguments:
+            columns {np.ndarray} -- only render these columns
+            (default: {all columns})
+        """
+
+        if columns is None:
+            return max(peak_amplitude(waves) for waves in self._iter_soundwalls())
+
+        renderer = SerialRenderer(self.col_to_sound, self.COLUMNS_PER_BATCH)
+        return max(
+            peak_amplitude(waves) for waves in self._windows(renderer, columns)
+        )
+
+    def _scale(self, mode: str, full_scale: float):
+        """Factor that scales the raw sound walls to full_scale.
+
+        Arguments:
+            mode {str} -- one of NORMALIZATIONS
+            full_scale {float} -- largest output amplitude
+
+        Returns:
+            float -- scale factor
+        """
+
+        if mode == "fixed":
+            return full_scale * self.GAIN
+
+        if self.columns is None:
+            self._preprocess()
+
+        if mode == "peak":
+            peak = self._peak()
+        elif mode == "bound":
+            peak = analytic_bound(
+                self.col_to_sound.weights(self.columns), self.col_to_sound.NUM_TONES
+            )
+        else:
+            peak = self._peak(self.columns[:: self._sample_step()])
+
+        # a silent image stays silent
+        return full_scale / peak if peak else 0.0
+
+    def _sample_step(self):
+        """Step between the columns the sampled normalization renders."""
+        return max(1, self.NUM_COLUMNS // self.SAMPLED_COLUMNS)
+
+    @property
+    def _windowed(self):
+        """Whether _render renders the columns window by window. All but
+        peak normalization know their scale up front. Peak normalization
+        keeps all raw sound walls in memory, unless the sound goes to a
+        scratch file, in which case it renders the columns twice instead.
+        """
+        return self.NORMALIZATION != "peak" or self.SCRATCH_DIR is not None
 
     def _process(self):
         """Preprocesses the image then turns the
         columns into sounds and stacks them up to produce
         the resulting sound.
+
+        Raises:
+            RenderCancelled -- if cancel_token was cancelled
+        """
+        with self._profiled(), self._tracked(self.NORMALIZATION, self._windowed):
+            return self._render()
+
+    def _render(self):
+        """Renders the sound, see _process.
+
+        The 16-bit samples are written straight into their slice of an
+        output buffer allocated up front, see _output_buffer.
+        """
+        sound = self._output_buffer()
+        self._account("normalization", sound.nbytes)
+
+        if self._windowed:
+            report = self._render_windows(sound)
+        else:
+            report = self._render_all(sound)
+
+        self.normalization_report = report
+
+        return sound
+
+    def _output_buffer(self):
+        """Uninitialized buffer for the NUM_SAMPLES 16-bit samples of the
+        sound, the memory map of a scratch file in SCRATCH_DIR if given.
+        The scratch file has no name and is gone with the buffer. Its
+        pages can be written back and dropped whenever memory runs low.
+        """
+        if self.SCRATCH_DIR is None:
+            return np.empty(self.NUM_SAMPLES, dtype=np.int16)
+
+        # the map keeps the file open
+        with tempfile.TemporaryFile(dir=self.SCRATCH_DIR) as file:
+            return np.memmap(file, dtype=np.int16, mode="w+", shape=self.NUM_SAMPLES)
+
+    def _render_windows(self, sound: np.ndarray):
+        """Renders the columns window by window into sound, so that only
+        one window of raw sound walls is in memory at a time.
+
+        Returns:
+            NormalizationReport -- how the sound was normalized
         """
-        self._preprocess()
 
-        audio_array = np.hstack(
-            [self.col_to_sound.gen_soundwall(col) for col in self.columns]
+        report = NormalizationReport(
+            self.NORMALIZATION, self._scale(self.NORMALIZATION, 32767), 32767
         )
 
-        # convert to 16-bit data
-        audio_array *= 32767 / np.max(np.abs(audio_array))
-        audio_array = audio_array.astype(np.int16)
+        start = 0
+        for waves in self._iter_soundwalls():
+            with self._stage("normalization"):
+                samples = report.normalize(waves).ravel()
+                sound[start : start + samples.size] = samples
+            start += samples.size
+
+        return report
+
+    def _render_all(self, sound: np.ndarray):
+        """Renders all raw sound walls at once, then peak normalizes
+        them into sound batch by batch, so that no temporary is as large
+        as the sound.
+
+        Returns:
+            NormalizationReport -- how the sound was normalized
+        """
+
+        if self.columns is None:
+            self._preprocess()
 
-        return audio_array
+        # all walls are in memory anyway, so batches need not be small
+        with self._renderer(self.BATCH_COLUMNS) as renderer:
+
+            # batches are rendered straight into their rows
+            with self._stage("synthesis"):
+                waves = renderer.render(self.columns, on_batch=self._on_batch)
+            self._account("synthesis", waves.nbytes, self.WIDTH)
+
+            with self._stage("normalization"):
+                windows = [
+                    waves[start : start + self.COLUMNS_PER_BATCH]
+                    for start in range(0, self.WIDTH, self.COLUMNS_PER_BATCH)
+                ]
+                peak = max(peak_amplitude(window) for window in windows)
+                report = NormalizationReport(
+                    "peak", 32767 / peak if peak else 0.0, 32767
+                )
+
+                start = 0
+                for window in windows:
+                    samples = report.normalize(window).ravel()
+                    sound[start : start + samples.size] = samples
+                    start += samples.size
+
+            # the renderer may own the buffer
+            del waves, windows
+
+        return report
 
     @property
     def sound_array(self):
-        if self.is_processed:
-            return self._sound_array
-        else:
+        if not self.is_processed:
+            sound = self._from_cache()
+            if sound is None:
+                sound = self._process()
+                if self.cache is not None:
+                    self.cache.put(self.cache_key, sound)
+            self._sound_array = sound
             self.is_processed = True
-            self._sound_array = self._process()
-            return self._sound_array
+        return self._sound_array
+
+    @property
+    def cache_key(self):
+        """Key of the sound in the render cache, a hash of the image
+        bytes and every parameter that changes the samples.
+        """
+        if self._cache_key is None:
+            params = dict(
+                self.col_to_sound.params,
+                width=self.WIDTH,
+                height=self.HEIGHT,
+                use_black_and_white=self.USE_BLACK_AND_WHITE,
+                normalization=self.NORMALIZATION,
+                gain=self.GAIN,
+                reducing_gap=self.REDUCING_GAP,
+            )
+            self._cache_key = render_key(self.PATH, params)
+        return self._cache_key
+
+    def _from_cache(self):
+        """Memory mapped sound from the render cache, None without
+        a cache or on a miss.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self.cache_key)
+
+    def iter_chunks(
+        self,
+        chunk_samples: int = 2 ** 16,
+        dtype=np.int16,
+        normalization: str = None,
+        lead_columns: int = 0,
+    ):
+        """Yields the sound in consecutive chunks while it is rendered.
+
+        Only a batch of columns is kept in memory at any time. With peak
+        normalization the columns are rendered twice: once to find the
+        peak and once to emit the chunks. All other normalizations fix the
+        scale up front and need a single pass. If the sound has already been
+        processed, the chunks are cut from sound_array instead.
+
+        Keyword Arguments:
+            chunk_samples {int} -- samples per chunk, the last chunk may
+            be shorter (default: {65536})
+            dtype {np.dtype} -- np.int16 for 16-bit data or a float type
+            for samples between -1 and 1 (default: {np.int16})
+            normalization {str} -- overrides the normalization of this
+            instance (default: {None})
+            lead_columns {int} -- render the first lead_columns columns
+            on their own, so the first chunks come out sooner (default: {0})
+
+        Yields:
+            np.ndarray -- chunk of the sound
+
+        Raises:
+            ValueError
+            RenderCancelled -- if cancel_token was cancelled
+        """
+
+        dtype = np.dtype(dtype)
+
+        if dtype == np.int16:
+            full_scale = 32767
+        elif dtype.kind == "f":
+            full_scale = 1
+        else:
+            raise ValueError("dtype must be np.int16 or a float type.")
+
+        if chunk_samples <= 0:
+            raise ValueError("chunk_samples must be positive.")
+
+        if normalization is None:
+            normalization = self.NORMALIZATION
+        elif normalization not in NORMALIZATIONS:
+            raise ValueError(
+                "normalization must be one of {}.".format(", ".join(NORMALIZATIONS))
+            )
+        if normalization == "fixed" and self.GAIN is None:
+            raise ValueError("fixed normalization needs a gain.")
+
+        cached = self.is_processed and normalization == self.NORMALIZATION
+        if cached and dtype == np.int16:
+            for start in range(0, self.NUM_SAMPLES, chunk_samples):
+                yield self.sound_array[start : start + chunk_samples]
+            return
+
+        with self._profiled(), self._tracked(normalization, streaming=True):
+            report = NormalizationReport(
+                normalization, self._scale(normalization, full_scale), full_scale
+            )
+            self.normalization_report = report
+
+            chunk = np.empty(chunk_samples, dtype=dtype)
+            filled = 0
+            self._account("normalization", chunk.nbytes)
+
+            for waves in self._iter_soundwalls(lead_columns):
+                with self._stage("normalization"):
+                    samples = report.normalize(waves).ravel()
+
+                # cut the rendered samples into chunks
+                while samples.size:
+                    take = min(chunk_samples - filled, samples.size)
+                    chunk[filled : filled + take] = samples[:take]
+                    samples = samples[take:]
+                    filled += take
+
+                    if filled == chunk_samples:
+                        yield chunk
+                        chunk = np.empty(chunk_samples, dtype=dtype)
+                        filled = 0
+                        self._account("normalization", chunk.nbytes)
+
+            if filled:
+                yield chunk[:filled]
 
     def play(self):
         """Plays the SpectroGraphic sound.
+
+        simpleaudio needs the whole sound in one buffer, so
+        this renders sound_array.
         """
 
         # get sound array
@@ -151,13 +797,149 @@ class SpectroGraphic(object):
         play_object = wave_object.play()
         play_object.wait_done()
 
-    def save(self, wav_file: Path = "SpectroGraphic.wav"):
-        """saves the spectrographic to a .wav file
+    def play_progressive(
+        self, sink=None, buffer_seconds: float = 2.0, prebuffer_columns: int = 4
+    ):
+        """Plays the sound while it is rendered, starting as soon as
+        the first prebuffer_columns columns are. The render runs at most
+        buffer_seconds ahead of the playhead.
 
-        We use the wavio module
+        The sound is streamed in a single pass, so peak normalization is
+        replaced by bound normalization, which never clips either.
+
+        Keyword Arguments:
+            sink {object} -- audio sink, see spectrographic.playback
+            (default: {SoundDeviceSink()})
+            buffer_seconds {float} -- size of the ring buffer (default: {2.0})
+            prebuffer_columns {int} -- columns rendered before playback
+            starts (default: {4})
+
+        Returns:
+            PlaybackMetrics -- latency, underruns and buffer depth
         """
 
-        wavio.write(wav_file, self.sound_array, self.SAMPLE_RATE)
+        normalization = self.NORMALIZATION
+        if normalization == "peak":
+            normalization = "bound"
+
+        player = ProgressivePlayer(
+            self,
+            SoundDeviceSink() if sink is None else sink,
+            buffer_seconds=buffer_seconds,
+            prebuffer_columns=prebuffer_columns,
+            normalization=normalization,
+        )
+        return player.play()
+
+    def save(self, wav_file: Path = "SpectroGraphic.wav", format: str = None):
+        """saves the spectrographic to a .wav file, or a .flac or .raw
+        file, see spectrographic.writers
+
+        The header is written right away and the 16-bit samples
+        follow chunk by chunk as they come out of iter_chunks. Peak
+        normalization without a scratch_dir renders sound_array first,
+        so that the columns are rendered once instead of twice.
+
+        With a render cache, a cached sound is written straight from
+        its memory map and a rendered one is stored along the way.
+
+        Keyword Arguments:
+            wav_file {Path} -- Path of the .wav file, "-" for stdout or
+            a binary file object (default: {"SpectroGraphic.wav"})
+            format {str} -- "wav", "flac" or "raw" (default: {from the
+            suffix of wav_file, else "wav"})
+        """
+
+        if not self.is_processed:
+            sound = self._from_cache()
+            if sound is not None:
+                self._sound_array = sound
+                self.is_processed = True
+
+        with self._profiled():
+            # streaming would render every column twice to find the peak
+            if not self.is_processed and not self._windowed:
+                self.sound_array
+
+            if self.cache is not None and not self.is_processed:
+                entry = self.cache.storing(self.cache_key, self.NUM_SAMPLES)
+            else:
+                entry = nullcontext()
+
+            with entry as stored:
+                writer = open_writer(
+                    wav_file, self.SAMPLE_RATE, self.NUM_SAMPLES, format
+                )
+                with writer:
+                    written = 0
+                    for chunk in self.iter_chunks():
+                        with self._stage("write"):
+                            writer.write(chunk)
+                        self._account("write", chunk.nbytes)
+
+                        if stored is not None:
+                            stored[written : written + len(chunk)] = chunk
+                        written += len(chunk)
+
+    async def render_async(self, limiter: RenderLimiter = None, executor=None):
+        """Renders sound_array without blocking the event loop. Cancelling
+        the awaiting task cancels the render.
+
+        Keyword Arguments:
+            limiter {RenderLimiter} -- bounds the renders running at once
+            (default: {spectrographic.aio.RENDER_LIMITER})
+            executor {Executor} -- where the render runs
+            (default: {the loop's default executor})
+
+        Returns:
+            np.ndarray -- sound_array
+        """
+        return await run_cancellable(self, lambda: self.sound_array, limiter, executor)
+
+    async def save_async(
+        self,
+        wav_file: Path = "SpectroGraphic.wav",
+        limiter: RenderLimiter = None,
+        executor=None,
+        format: str = None,
+    ):
+        """Like save, without blocking the event loop. Cancelling the
+        awaiting task cancels the render.
+
+        Keyword Arguments:
+            wav_file {Path} -- see save (default: {"SpectroGraphic.wav"})
+            limiter {RenderLimiter} -- bounds the renders running at once
+            (default: {spectrographic.aio.RENDER_LIMITER})
+            executor {Executor} -- where the render runs
+            (default: {the loop's default executor})
+            format {str} -- see save (default: {None})
+        """
+        await run_cancellable(
+            self, lambda: self.save(wav_file, format), limiter, executor
+        )
+
+    async def play_async(self, limiter: RenderLimiter = None, executor=None):
+        """Like play, without blocking the event loop. Cancelling the
+        awaiting task cancels the render or stops the playback.
+
+        Keyword Arguments:
+            limiter {RenderLimiter} -- bounds the renders running at once,
+            playing does not count (default: {spectrographic.aio.RENDER_LIMITER})
+            executor {Executor} -- where the render runs and the playback
+            is awaited (default: {the loop's default executor})
+        """
+
+        audio = await self.render_async(limiter, executor)
+
+        wave_object = sa.WaveObject(audio, 1, 2, self.SAMPLE_RATE)
+        play_object = wave_object.play()
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                executor, play_object.wait_done
+            )
+        except asyncio.CancelledError:
+            play_object.stop()
+            raise
 
 
 class ColumnToSound(object):
@@ -183,8 +965,38 @@ class ColumnToSound(object):
         (default: {3})
         contrast {float} -- Contrast between loud and quiet pixels
         (default: {5})
+        bank_cache {BankCache} -- Cache for the oscillator bank
+        (default: {spectrographic.banks.BANK_CACHE})
+        engine {str} -- Synthesis engine, one of spectrographic.engines.ENGINES
+        or "auto" to pick the fastest exact one (default: {"auto"})
+        num_columns {int} -- Number of columns we expect to render, used
+        when picking the engine automatically (default: {1})
+        batch_columns {int} -- Number of columns we expect to render at once,
+        used when picking the engine automatically (default: {64})
+        dtype {np.dtype} -- Float type of the oscillator bank and the sound
+        walls (default: {np.float64})
+        prune_threshold {float} -- Pixels whose weight (intensity to the
+        power of contrast) is below this are treated as silent. Their
+        oscillators are skipped where the engine can: pixels silent in
+        a whole batch, and every silent pixel of batches sparse enough for
+        the bank rows to be added up one by one. Otherwise they are zeroed
+        inside the product, which counts them in pixels_pruned but not in
+        oscillators_skipped (default: {0})
     """
 
+    # largest fraction of switched on pixels for which columns are
+    # rendered by adding up (weighted) bank rows instead of a product
+    BITMASK_DENSITY = 0.02
+
+    # counters of the work done so far
+    COUNTERS = (
+        "oscillators_evaluated",
+        "oscillators_skipped",
+        "pixels_pruned",
+        "columns_synthesized",
+        "columns_deduplicated",
+    )
+
     def __init__(
         self,
         duration: int,
@@ -194,6 +1006,12 @@ class ColumnToSound(object):
         y_resolution: int = 1000,
         num_tones: int = 3,
         contrast: float = 5,
+        bank_cache: BankCache = None,
+        engine: str = "auto",
+        num_columns: int = 1,
+        batch_columns: int = 64,
+        dtype=np.float64,
+        prune_threshold: float = 0,
     ):
         super(ColumnToSound, self).__init__()
 
@@ -220,6 +1038,51 @@ class ColumnToSound(object):
         # duration in seconds
         self.DURATION = duration
 
+        # number of samples in the sound of a single column
+        self.NUM_SAMPLES = int(duration * sample_rate)
+
+        # precision of the bank and the sound walls
+        self.DTYPE = np.dtype(dtype)
+        if self.DTYPE not in (np.float32, np.float64):
+            raise ValueError("dtype must be np.float32 or np.float64.")
+
+        # weights below this are skipped
+        self.PRUNE_THRESHOLD = prune_threshold
+
+        # how many oscillators were evaluated and skipped so far, how many
+        # pixels were silenced by the prune threshold and how many columns
+        # were synthesized or copied from an identical one
+        self.oscillators_evaluated = 0
+        self.oscillators_skipped = 0
+        self.pixels_pruned = 0
+        self.columns_synthesized = 0
+        self.columns_deduplicated = 0
+        self._counter_lock = threading.Lock()
+
+        # contrast weights of all 8-bit grey values
+        self._weight_table = (np.arange(256) / 255) ** contrast
+        self._weight_table = self._weight_table.astype(self.DTYPE)
+
+        # (Y_RESOLUTION, NUM_SAMPLES) array holding the summed tones
+        # of every pixel at full intensity. Built lazily and shared
+        # through the bank cache.
+        self._oscillator_bank = None
+        self.bank_cache = BANK_CACHE if bank_cache is None else bank_cache
+
+        # engine that renders the sound walls. If picked automatically
+        # the estimated seconds of every engine are kept around.
+        self.engine_estimates = None
+        if engine == "auto":
+            engine, self.engine_estimates = select_engine(
+                self, num_columns, batch_columns
+            )
+        elif engine not in ENGINES:
+            raise ValueError(
+                "engine must be auto or one of {}.".format(", ".join(sorted(ENGINES)))
+            )
+        self.ENGINE = engine
+        self.engine = ENGINES[engine](self)
+
     def _get_wave(self, freq: int, intensity: float = 1, duration: int = 1):
         """Core method that takes a frequency, intensity and duration
         and returns an array representing the corresponding sound.
@@ -301,6 +1164,242 @@ class ColumnToSound(object):
 
         return wave
 
+    @property
+    def tone_frequencies(self):
+        """Frequencies of all tones used to draw each pixel.
+
+        Row y holds the base frequency of the y'th pixel from the top
+        followed by its NUM_TONES filling tones, exactly as used
+        by pixel_to_sound.
+
+        Returns:
+            np.ndarray -- (Y_RESOLUTION, NUM_TONES + 1) array of frequencies
+        """
+
+        y = np.arange(self.Y_RESOLUTION)
+
+        freqs = np.empty((self.Y_RESOLUTION, self.NUM_TONES + 1))
+
+        # base frequencies, same formula as in pixel_to_sound
+        freqs[:, 0] = (self.MAX_FREQ - self.MIN_FREQ) / (self.Y_RESOLUTION) * (
+            self.Y_RESOLUTION - y
+        ) + self.MIN_FREQ
+
+        # tones are accumulated the same way pixel_to_sound does it
+        for k in range(1, self.NUM_TONES + 1):
+            freqs[:, k] = freqs[:, k - 1] + self.tone_delta
+
+        return freqs
+
+    def _build_oscillator_bank(self):
+        """Builds the oscillator bank, i.e. the sound of every pixel in
+        the column at full intensity.
+
+        The phases are always computed in double precision, so a
+        single precision bank is as accurate as it can be.
+
+        Returns:
+            np.ndarray -- (Y_RESOLUTION, NUM_SAMPLES) array
+        """
+
+        # get timesteps
+        t = np.linspace(
+            start=0, stop=self.DURATION, num=self.NUM_SAMPLES, endpoint=False
+        )
+
+        freqs = self.tone_frequencies
+
+        bank = np.empty((self.Y_RESOLUTION, self.NUM_SAMPLES), dtype=self.DTYPE)
+
+        # the bank is built a few rows at a time, adding up the tones of
+        # each pixel one tone at a time, so the double precision
+        # temporaries stay small.
+        rows = max(1, 2 ** 18 // max(self.NUM_SAMPLES, 1))
+        for start in range(0, self.Y_RESOLUTION, rows):
+            stop = start + rows
+            pixels = np.zeros((len(freqs[start:stop]), self.NUM_SAMPLES))
+            for k in range(self.NUM_TONES + 1):
+                tones = np.outer(freqs[start:stop, k], t)
+                tones *= 2
+                tones *= np.pi
+                pixels += np.cos(tones, out=tones)
+            bank[start:stop] = pixels
+
+        return bank
+
+    @property
+    def bank_key(self):
+        """Parameters that fully determine the oscillator bank.
+        """
+        return (
+            self.SAMPLE_RATE,
+            self.NUM_SAMPLES,
+            self.DURATION,
+            self.MIN_FREQ,
+            self.MAX_FREQ,
+            self.Y_RESOLUTION,
+            self.NUM_TONES,
+            self.DTYPE.str,
+        )
+
+    @property
+    def oscillator_bank(self):
+        if self._oscillator_bank is None:
+            self._oscillator_bank = self.bank_cache.get(
+                self.bank_key, self._build_oscillator_bank
+            )
+        return self._oscillator_bank
+
+    def gen_soundwalls(self, columns: np.ndarray, out: np.ndarray = None):
+        """Takes a batch of columns and generates all of their
+        sound walls with the synthesis engine.
+
+        Arguments:
+            columns {np.ndarray} -- (n, Y_RESOLUTION) array of pixel
+            columns (values between 0 and 1)
+
+        Keyword Arguments:
+            out {np.ndarray} -- (n, NUM_SAMPLES) array to write the
+            sound walls into (default: {None})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+
+        Raises:
+            ValueError
+        """
+
+        columns = np.asarray(columns)
+        if columns.ndim == 2 and len(columns) > 1:
+
+            # identical columns of the batch, e.g. blank margins,
+            # are synthesized once and copied to all their places
+            unique, inverse = _unique_columns(columns)
+            if len(unique) < len(columns):
+                self.add_counters(columns_deduplicated=len(columns) - len(unique))
+                waves = self._synthesize(columns[unique])
+                if out is None:
+                    out = np.empty((len(columns), self.NUM_SAMPLES), dtype=self.DTYPE)
+                return np.take(waves, inverse, axis=0, out=out, mode="clip")
+
+        return self._synthesize(columns, out=out)
+
+    def _synthesize(self, columns: np.ndarray, out: np.ndarray = None):
+        """Sound walls of the columns from the synthesis engine,
+        see gen_soundwalls.
+        """
+
+        weights = self.weights(columns)
+        num_columns = weights.shape[0]
+        self.add_counters(columns_synthesized=num_columns)
+
+        if self.PRUNE_THRESHOLD > 0:
+            pruned = (weights < self.PRUNE_THRESHOLD) & (weights != 0)
+            self.add_counters(pixels_pruned=int(np.count_nonzero(pruned)))
+            weights[pruned] = 0
+
+        # columns with very few pixels switched on are added up straight
+        # from the bank, skipping every silent pixel
+        on = weights != 0
+        density = np.count_nonzero(on) / max(on.size, 1)
+        render_mask = getattr(self.engine, "render_mask", None)
+        if render_mask and density <= self.BITMASK_DENSITY:
+            self._count(num_columns * self.Y_RESOLUTION, np.count_nonzero(on))
+            if np.all(weights[on] == 1):
+                return render_mask(on, out=out)
+            return render_mask(on, out=out, weights=weights)
+
+        # pixels that are silent in every column of the batch are skipped
+        rows = np.flatnonzero(on.any(axis=0))
+        self._count(num_columns * self.Y_RESOLUTION, num_columns * len(rows))
+
+        if len(rows) == self.Y_RESOLUTION:
+            return self.engine.render(weights, out=out)
+        return self.engine.render(weights[:, rows], out=out, rows=rows)
+
+    def _count(self, pixels: int, rendered: int):
+        """Counts the oscillators of pixels pixels of which
+        rendered were rendered.
+        """
+        tones = self.NUM_TONES + 1
+        self.count_oscillators(rendered * tones, (pixels - rendered) * tones)
+
+    def count_oscillators(self, evaluated: int, skipped: int):
+        """Adds to the oscillator counters, safe to call from any thread.
+        """
+        self.add_counters(oscillators_evaluated=evaluated, oscillators_skipped=skipped)
+
+    def add_counters(self, **deltas):
+        """Adds to the COUNTERS, safe to call from any thread.
+        """
+        with self._counter_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    @property
+    def counters(self):
+        """Current values of the COUNTERS as a dict.
+        """
+        with self._counter_lock:
+            return {name: getattr(self, name) for name in self.COUNTERS}
+
+    @property
+    def dedup_ratio(self):
+        """Fraction of the columns copied from an identical one.
+        """
+        total = self.columns_synthesized + self.columns_deduplicated
+        return self.columns_deduplicated / total if total else 0.0
+
+    @property
+    def params(self):
+        """Keyword arguments that recreate this ColumnToSound
+        with the same engine.
+        """
+        return {
+            "duration": self.DURATION,
+            "sample_rate": self.SAMPLE_RATE,
+            "min_freq": self.MIN_FREQ,
+            "max_freq": self.MAX_FREQ,
+            "y_resolution": self.Y_RESOLUTION,
+            "num_tones": self.NUM_TONES,
+            "contrast": self.CONTRAST,
+            "engine": self.ENGINE,
+            "dtype": self.DTYPE.str,
+            "prune_threshold": self.PRUNE_THRESHOLD,
+        }
+
+    def weights(self, columns: np.ndarray):
+        """Turns pixel intensities into the amplitudes
+        of their tones.
+
+        Arguments:
+            columns {np.ndarray} -- (n, Y_RESOLUTION) array of pixel
+            columns, either intensities between 0 and 1 or 8-bit
+            grey values (np.uint8) that are mapped to them.
+
+        Returns:
+            np.ndarray -- (n, Y_RESOLUTION) array of weights
+
+        Raises:
+            ValueError
+        """
+
+        columns = np.atleast_2d(columns)
+
+        if columns.shape[-1] != self.Y_RESOLUTION:
+            raise ValueError("Columns must have Y_RESOLUTION pixels.")
+
+        # 8-bit columns are looked up, with CONTRAST already applied
+        if columns.dtype == np.uint8:
+            return self._weight_table[columns]
+
+        # Loudness should be between 0 and 1
+        if columns.size and (columns.min() < 0 or columns.max() > 1):
+            raise ValueError("Intensity must be between 0 and 1.")
+
+        # this is the only place that CONTRAST acts in
+        return (columns ** self.CONTRAST).astype(self.DTYPE, copy=False)
+
     def gen_soundwall(self, column: np.ndarray):
         """Takes a column of pixels and generates
         the sound wall.
@@ -315,13 +1414,23 @@ class ColumnToSound(object):
             np.ndarray -- soundwall
         """
 
-        # empty wave that we will add individual
-        # pixel sounds onto
-        wave = self.pixel_to_sound(0, 0)
+        return self.gen_soundwalls(column)[0]
 
-        # iterating over column, adding the pixel sounds
-        # of all pixels together to get the final wave.
-        for idx, intensity in enumerate(column):
-            wave += self.pixel_to_sound(idx, intensity)
 
-        return wave
+def _unique_columns(columns: np.ndarray):
+    """Finds identical columns by hashing their bytes.
+
+    Arguments:
+        columns {np.ndarray} -- (n, Y_RESOLUTION) array of columns
+
+    Returns:
+        tuple -- index of one column of every distinct kind and, for
+        every column, the position of its kind among those
+    """
+    first = {}
+    inverse = np.empty(len(columns), dtype=np.intp)
+    for i, column in enumerate(columns):
+        inverse[i] = first.setdefault(column.tobytes(), len(first))
+    unique = np.empty(len(first), dtype=np.intp)
+    unique[inverse] = np.arange(len(columns))
+    return unique, inverse
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Rendering many images in one go.
+
+Jobs with identical synthesis parameters are grouped so that they share
+their setup work (oscillator banks, engine selection) within a worker,
+and the groups are fanned out over a pool of worker processes.
+"""
+import csv
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from spectrographic.base import SpectroGraphic
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+# keyword arguments of SpectroGraphic a job may set, with their types
+PARAMS = {
+    "height": int,
+    "duration": float,
+    "min_freq": int,
+    "max_freq": int,
+    "sample_rate": int,
+    "num_tones": int,
+    "contrast": float,
+    "use_black_and_white": lambda value: str(value).lower() in ("1", "true", "yes"),
+    "engine": str,
+    "normalization": str,
+    "gain": float,
+    "dtype": str,
+    "prune_threshold": float,
+    "cache": str,
+    "scratch_dir": str,
+}
+
+
+class RenderJob(object):
+    """A single image to render.
+
+    Arguments:
+        image {Path} -- Path of the image
+        output {Path} -- Path of the .wav, .flac or .raw file to write
+
+    Keyword Arguments:
+        **params -- keyword arguments for SpectroGraphic, see PARAMS
+    """
+
+    def __init__(self, image: Path, output: Path, **params):
+        super(RenderJob, self).__init__()
+
+        unknown = set(params) - set(PARAMS)
+        if unknown:
+            raise ValueError("Unknown parameters: {}.".format(", ".join(unknown)))
+
+        self.image = Path(image)
+        self.output = Path(output)
+        self.params = params
+
+    @property
+    def group_key(self):
+        """Jobs with the same key share their synthesis setup.
+        """
+        return tuple(sorted(self.params.items()))
+
+    def __repr__(self):
+        return "RenderJob({}, {})".format(self.image, self.output)
+
+
+class JobResult(object):
+    """Outcome of a RenderJob.
+
+    Arguments:
+        job {RenderJob} -- the job
+        status {str} -- "ok" or "failed"
+        seconds {float} -- wall time of the job
+
+    Keyword Arguments:
+        error {str} -- error message if the job failed (default: {None})
+    """
+
+    def __init__(self, job: RenderJob, status: str, seconds: float, error=None):
+        super(JobResult, self).__init__()
+        self.job = job
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+
+    def __repr__(self):
+        description = "{} -> {}: {} ({:.2f}s)".format(
+            self.job.image, self.job.output, self.status, self.seconds
+        )
+        if self.error:
+            description += " " + self.error.strip().splitlines()[-1]
+        return description
+
+
+def render_job(job: RenderJob):
+    """Renders a job and saves its sound.
+
+    Returns:
+        JobResult -- how it went
+    """
+
+    start = time.perf_counter()
+    try:
+        SpectroGraphic(job.image, **job.params).save(job.output)
+    except Exception:
+        return JobResult(
+            job, "failed", time.perf_counter() - start, traceback.format_exc()
+        )
+    return JobResult(job, "ok", time.perf_counter() - start)
+
+
+def _render_jobs(jobs: list):
+    """Renders a list of jobs in a worker, one after the other.
+    """
+    return [render_job(job) for job in jobs]
+
+
+def _tasks(jobs: list, workers: int):
+    """Groups jobs by their synthesis parameters and splits the groups
+    into tasks so that large groups are still spread over all workers.
+    """
+
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.group_key, []).append(job)
+
+    for group in groups.values():
+        size = -(-len(group) // workers)
+        for start in range(0, len(group), size):
+            yield group[start : start + size]
+
+
+def render_many(jobs, workers: int = 1):
+    """Renders many jobs, streaming each sound to its output file.
+
+    Arguments:
+        jobs {iterable} -- RenderJobs to render
+
+    Keyword Arguments:
+        workers {int} -- number of worker processes, 1 renders
+        in this process (default: {1})
+
+    Returns:
+        iterator -- JobResult of each job as soon as it is done
+
+    Raises:
+        ValueError -- if workers is less than 1
+    """
+
+    if workers < 1:
+        raise ValueError("workers must be at least 1.")
+
+    return _results(list(jobs), workers)
+
+
+def _results(jobs: list, workers: int):
+    """Renders the jobs, see render_many.
+    """
+
+    if workers == 1:
+        for task in _tasks(jobs, 1):
+            for job in task:
+                yield render_job(job)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_jobs, task) for task in _tasks(jobs, workers)]
+        for future in as_completed(futures):
+            for result in future.result():
+                yield result
+
+
+def load_manifest(
+    manifest: Path, defaults: dict = None, output_dir: Path = None, suffix=".wav"
+):
+    """Reads jobs from a CSV or JSON lines manifest.
+
+    Every row needs an "image" and may have an "output" as well as any
+    of the parameters in PARAMS. Relative images are relative to the
+    manifest, relative outputs to output_dir. Missing outputs become
+    the image name with the suffix, whose format the sound is saved in.
+
+    Arguments:
+        manifest {Path} -- .csv file with a header row or .jsonl file
+
+    Keyword Arguments:
+        defaults {dict} -- parameters of rows that do not set them
+        (default: {None})
+        output_dir {Path} -- directory of the outputs
+        (default: {the manifest's directory})
+        suffix {str} -- suffix of missing outputs (default: {".wav"})
+
+    Returns:
+        list -- RenderJobs of the manifest
+
+    Raises:
+        ValueError
+    """
+
+    manifest = Path(manifest)
+    output_dir = manifest.parent if output_dir is None else Path(output_dir)
+
+    with open(manifest, newline="") as file:
+        if manifest.suffix == ".csv":
+            rows = list(csv.DictReader(file))
+        elif manifest.suffix in (".jsonl", ".ndjson"):
+            rows = [json.loads(line) for line in file if line.strip()]
+        else:
+            raise ValueError("Manifest must be a .csv or .jsonl file.")
+
+    jobs = []
+    for row in rows:
+        row = {key: value for key, value in row.items() if value not in ("", None)}
+
+        if "image" not in row:
+            raise ValueError("Every row of the manifest needs an image.")
+
+        image = manifest.parent / row.pop("image")
+        output = output_dir / row.pop("output", image.with_suffix(suffix).name)
+
+        params = dict(defaults or {})
+        for key, value in row.items():
+            if key not in PARAMS:
+                raise ValueError("Unknown manifest column: {}.".format(key))
+            params[key] = PARAMS[key](value)
+
+        jobs.append(RenderJob(image, output, **params))
+
+    return jobs
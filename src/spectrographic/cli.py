@@ -12,42 +12,80 @@ inside your current environment.
 """
 
 import argparse
+import json
 import sys
 from pathlib import Path
 
 from spectrographic import __version__
 from spectrographic.base import SpectroGraphic
+from spectrographic.batch import RenderJob, load_manifest, render_many
+from spectrographic.engines import ENGINES
+from spectrographic.normalization import NORMALIZATIONS
+from spectrographic.progress import ProgressBar
+from spectrographic.sequence import SpectroSequence
+from spectrographic.writers import FORMATS
 
 __author__ = "Levi Borodenko"
 __copyright__ = "Levi Borodenko"
 __license__ = "mit"
 
 
-def parse_args(args):
+def parse_args(args, exit_on_error=True):
     """Parse command line parameters
 
     Args:
       args ([str]): command line parameters as list of strings
+      exit_on_error (bool): print the usage and exit on invalid
+        parameters, instead of raising :obj:`argparse.ArgumentError`
 
     Returns:
       :obj:`argparse.Namespace`: command line parameters namespace
     """
     parser = argparse.ArgumentParser(
-        description="Turn any image into sound.", epilog="By Levi B."
+        description="Turn any image into sound.",
+        epilog="By Levi B.",
+        exit_on_error=exit_on_error,
     )
     parser.add_argument(
         "--version",
         action="version",
         version="spectrographic {ver}".format(ver=__version__),
     )
-    parser.add_argument(
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
         "-i",
         "--image",
         dest="path_to_image",
-        help="Path of image that we want to embed in a spectrogram.",
+        help="Path of image that we want to embed in a spectrogram. "
+        "Several images are rendered in one go into --output-dir.",
+        type=Path,
+        action="store",
+        nargs="+",
+    )
+    source.add_argument(
+        "--manifest",
+        dest="manifest",
+        help="CSV or JSON lines file with one image and its parameters "
+        "per row, rendered in one go into --output-dir.",
         type=Path,
         action="store",
-        required=True,
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        dest="output_dir",
+        help="Directory for the .wav files when rendering several images.",
+        type=Path,
+        action="store",
+        default=Path("."),
+    )
+    parser.add_argument(
+        "--sequence",
+        dest="sequence",
+        help="Render every frame of an animated image, or the images in a "
+        "directory, matching a glob pattern or given to --image, into one "
+        "continuous sound. --duration is then the duration of every frame.",
+        action="store_true",
     )
     parser.add_argument(
         "-d",
@@ -56,7 +94,7 @@ def parse_args(args):
         help="Duration of generated sound.",
         action="store",
         default=20,
-        type=int,
+        type=float,
     )
     parser.add_argument(
         "-m",
@@ -94,6 +132,117 @@ def parse_args(args):
         default=3,
         type=int,
     )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        dest="engine",
+        help="Synthesis engine used to render the sound. "
+        "By default the fastest exact one is picked, fft is only used "
+        "when asked for.",
+        action="store",
+        default="auto",
+        choices=["auto"] + sorted(ENGINES),
+    )
+    parser.add_argument(
+        "--explain-engine",
+        action="store_true",
+        dest="explain_engine",
+        help="Print which engine was used and why.",
+    )
+    parser.add_argument(
+        "-n",
+        "--normalization",
+        dest="normalization",
+        help="How the sound is scaled to full volume. Everything but peak "
+        "lets the sound be written while it is rendered.",
+        action="store",
+        default="peak",
+        choices=NORMALIZATIONS,
+    )
+    parser.add_argument(
+        "-g",
+        "--gain",
+        dest="gain",
+        help="Scale of the raw sound relative to full volume, "
+        "used by the fixed normalization.",
+        action="store",
+        default=None,
+        type=float,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        dest="jobs",
+        help="Number of processes or threads that render the sound. "
+        "When rendering several images, the number of images "
+        "rendered in parallel.",
+        action="store",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--backend",
+        dest="backend",
+        help="Whether the jobs are processes or threads.",
+        action="store",
+        default="process",
+        choices=["process", "thread"],
+    )
+    parser.add_argument(
+        "--blas-threads",
+        dest="blas_threads",
+        help="BLAS threads of every job of the thread backend, "
+        "0 leaves BLAS alone.",
+        action="store",
+        default=1,
+        type=int,
+    )
+    parser.add_argument(
+        "--prune-db",
+        dest="prune_db",
+        help="Silence pixels quieter than this many dB below full volume, "
+        "e.g. -60. Their oscillators are skipped where the engine can.",
+        action="store",
+        default=None,
+        type=float,
+    )
+    parser.add_argument(
+        "--float32",
+        action="store_const",
+        dest="dtype",
+        const="float32",
+        default="float64",
+        help="Render in single precision, which halves memory use.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        help="Directory in which rendered sounds are cached, so that "
+        "rendering the same image with the same parameters again is free.",
+        action="store",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        dest="scratch_dir",
+        help="Directory of a scratch file that holds the sound while it is "
+        "rendered instead of memory, for sounds larger than memory.",
+        action="store",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--profile",
+        dest="profile",
+        help="Write the time and memory spent in every stage of the "
+        "rendering as JSON to this file, or to stderr if none is given.",
+        action="store",
+        nargs="?",
+        const="-",
+        default=None,
+        type=str,
+    )
     parser.add_argument(
         "-p",
         "--play",
@@ -101,39 +250,217 @@ def parse_args(args):
         dest="play",
         help="Directly play the resulting sound.",
     )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        dest="progressive",
+        help="Start playing while the sound is still rendered "
+        "(needs the sounddevice package).",
+    )
     parser.add_argument(
         "-s",
         "--save",
         dest="save_file",
-        help="Path to .wav file in which to save the resulting sound.",
+        help="Path to .wav file in which to save the resulting sound. "
+        "Use - to stream it to stdout. Files ending in .flac or .raw are "
+        "saved as FLAC or headerless 16-bit PCM.",
         action="store",
-        default="SoundGraphic.wav",
+        default=None,
         type=str,
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        dest="format",
+        help="Format of the saved sound, by default taken from the file "
+        "name. flac needs the soundfile package.",
+        action="store",
+        default=None,
+        choices=sorted(FORMATS),
+    )
     return parser.parse_args(args)
 
 
+def explain_engine(col_to_sound):
+    """Describes which engine renders the sound and why.
+
+    Args:
+      col_to_sound (:obj:`ColumnToSound`): column to sound converter
+
+    Returns:
+      str: human readable description
+    """
+    if col_to_sound.engine_estimates is None:
+        return "engine: {} (chosen by user)".format(col_to_sound.ENGINE)
+
+    estimates = ", ".join(
+        "{} {}".format(name, "n/a" if cost is None else "{:.3g}s".format(cost))
+        for name, cost in sorted(col_to_sound.engine_estimates.items())
+    )
+    return "engine: {} (estimated: {})".format(col_to_sound.ENGINE, estimates)
+
+
+def synthesis_params(args):
+    """SpectroGraphic keyword arguments from the command line parameters.
+
+    Args:
+      args (:obj:`argparse.Namespace`): command line parameters namespace
+
+    Returns:
+      dict: keyword arguments
+    """
+    return {
+        "height": args.resolution,
+        "duration": args.duration,
+        "min_freq": args.min_freq,
+        "max_freq": args.max_freq,
+        "contrast": args.contrast,
+        "engine": args.engine,
+        "normalization": args.normalization,
+        "gain": args.gain,
+        "dtype": args.dtype,
+        "prune_threshold": 0 if args.prune_db is None else 10 ** (args.prune_db / 20),
+        "cache": args.cache_dir,
+        "scratch_dir": args.scratch_dir,
+    }
+
+
+def output_suffix(args):
+    """Suffix of the files sounds are saved to without a given name."""
+    return "." + (args.format or "wav")
+
+
+def main_many(args):
+    """Renders several images or a manifest and reports on every job.
+
+    Args:
+      args (:obj:`argparse.Namespace`): command line parameters namespace
+
+    Returns:
+      int: number of failed jobs
+    """
+
+    if args.manifest is not None:
+        jobs = load_manifest(
+            args.manifest,
+            defaults=synthesis_params(args),
+            output_dir=args.output_dir,
+            suffix=output_suffix(args),
+        )
+    else:
+        jobs = [
+            RenderJob(
+                image,
+                args.output_dir / image.with_suffix(output_suffix(args)).name,
+                **synthesis_params(args)
+            )
+            for image in args.path_to_image
+        ]
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    for result in render_many(jobs, workers=args.jobs):
+        print(result, file=sys.stderr)
+        results.append(result)
+
+    failed = sum(result.status != "ok" for result in results)
+    print(
+        "{} of {} images rendered in {:.2f}s of rendering time.".format(
+            len(results) - failed, len(results), sum(r.seconds for r in results)
+        ),
+        file=sys.stderr,
+    )
+
+    return failed
+
+
 def main(args):
     """Main entry point allowing external calls
 
     Args:
       args ([str]): command line parameter list
     """
+    if args[:1] == ["serve"]:
+        from spectrographic.server import main as serve
+
+        return serve(args[1:])
+
     args = parse_args(args)
 
-    sg = SpectroGraphic(
-        path=args.path_to_image,
-        height=args.resolution,
-        duration=args.duration,
-        min_freq=args.min_freq,
-        max_freq=args.max_freq,
-        contrast=args.contrast,
+    if args.manifest is not None or (len(args.path_to_image) > 1 and not args.sequence):
+        if main_many(args):
+            sys.exit(1)
+        return
+
+    # stats of every render, i.e. playing and saving
+    renders = []
+
+    params = dict(
+        workers=args.jobs,
+        backend=args.backend,
+        blas_threads=args.blas_threads or None,
+        on_stats=None if args.profile is None else renders.append,
+        progress=ProgressBar() if sys.stderr.isatty() else None,
+        **synthesis_params(args)
     )
 
-    if args.play:
+    if args.sequence:
+        paths = args.path_to_image
+        sg = SpectroSequence(
+            paths[0] if len(paths) == 1 else paths,
+            frame_duration=params.pop("duration"),
+            **params
+        )
+    else:
+        sg = SpectroGraphic(path=args.path_to_image[0], **params)
+
+    if args.explain_engine:
+        print(explain_engine(sg.col_to_sound), file=sys.stderr)
+
+    if args.play and args.progressive:
+        print(sg.play_progressive(), file=sys.stderr)
+    elif args.play:
         sg.play()
 
-    sg.save(wav_file=args.save_file)
+    save_file = args.save_file
+    if save_file is None:
+        save_file = "SoundGraphic" + output_suffix(args)
+    sg.save(wav_file=save_file, format=args.format)
+
+    # sounds from the cache come without a report
+    if args.normalization != "peak" and sg.normalization_report is not None:
+        print(sg.normalization_report, file=sys.stderr)
+
+    if sg.cache is not None:
+        print(sg.cache, file=sys.stderr)
+
+    if args.prune_db is not None:
+        col_to_sound = sg.col_to_sound
+        total = col_to_sound.oscillators_evaluated + col_to_sound.oscillators_skipped
+        print(
+            "oscillators: {} of {} skipped, pixels: {} pruned".format(
+                col_to_sound.oscillators_skipped, total, col_to_sound.pixels_pruned
+            ),
+            file=sys.stderr,
+        )
+
+    if args.profile is not None:
+        write_profile(renders, args.profile)
+
+
+def write_profile(renders, profile_file: str):
+    """Writes the RenderStats of the renders as JSON.
+
+    Args:
+      renders ([:obj:`RenderStats`]): stats of every render
+      profile_file (str): path of the JSON file, "-" for stderr
+    """
+    profile = json.dumps([stats.as_dict() for stats in renders], indent=2)
+    if profile_file == "-":
+        print(profile, file=sys.stderr)
+    else:
+        Path(profile_file).write_text(profile + "\n")
 
 
 def run():
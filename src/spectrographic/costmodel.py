@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Calibrated cost model used to pick a synthesis engine.
+
+The cost of an engine is modelled as a linear combination of a few
+primitive operations (cosine evaluations, multiply-accumulates of a
+matrix product, FFT butterflies and phasor rotations). The seconds per
+primitive are measured once by a small micro-benchmark and cached per
+machine in the user's cache directory.
+"""
+import json
+import os
+import platform
+import time
+from pathlib import Path
+
+import numpy as np
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+# file holding the calibrations of all machines that share the home dir
+CALIBRATION_FILE = (
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+    / "spectrographic"
+    / "calibration.json"
+)
+
+# calibration of this process, so we only read the file once
+_calibration = None
+
+
+def machine_key():
+    """Identifies the machine and numpy build a calibration belongs to.
+    """
+    return "{}|{}|{}|numpy-{}".format(
+        platform.node(), platform.machine(), platform.processor(), np.__version__
+    )
+
+
+def _best_time(func, repeat: int = 3):
+    """Best wall time of func() in seconds out of repeat runs.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_micro_benchmark():
+    """Measures the seconds per primitive operation on this machine.
+    Takes a fraction of a second.
+
+    Returns:
+        dict -- seconds per "cos", "gemm", "fft" and "rotate" operation
+    """
+
+    rng = np.random.default_rng(0)
+
+    # cosine evaluations
+    phases = rng.random(2 ** 18)
+    cos = _best_time(lambda: np.cos(phases)) / phases.size
+
+    # multiply-accumulates of a matrix product
+    weights = rng.random((64, 256))
+    bank = rng.random((256, 4096))
+    gemm = _best_time(lambda: weights @ bank) / (64 * 256 * 4096)
+
+    # inverse real FFTs, per N log2(N)
+    spectra = rng.random((64, 2049))
+    fft = _best_time(lambda: np.fft.irfft(spectra, n=4096, axis=1)) / (
+        64 * 4096 * 12
+    )
+
+    # complex rotation and taking the real part
+    block = np.exp(1j * rng.random((256, 4096)))
+    phase = np.exp(1j * rng.random(256))
+    rotate = _best_time(lambda: (block * phase[:, None]).real) / block.size
+
+    return {"cos": cos, "gemm": gemm, "fft": fft, "rotate": rotate}
+
+
+def calibration(force: bool = False):
+    """Seconds per primitive operation on this machine.
+
+    Loaded from CALIBRATION_FILE if this machine has been calibrated
+    before, otherwise the micro-benchmark is run and its result stored.
+
+    Keyword Arguments:
+        force {bool} -- rerun the micro-benchmark (default: {False})
+
+    Returns:
+        dict -- seconds per primitive operation
+    """
+
+    global _calibration
+
+    if _calibration is not None and not force:
+        return _calibration
+
+    key = machine_key()
+
+    try:
+        calibrations = json.loads(CALIBRATION_FILE.read_text())
+    except (OSError, ValueError):
+        calibrations = {}
+
+    if key in calibrations and not force:
+        _calibration = calibrations[key]
+        return _calibration
+
+    _calibration = run_micro_benchmark()
+    calibrations[key] = _calibration
+
+    # not being able to cache it only costs us a rerun next time
+    try:
+        CALIBRATION_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = CALIBRATION_FILE.with_suffix(".{}.tmp".format(os.getpid()))
+        tmp_file.write_text(json.dumps(calibrations, indent=2))
+        os.replace(tmp_file, CALIBRATION_FILE)
+    except OSError:
+        pass
+
+    return _calibration
+
+
+def estimate(terms: dict):
+    """Estimated seconds of a workload.
+
+    Arguments:
+        terms {dict} -- number of each primitive operation
+
+    Returns:
+        float -- estimated seconds
+    """
+    seconds_per_op = calibration()
+    return sum(seconds_per_op[op] * count for op, count in terms.items())
@@ -0,0 +1,665 @@
+# -*- coding: utf-8 -*-
+"""
+Synthesis engines used by ColumnToSound.
+
+An engine takes a batch of contrast-weighted pixel columns and renders
+the corresponding sound walls. All engines draw the same tones as
+ColumnToSound.pixel_to_sound, they only differ in how the sum of
+cosines is computed.
+
+Engines are registered with register_engine. Each of them describes its
+workload in terms of the primitive operations of the cost model, which
+lets select_engine pick the fastest one for a given job. What an engine
+builds once and reuses between renders is built lazily, or up front by
+prepare, e.g. before worker processes are forked off. Only exact
+engines are picked automatically, approximate ones have to be asked for
+by name.
+"""
+import math
+import threading
+
+import numpy as np
+
+from spectrographic import costmodel
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+# available engines by name
+ENGINES = {}
+
+
+class Scratch(threading.local):
+    """Per-thread scratch buffers that are reused between renders,
+    so threads rendering in parallel never compete for allocations.
+    """
+
+    def get(self, name: str, shape: tuple, dtype=np.float64):
+        """Uninitialised array of the given shape, backed by the
+        buffer called name of the current thread.
+        """
+        size = int(np.prod(shape))
+        buf = self.__dict__.get(name)
+        if buf is None or buf.size < size or buf.dtype != dtype:
+            buf = np.empty(size, dtype=dtype)
+            setattr(self, name, buf)
+        return buf[:size].reshape(shape)
+
+
+def register_engine(engine):
+    """Class decorator adding an engine to ENGINES under its name.
+    """
+    ENGINES[engine.name] = engine
+    return engine
+
+
+def select_engine(col_to_sound, num_columns: int = 1, batch_columns: int = 64):
+    """Picks the exact engine with the lowest estimated cost.
+
+    The estimates only depend on the parameters of the job and the
+    calibration of the machine, never on what happens to be cached, so
+    the same job is always rendered by the same engine. Engines whose
+    memory does not fit, e.g. a bank larger than the bank cache, are
+    not eligible.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        that will use the engine
+
+    Keyword Arguments:
+        num_columns {int} -- number of columns that will be rendered
+        (default: {1})
+        batch_columns {int} -- number of columns rendered by a single
+        call of the engine (default: {64})
+
+    Returns:
+        tuple -- name of the fastest engine and a dict with the
+        estimated seconds of every engine (None if it is approximate
+        or not eligible)
+    """
+
+    estimates = {}
+    for name, engine in ENGINES.items():
+        if engine.exact and engine.eligible(col_to_sound):
+            estimates[name] = costmodel.estimate(
+                engine.cost_terms(col_to_sound, num_columns, batch_columns)
+            )
+        else:
+            estimates[name] = None
+
+    eligible = {name: cost for name, cost in estimates.items() if cost is not None}
+
+    return min(eligible, key=eligible.get), estimates
+
+
+@register_engine
+class BankEngine(object):
+    """Renders columns as a matrix product of the weights with the
+    oscillator bank of the ColumnToSound.
+
+    It is only picked automatically for banks that fit into the bank
+    cache of the ColumnToSound. Larger ones would be built again for
+    every render and take up memory that the phasor engine does not need.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        whose parameters we synthesize with
+    """
+
+    name = "bank"
+    exact = True
+
+    def __init__(self, col_to_sound):
+        super(BankEngine, self).__init__()
+        self.col_to_sound = col_to_sound
+
+    @staticmethod
+    def eligible(col_to_sound):
+        num_bytes = (
+            col_to_sound.Y_RESOLUTION
+            * col_to_sound.NUM_SAMPLES
+            * np.dtype(col_to_sound.DTYPE).itemsize
+        )
+        return num_bytes <= col_to_sound.bank_cache.max_bytes
+
+    @staticmethod
+    def cost_terms(col_to_sound, num_columns: int, batch_columns: int):
+        """Primitive operations needed to render num_columns columns
+        in batches of batch_columns.
+        """
+        height = col_to_sound.Y_RESOLUTION
+        num_samples = col_to_sound.NUM_SAMPLES
+        oscillators = height * (col_to_sound.NUM_TONES + 1)
+
+        return {
+            "cos": oscillators * num_samples,
+            "gemm": num_columns * height * num_samples,
+        }
+
+    def prepare(self):
+        """Builds the oscillator bank."""
+        self.col_to_sound.oscillator_bank
+
+    def render(self, weights: np.ndarray, out: np.ndarray = None, rows=None):
+        """Renders the sound walls of a batch of weighted columns.
+
+        Arguments:
+            weights {np.ndarray} -- (n, len(rows)) array of
+            contrast-weighted intensities
+
+        Keyword Arguments:
+            out {np.ndarray} -- (n, NUM_SAMPLES) array to write into
+            (default: {None})
+            rows {np.ndarray} -- pixels the weights belong to, all other
+            pixels are silent (default: {all pixels})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        bank = self.col_to_sound.oscillator_bank
+        if rows is not None:
+            bank = bank[rows]
+
+        return np.matmul(weights, bank, out=out)
+
+    def render_mask(
+        self, mask: np.ndarray, out: np.ndarray = None, weights: np.ndarray = None
+    ):
+        """Renders the sound walls of columns by adding up the rows of the
+        oscillator bank that are switched on, scaled by their weights if
+        given. Cheaper than render when very few pixels are on.
+
+        Arguments:
+            mask {np.ndarray} -- (n, Y_RESOLUTION) boolean array of the
+            pixels that are on
+
+        Keyword Arguments:
+            out {np.ndarray} -- (n, NUM_SAMPLES) array to write into
+            (default: {None})
+            weights {np.ndarray} -- (n, Y_RESOLUTION) weights of the pixels,
+            all pixels that are on weigh 1 if None (default: {None})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        bank = self.col_to_sound.oscillator_bank
+
+        if out is None:
+            out = np.empty((mask.shape[0], bank.shape[1]), dtype=bank.dtype)
+
+        for i, (column, on) in enumerate(zip(out, mask)):
+            if weights is None:
+                np.add.reduce(bank[on], axis=0, out=column)
+            else:
+                np.matmul(weights[i, on].astype(bank.dtype), bank[on], out=column)
+
+        return out
+
+
+@register_engine
+class FFTEngine(object):
+    """Renders columns with inverse real FFTs.
+
+    Every tone is drawn into its nearest bin of an FFT over a column,
+    that is a grid of size >= NUM_SAMPLES points (the next length with
+    no prime factor above 5) at the same sample rate. The tone lies
+    delta bins off that bin, |delta| <= 1/2, and the phase it gains
+    against the bin over the column is expanded in Chebyshev polynomials
+    T_m of the time v within the column (Jacobi-Anger expansion):
+
+        exp(i z v) = sum_m eps_m i^m J_m(z) T_m(v),   |z| <= pi / 2
+
+    A column is then the sum of num_terms irffts, each multiplied by its
+    polynomial, and columns are laid next to each other at a hop of
+    NUM_SAMPLES exactly like the additive synthesis does. The Bessel
+    coefficients J_m(z) fall off like (pi / 4)^m / m!, num_terms is
+    chosen so that every unit tone stays within MAX_TONE_ERROR of the
+    exact cosine. As all tones of a column start in phase, its peak is
+    the sum of the weights of its tones, so the error of a normalized
+    render is at most MAX_TONE_ERROR of full scale.
+
+    The spectra are filled from a table of the pixels drawn into every
+    occupied bin and their coefficients, so a column costs num_terms
+    transforms of about NUM_SAMPLES points and a product with the few
+    pixels of each bin, no matter how tall the image is.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        whose parameters we synthesize with
+    """
+
+    name = "fft"
+    exact = False
+
+    # largest difference between a unit tone and the exact cosine
+    MAX_TONE_ERROR = 1e-5
+
+    # memory budget of the spectra transformed at once
+    SPECTRA_BYTES = 16 * 2 ** 20
+
+    def __init__(self, col_to_sound):
+        super(FFTEngine, self).__init__()
+        self.col_to_sound = col_to_sound
+
+        self.size = self.get_size(col_to_sound)
+        self.num_terms = self.get_num_terms()
+
+        # bin table and Chebyshev polynomials, built lazily
+        self._layout = None
+        self._scratch = Scratch()
+
+    @staticmethod
+    def get_size(col_to_sound):
+        """Smallest length of at least NUM_SAMPLES with no prime factor
+        above 5, which the FFT handles fastest.
+        """
+        num_samples = max(col_to_sound.NUM_SAMPLES, 2)
+
+        size = None
+        fives = 1
+        while fives < 2 * num_samples:
+            threes = fives
+            while threes < 2 * num_samples:
+                twos = threes
+                while twos < num_samples:
+                    twos *= 2
+                size = twos if size is None else min(size, twos)
+                threes *= 3
+            fives *= 5
+        return size
+
+    @classmethod
+    def get_num_terms(cls):
+        """Number of terms of the expansion after which the remaining
+        ones add up to less than MAX_TONE_ERROR.
+        """
+
+        # |J_m(z)| <= (|z| / 2)^m / m! and |z| <= pi / 2
+        bounds = [2 * (math.pi / 4) ** m / math.factorial(m) for m in range(40)]
+        for num_terms in range(1, len(bounds)):
+            if sum(bounds[num_terms:]) <= cls.MAX_TONE_ERROR:
+                return num_terms
+        return len(bounds)
+
+    @staticmethod
+    def eligible(col_to_sound):
+        return True
+
+    @classmethod
+    def cost_terms(cls, col_to_sound, num_columns: int, batch_columns: int):
+        """Primitive operations needed to render num_columns columns
+        in batches of batch_columns.
+        """
+        size = cls.get_size(col_to_sound)
+        return {"fft": num_columns * cls.get_num_terms() * size * math.log2(size)}
+
+    @staticmethod
+    def bessel(order: int, z: np.ndarray):
+        """Bessel function of the first kind J_order(z) for |z| <= pi / 2,
+        summed from its power series.
+        """
+        term = (z / 2) ** order / math.factorial(order)
+        total = term.copy()
+        for k in range(1, 16):
+            term = term * -((z / 2) ** 2) / (k * (k + order))
+            total += term
+        return total
+
+    def prepare(self):
+        """Builds the bin table and the Chebyshev polynomials."""
+        if self._layout is None:
+            self._layout = self._build_layout()
+
+    def _build_layout(self):
+        """Maps every tone of every pixel onto its bin of the rfft.
+
+        Returns:
+            tuple -- the lowest occupied bin, the pixels drawn into each bin
+            from there on (padded with pixel 0), their real and imaginary
+            coefficients for every term (padded with 0) and the Chebyshev
+            polynomials of every term over the samples of a column.
+        """
+
+        num_samples = self.col_to_sound.NUM_SAMPLES
+        size, num_terms = self.size, self.num_terms
+
+        # (Y_RESOLUTION * (NUM_TONES + 1),) tones in pixel major order.
+        # A column samples its tones at t = j DURATION / NUM_SAMPLES, so a
+        # tone of frequency f goes round f DURATION size / NUM_SAMPLES
+        # times over the grid.
+        freqs = self.col_to_sound.tone_frequencies
+        pixels = np.repeat(np.arange(freqs.shape[0]), freqs.shape[1])
+        duration = self.col_to_sound.DURATION
+        position = freqs.ravel() * duration * size / max(num_samples, 1)
+        bins = np.rint(position)
+        delta = position - bins
+        bins = bins.astype(np.int64) % size
+
+        # the phase 2 pi delta j / size of a tone against its bin is
+        # pi delta (ratio + ratio v) with v = 2 j / NUM_SAMPLES - 1
+        ratio = num_samples / size
+        z = np.pi * delta * ratio
+        terms = np.arange(num_terms)
+        coefficients = (
+            np.exp(1j * z)[:, None]
+            * np.where(terms == 0, 1, 2)
+            * 1j ** terms
+            * np.stack([self.bessel(m, z) for m in terms], axis=1)
+        )
+
+        # a cosine is half a tone in its bin and half the conjugate in
+        # the mirrored one, of which the irfft only keeps those below
+        # the Nyquist frequency. Both halves of the DC and Nyquist bins
+        # land in the same bin and add up to the real part, which is all
+        # the irfft keeps of them.
+        half = size // 2 + 1
+        mirrored = (size - bins) % size
+        lower, upper = bins < half, mirrored < half
+        bins = np.concatenate([bins[lower], mirrored[upper]])
+        pixels = np.concatenate([pixels[lower], pixels[upper]])
+        coefficients = np.concatenate(
+            [coefficients[lower], np.conj(coefficients[upper])]
+        )
+        coefficients *= size / 2
+
+        # tones of the same pixel in the same bin are merged
+        height = self.col_to_sound.Y_RESOLUTION
+        keys = bins * height + pixels
+        order = np.argsort(keys, kind="stable")
+        keys, starts = np.unique(keys[order], return_index=True)
+        merged = np.add.reduceat(
+            np.concatenate([coefficients.real, coefficients.imag], axis=1)[order],
+            starts,
+            axis=0,
+        )
+        bins, pixels = keys // height, keys % height
+
+        # and laid out bin by bin from the lowest to the highest occupied
+        # one, padded with silent pixels to the fullest bin
+        first = bins[0]
+        counts = np.bincount(bins - first)
+        table = bins - first
+        slots = np.arange(len(bins)) - np.repeat(np.cumsum(counts) - counts, counts)
+        bin_pixels = np.zeros((len(counts), counts.max()), dtype=np.int64)
+        bin_pixels[table, slots] = pixels
+        bin_coefficients = np.zeros((len(counts), counts.max(), 2 * num_terms))
+        bin_coefficients[table, slots] = merged
+
+        # Chebyshev polynomials by their recurrence
+        v = 2 * np.arange(num_samples) / num_samples - 1
+        polynomials = np.empty((num_terms, num_samples))
+        polynomials[0] = 1
+        if num_terms > 1:
+            polynomials[1] = v
+        for m in range(2, num_terms):
+            polynomials[m] = 2 * v * polynomials[m - 1] - polynomials[m - 2]
+
+        return first, bin_pixels, bin_coefficients, polynomials
+
+    def render(self, weights: np.ndarray, out: np.ndarray = None, rows=None):
+        """Renders the sound walls of a batch of weighted columns.
+
+        Arguments:
+            weights {np.ndarray} -- (n, len(rows)) array of
+            contrast-weighted intensities
+
+        Keyword Arguments:
+            out {np.ndarray} -- (n, NUM_SAMPLES) array to write into
+            (default: {None})
+            rows {np.ndarray} -- pixels the weights belong to, all other
+            pixels are silent (default: {all pixels})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        # the FFT costs the same no matter how many pixels are on
+        if rows is not None:
+            full_weights = np.zeros(
+                (weights.shape[0], self.col_to_sound.Y_RESOLUTION), weights.dtype
+            )
+            full_weights[:, rows] = weights
+            weights = full_weights
+
+        self.prepare()
+        first, bin_pixels, bin_coefficients, polynomials = self._layout
+        last = first + len(bin_pixels)
+
+        num_samples = self.col_to_sound.NUM_SAMPLES
+        size, num_terms = self.size, self.num_terms
+
+        if out is None:
+            out = np.empty(
+                (weights.shape[0], num_samples), dtype=self.col_to_sound.DTYPE
+            )
+
+        # the spectra of all terms are transformed a few columns at a time
+        step = max(1, self.SPECTRA_BYTES // (16 * num_terms * (size // 2 + 1)))
+        step = min(step, weights.shape[0])
+        buffer = self._scratch.get(
+            "spectra", (step, num_terms, size // 2 + 1), np.complex128
+        )
+        buffer[:, :, :first] = 0
+        buffer[:, :, last:] = 0
+
+        for start in range(0, weights.shape[0], step):
+            stop = min(start + step, weights.shape[0])
+            spectra = buffer[: stop - start]
+
+            # (bins, columns, 2 * num_terms) real and imaginary parts
+            products = np.matmul(
+                weights[start:stop, bin_pixels].transpose(1, 0, 2), bin_coefficients
+            )
+            products = products.transpose(1, 2, 0)
+            spectra.real[:, :, first:last] = products[:, :num_terms]
+            spectra.imag[:, :, first:last] = products[:, num_terms:]
+
+            # each term weighted by its polynomial
+            waves = np.fft.irfft(spectra, n=size, axis=2)[:, :, :num_samples]
+            np.einsum(
+                "cmj,mj->cj",
+                waves,
+                polynomials,
+                out=out[start:stop],
+                casting="same_kind",
+            )
+
+        return out
+
+
+@register_engine
+class PhasorEngine(object):
+    """Renders columns with complex phasor oscillators instead of
+    evaluating a cosine for every sample.
+
+    Every tone is a unit phasor that is rotated by its angular step
+    per sample. The samples are produced in cache-sized blocks: the
+    phasors of the first block are built from a handful of exact
+    rotations by repeated doubling, every later block is the first
+    one rotated by the phasor at its start, and those start phasors are
+    advanced from block to block by a rotation recurrence. The start
+    phasors are renormalised after every step and resynchronised with
+    an exact exponential every RESYNC_BLOCKS blocks, which bounds the
+    numerical drift. Agrees with the bank engine to within 1e-9 per
+    unit oscillator.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        whose parameters we synthesize with
+
+    Keyword Arguments:
+        block_size {int} -- samples per block. By default chosen so that
+        the phasors of one block take about BLOCK_BYTES. (default: {None})
+    """
+
+    name = "phasor"
+    exact = True
+
+    # memory budget of the phasors of a single block
+    BLOCK_BYTES = 2 * 2 ** 20
+
+    # number of blocks after which the recurrence is resynchronised
+    RESYNC_BLOCKS = 32
+
+    def __init__(self, col_to_sound, block_size: int = None):
+        super(PhasorEngine, self).__init__()
+        self.col_to_sound = col_to_sound
+
+        num_oscillators = col_to_sound.Y_RESOLUTION * (col_to_sound.NUM_TONES + 1)
+
+        # complex type matching the precision of the ColumnToSound
+        self.complex_dtype = np.result_type(col_to_sound.DTYPE, np.complex64)
+
+        if block_size is None:
+            block_size = max(
+                64,
+                self.BLOCK_BYTES // (self.complex_dtype.itemsize * num_oscillators),
+            )
+        self.block_size = min(block_size, max(col_to_sound.NUM_SAMPLES, 1))
+
+        # phasors of the first block, built lazily
+        self._first_block = None
+
+        # working memory of each rendering thread
+        self._scratch = Scratch()
+
+    @staticmethod
+    def eligible(col_to_sound):
+        return True
+
+    @staticmethod
+    def cost_terms(col_to_sound, num_columns: int, batch_columns: int):
+        """Primitive operations needed to render num_columns columns
+        in batches of batch_columns.
+        """
+        height = col_to_sound.Y_RESOLUTION
+        num_samples = col_to_sound.NUM_SAMPLES
+        oscillators = height * (col_to_sound.NUM_TONES + 1)
+
+        # every batch rotates all phasors over the whole column again
+        batches = max(math.ceil(num_columns / max(batch_columns, 1)), 1)
+
+        return {
+            "rotate": batches * oscillators * num_samples,
+            "gemm": num_columns * height * num_samples,
+        }
+
+    @property
+    def omega(self):
+        """Angular step per sample of every tone in pixel major order.
+        """
+
+        # the time grid of a column steps by DURATION / NUM_SAMPLES
+        dt = self.col_to_sound.DURATION / max(self.col_to_sound.NUM_SAMPLES, 1)
+
+        return self.col_to_sound.tone_frequencies.ravel() * dt * 2 * np.pi
+
+    def _build_first_block(self):
+        """Phasors of all oscillators over the first block_size samples.
+        Built in double precision, stored in complex_dtype.
+
+        Returns:
+            np.ndarray -- (num_oscillators, block_size) complex array
+        """
+
+        omega = self.omega
+
+        block = np.empty((omega.size, self.block_size), dtype=np.complex128)
+        block[:, 0] = 1
+
+        # doubling: the second half of the filled part is the first
+        # half rotated by an exact rotation of its length.
+        filled = 1
+        while filled < self.block_size:
+            step = min(filled, self.block_size - filled)
+            rotation = np.exp(1j * omega * filled)
+            block[:, filled : filled + step] = block[:, :step] * rotation[:, None]
+            filled += step
+
+        return block.astype(self.complex_dtype, copy=False)
+
+    def prepare(self):
+        """Builds the phasors of the first block."""
+        if self._first_block is None:
+            self._first_block = self._build_first_block()
+
+    def render(self, weights: np.ndarray, out: np.ndarray = None, rows=None):
+        """Renders the sound walls of a batch of weighted columns.
+
+        Arguments:
+            weights {np.ndarray} -- (n, len(rows)) array of
+            contrast-weighted intensities
+
+        Keyword Arguments:
+            out {np.ndarray} -- (n, NUM_SAMPLES) array to write into
+            (default: {None})
+            rows {np.ndarray} -- pixels the weights belong to, all other
+            pixels are silent (default: {all pixels})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        self.prepare()
+
+        num_samples = self.col_to_sound.NUM_SAMPLES
+        num_tones = self.col_to_sound.NUM_TONES
+
+        if out is None:
+            out = np.empty(
+                (weights.shape[0], num_samples), dtype=self.col_to_sound.DTYPE
+            )
+
+        omega = self.omega
+
+        # only the oscillators of the given pixels are advanced
+        if rows is not None:
+            oscillators = np.ravel(
+                np.asarray(rows)[:, None] * (num_tones + 1) + np.arange(num_tones + 1)
+            )
+            omega = omega[oscillators]
+
+        # rotation over one whole block
+        block_rotation = np.exp(1j * omega * self.block_size)
+
+        # phasors at the start of the current block, always kept
+        # in double precision
+        phase = np.ones(omega.size, dtype=np.complex128)
+
+        for idx, start in enumerate(range(0, num_samples, self.block_size)):
+            stop = min(start + self.block_size, num_samples)
+
+            if idx % self.RESYNC_BLOCKS == 0:
+                phase = np.exp(1j * omega * start)
+
+            block = self._scratch.get(
+                "block", (omega.size, stop - start), self.complex_dtype
+            )
+            if rows is None:
+                block[...] = self._first_block[:, : stop - start]
+            else:
+                np.take(
+                    self._first_block[:, : stop - start], oscillators, axis=0, out=block
+                )
+            block *= phase.astype(self.complex_dtype)[:, None]
+
+            # sum up the tones of each pixel, then weight the pixels
+            pixels = np.sum(
+                block.real.reshape(-1, num_tones + 1, stop - start),
+                axis=1,
+                out=self._scratch.get(
+                    "pixels", (omega.size // (num_tones + 1), stop - start),
+                    self.col_to_sound.DTYPE,
+                ),
+            )
+            np.matmul(weights, pixels, out=out[:, start:stop])
+
+            # advance to the next block
+            phase *= block_rotation
+            phase /= np.abs(phase)
+
+        return out
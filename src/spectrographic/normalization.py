@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Ways of scaling the rendered sound to full scale.
+
+Exact peak normalisation needs the whole signal before the first sample
+can be emitted. The other modes fix the scale up front so the sound can
+be streamed in a single pass:
+
+    peak    -- exact peak of the rendered sound
+    bound   -- analytic upper bound from the column intensities, never clips
+    sampled -- peak of a subsample of the columns, may clip
+    fixed   -- user given gain, may clip
+"""
+import math
+
+import numpy as np
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+NORMALIZATIONS = ("peak", "bound", "sampled", "fixed")
+
+
+def analytic_bound(weights: np.ndarray, num_tones: int):
+    """Upper bound of the absolute amplitude of the sound walls.
+
+    Every pixel drives num_tones + 1 cosines with its weight as
+    amplitude, so no column can be louder than the sum of its
+    weights times num_tones + 1.
+
+    Arguments:
+        weights {np.ndarray} -- (n, Y_RESOLUTION) contrast-weighted
+        intensities
+        num_tones {int} -- number of filling tones per pixel
+
+    Returns:
+        float -- upper bound of the peak
+    """
+    return float(np.max(weights.sum(axis=1), initial=0)) * (num_tones + 1)
+
+
+def peak_amplitude(waves: np.ndarray):
+    """Largest absolute amplitude of waves, without the temporary
+    array of absolute values that np.abs would allocate.
+
+    Arguments:
+        waves {np.ndarray} -- raw sound walls
+
+    Returns:
+        float -- the peak, 0 for no waves
+    """
+    if waves.size == 0:
+        return 0.0
+    return float(max(np.max(waves), -np.min(waves)))
+
+
+class NormalizationReport(object):
+    """Keeps track of the actual peak of the rendered sound to
+    report how the chosen scale compares with exact peak normalisation.
+
+    Arguments:
+        mode {str} -- one of NORMALIZATIONS
+        scale {float} -- factor applied to the raw sound walls
+        full_scale {float} -- largest allowed output amplitude
+    """
+
+    def __init__(self, mode: str, scale: float, full_scale: float):
+        super(NormalizationReport, self).__init__()
+
+        self.MODE = mode
+        self.scale = scale
+        self.full_scale = full_scale
+
+        # largest raw amplitude seen so far
+        self.peak = 0.0
+
+        # samples that had to be clipped to full scale
+        self.clipped_samples = 0
+
+    def normalize(self, waves: np.ndarray):
+        """Scales raw sound walls in place, clipping them
+        to full scale where needed.
+
+        Arguments:
+            waves {np.ndarray} -- raw sound walls
+
+        Returns:
+            np.ndarray -- the scaled waves
+        """
+
+        self.peak = max(self.peak, peak_amplitude(waves))
+
+        waves *= self.scale
+
+        # only peak and bound are guaranteed to stay within full scale
+        if self.MODE in ("sampled", "fixed"):
+            clipped = np.abs(waves) > self.full_scale
+            if clipped.any():
+                self.clipped_samples += int(np.count_nonzero(clipped))
+                np.clip(waves, -self.full_scale, self.full_scale, out=waves)
+
+        return waves
+
+    @property
+    def headroom_lost_db(self):
+        """How much quieter (positive) or louder (negative, clipping)
+        the sound is than with exact peak normalisation, in dB.
+        """
+        if self.peak == 0 or self.scale == 0:
+            return 0.0
+        return 20 * math.log10(self.full_scale / self.peak / self.scale)
+
+    def as_dict(self):
+        return {
+            "mode": self.MODE,
+            "scale": self.scale,
+            "peak": self.peak,
+            "headroom_lost_db": self.headroom_lost_db,
+            "clipped_samples": self.clipped_samples,
+        }
+
+    def __repr__(self):
+        return (
+            "normalization: {mode} (headroom lost: {headroom_lost_db:.2f} dB, "
+            "clipped samples: {clipped_samples})".format(**self.as_dict())
+        )
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+"""
+Renderers that turn many columns into sound walls, either in
+this process, in a pool of threads or spread over a pool of
+worker processes.
+
+All renderers split the columns into the same batches of batch_columns
+columns, so every one of them produces bit-identical sound walls.
+
+render takes an optional on_batch callback, called in the calling thread
+with the number of columns of every finished batch. If it raises, e.g.
+to cancel the render, the pending batches are dropped and the error is
+raised out of render once no worker writes into the sound walls anymore.
+"""
+import multiprocessing
+import threading
+import warnings
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from contextlib import nullcontext
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class SerialRenderer(object):
+    """Renders columns batch by batch in this process.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        batch_columns {int} -- number of columns rendered together
+    """
+
+    def __init__(self, col_to_sound, batch_columns: int):
+        super(SerialRenderer, self).__init__()
+        self.col_to_sound = col_to_sound
+        self.batch_columns = batch_columns
+
+    def render(self, columns: np.ndarray, on_batch=None):
+        """Renders the sound walls of the columns.
+
+        Arguments:
+            columns {np.ndarray} -- (n, Y_RESOLUTION) array of columns,
+            the first of which starts a batch
+
+        Keyword Arguments:
+            on_batch {callable} -- called with the number of columns
+            of every finished batch (default: {None})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        out = np.empty(
+            (len(columns), self.col_to_sound.NUM_SAMPLES), dtype=self.col_to_sound.DTYPE
+        )
+        _render_batches(self.col_to_sound, columns, out, self.batch_columns, on_batch)
+        return out
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ThreadRenderer(object):
+    """Renders batches of columns in a pool of threads of this process.
+
+    The matrix products and ufuncs doing the heavy lifting release the
+    GIL, so the threads run in parallel. To keep them from competing with
+    BLAS' own threads, the BLAS thread count is limited while rendering
+    (needs the optional threadpoolctl package).
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        batch_columns {int} -- number of columns rendered together
+        workers {int} -- number of threads
+
+    Keyword Arguments:
+        blas_threads {int} -- BLAS threads per rendering thread, None
+        to leave BLAS alone (default: {1})
+    """
+
+    def __init__(
+        self, col_to_sound, batch_columns: int, workers: int, blas_threads: int = 1
+    ):
+        super(ThreadRenderer, self).__init__()
+        self.col_to_sound = col_to_sound
+        self.batch_columns = batch_columns
+        self.workers = workers
+        self.blas_threads = blas_threads
+
+        if blas_threads is not None and threadpool_limits is None:
+            warnings.warn(
+                "threadpoolctl is not installed, the number of "
+                "BLAS threads cannot be limited."
+            )
+            self.blas_threads = None
+
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+
+    def render(self, columns: np.ndarray, on_batch=None):
+        """Renders the sound walls of the columns.
+
+        Arguments:
+            columns {np.ndarray} -- (n, Y_RESOLUTION) array of columns,
+            the first of which starts a batch
+
+        Keyword Arguments:
+            on_batch {callable} -- called with the number of columns
+            of every finished batch (default: {None})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) array of sound walls
+        """
+
+        out = np.empty(
+            (len(columns), self.col_to_sound.NUM_SAMPLES), dtype=self.col_to_sound.DTYPE
+        )
+
+        if self.blas_threads is None:
+            limits = nullcontext()
+        else:
+            limits = threadpool_limits(limits=self.blas_threads, user_api="blas")
+
+        with limits:
+            futures = {
+                self._pool.submit(
+                    self.col_to_sound.gen_soundwalls,
+                    columns[start : start + self.batch_columns],
+                    out=out[start : start + self.batch_columns],
+                ): min(self.batch_columns, len(columns) - start)
+                for start in range(0, len(columns), self.batch_columns)
+            }
+            _collect(futures, on_batch)
+
+        return out
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_pool(col_to_sound, workers: int):
+    """Pool of worker processes for ProcessRenderers of col_to_sound.
+
+    Where processes are forked, the engine of col_to_sound is prepared
+    before the workers start, so they inherit the oscillator bank and
+    the like instead of building their own. Elsewhere every worker
+    builds its own ColumnToSound on its first render.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        workers {int} -- number of worker processes
+
+    Returns:
+        ProcessPoolExecutor -- the pool
+    """
+
+    context = multiprocessing.get_context()
+    if context.get_start_method() != "fork":
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    col_to_sound.engine.prepare()
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(col_to_sound,),
+    )
+
+
+class ProcessRenderer(object):
+    """Renders contiguous ranges of columns in a pool of worker
+    processes. The workers write their sound walls straight into a
+    shared memory buffer, so nothing is pickled back.
+
+    The array returned by render is a view of that buffer. It is only
+    valid until the next call to render and must be dropped before the
+    renderer is closed.
+
+    Arguments:
+        col_to_sound {ColumnToSound} -- column to sound converter
+        batch_columns {int} -- number of columns rendered together
+        workers {int} -- number of worker processes
+
+    Keyword Arguments:
+        pool {ProcessPoolExecutor} -- pool of process_pool to render in,
+        left running on close (default: {a pool of its own})
+    """
+
+    def __init__(self, col_to_sound, batch_columns: int, workers: int, pool=None):
+        super(ProcessRenderer, self).__init__()
+        self.col_to_sound = col_to_sound
+        self.batch_columns = batch_columns
+        self.workers = workers
+
+        self._owns_pool = pool is None
+        self._pool = process_pool(col_to_sound, workers) if pool is None else pool
+        self._shm = None
+
+    def _buffer(self, nbytes: int):
+        """Shared memory of at least nbytes bytes, reused between renders.
+        """
+        if self._shm is None or self._shm.size < nbytes:
+            self._free_buffer()
+            self._shm = SharedMemory(create=True, size=max(nbytes, 1))
+        return self._shm
+
+    def _free_buffer(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def render(self, columns: np.ndarray, on_batch=None):
+        """Renders the sound walls of the columns.
+
+        Arguments:
+            columns {np.ndarray} -- (n, Y_RESOLUTION) array of columns,
+            the first of which starts a batch
+
+        Keyword Arguments:
+            on_batch {callable} -- called with the number of columns
+            of every finished batch (default: {None})
+
+        Returns:
+            np.ndarray -- (n, NUM_SAMPLES) view of the shared buffer
+        """
+
+        shape = (len(columns), self.col_to_sound.NUM_SAMPLES)
+        dtype = self.col_to_sound.DTYPE
+        shm = self._buffer(dtype.itemsize * shape[0] * shape[1])
+
+        num_columns, batch = shape[0], self.batch_columns
+        if on_batch is None:
+            # whole batches are dealt out to the workers as evenly as possible
+            num_batches = -(-num_columns // batch)
+            bounds = [
+                min(round(num_batches * k / self.workers) * batch, num_columns)
+                for k in range(self.workers + 1)
+            ]
+        else:
+            # one task per batch, so every batch can be reported
+            bounds = list(range(0, num_columns, batch)) + [num_columns]
+
+        futures = {
+            self._pool.submit(
+                _render_range,
+                shm.name,
+                shape,
+                self.col_to_sound.params,
+                columns[start:stop],
+                start,
+                self.batch_columns,
+            ): stop - start
+            for start, stop in zip(bounds[:-1], bounds[1:])
+            if start < stop
+        }
+        # the workers report back their counters
+        for counters in _collect(futures, on_batch):
+            self.col_to_sound.add_counters(**counters)
+
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def close(self):
+        if self._owns_pool:
+            self._pool.shutdown()
+        self._free_buffer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _render_batches(
+    col_to_sound, columns: np.ndarray, out: np.ndarray, batch: int, on_batch=None
+):
+    """Renders columns into out, batch by batch.
+    """
+    for start in range(0, len(columns), batch):
+        col_to_sound.gen_soundwalls(
+            columns[start : start + batch], out=out[start : start + batch]
+        )
+        if on_batch is not None:
+            on_batch(min(batch, len(columns) - start))
+
+
+def _collect(futures: dict, on_batch=None):
+    """Results of the futures, in the order they finish. Calls on_batch
+    with the number of columns of every finished future, which futures
+    maps them to. If anything raises, the pending futures are cancelled
+    and the running ones awaited before the error propagates.
+    """
+    results = []
+    try:
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_batch is not None:
+                on_batch(futures[future])
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        raise
+    return results
+
+
+# ColumnToSound instances of a worker process by their parameters
+_worker_col_to_sounds = {}
+
+
+def _init_worker(col_to_sound):
+    """Runs in a forked worker process. Renders with col_to_sound of
+    the parent from now on, see process_pool.
+    """
+
+    # another thread of the parent may have held the lock while forking
+    col_to_sound._counter_lock = threading.Lock()
+
+    _worker_col_to_sounds[tuple(sorted(col_to_sound.params.items()))] = col_to_sound
+
+
+def _render_range(
+    shm_name: str,
+    shape: tuple,
+    params: dict,
+    columns: np.ndarray,
+    start: int,
+    batch: int,
+):
+    """Runs in a worker process. Renders columns into the rows
+    of the shared buffer starting at start.
+
+    Returns:
+        dict -- what the worker added to the COUNTERS of its ColumnToSound
+    """
+
+    # imported here to avoid a circular import
+    from spectrographic.base import ColumnToSound
+
+    key = tuple(sorted(params.items()))
+    if key not in _worker_col_to_sounds:
+        _worker_col_to_sounds[key] = ColumnToSound(**params)
+    col_to_sound = _worker_col_to_sounds[key]
+
+    counters = col_to_sound.counters
+
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=col_to_sound.DTYPE, buffer=shm.buf)
+        _render_batches(
+            col_to_sound, columns, out[start : start + len(columns)], batch
+        )
+        del out
+    finally:
+        shm.close()
+
+    return {
+        name: value - counters[name] for name, value in col_to_sound.counters.items()
+    }
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+Progressive playback that starts before the render is done.
+
+A producer thread renders the sound with iter_chunks into a bounded ring
+buffer ahead of the playhead, while an audio sink pulls blocks of
+samples out of it in real time. Playback starts as soon as the first few
+columns are buffered. If the render falls behind, the sink is fed silence
+and the underrun is counted.
+
+Sinks are pluggable. SoundDeviceSink plays through the optional
+sounddevice package, FakeSink consumes the samples in a thread at
+(a multiple of) real time and records them, e.g. for tests.
+"""
+import threading
+import time
+
+import numpy as np
+
+try:
+    import sounddevice
+except ImportError:
+    sounddevice = None
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class RingBuffer(object):
+    """Bounded single producer, single consumer buffer of samples.
+
+    Arguments:
+        capacity {int} -- number of samples it holds
+
+    Keyword Arguments:
+        dtype {np.dtype} -- sample type (default: {np.int16})
+    """
+
+    def __init__(self, capacity: int, dtype=np.int16):
+        super(RingBuffer, self).__init__()
+        self._data = np.zeros(capacity, dtype=dtype)
+        self._start = 0
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def __len__(self):
+        return self._size
+
+    def write(self, samples: np.ndarray):
+        """Appends the samples, waiting for room as long as needed.
+
+        Returns:
+            bool -- False if the buffer was closed before all were written
+        """
+        samples = np.asarray(samples)
+        while samples.size:
+            with self._condition:
+                while self._size == self.capacity and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return False
+
+                end = (self._start + self._size) % self.capacity
+                room = min(self.capacity - self._size, self.capacity - end)
+                take = min(samples.size, room)
+                self._data[end : end + take] = samples[:take]
+                self._size += take
+                self._condition.notify_all()
+
+            samples = samples[take:]
+        return True
+
+    def read(self, num_samples: int):
+        """Removes and returns up to num_samples samples, without waiting."""
+        with self._condition:
+            take = min(num_samples, self._size)
+            stop = self._start + take
+            if stop <= self.capacity:
+                samples = self._data[self._start : stop].copy()
+            else:
+                samples = np.concatenate(
+                    (self._data[self._start :], self._data[: stop - self.capacity])
+                )
+            self._start = stop % self.capacity
+            self._size -= take
+            self._condition.notify_all()
+        return samples
+
+    def wait_for(self, num_samples: int, timeout: float = None):
+        """Waits until num_samples samples are buffered or the
+        buffer is closed. Returns whether they are.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._size >= num_samples or self._closed, timeout
+            )
+
+    def close(self):
+        """Wakes up and turns away any writer, reading still works."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class PlaybackMetrics(object):
+    """How a progressive playback went.
+
+    startup_latency is the time from the start of the playback to the
+    first samples handed to the sink. Buffer depth is sampled on every
+    pull of the sink, in samples.
+    """
+
+    def __init__(self, sample_rate: int):
+        super(PlaybackMetrics, self).__init__()
+        self.sample_rate = sample_rate
+        self.startup_latency = None
+        self.underruns = 0
+        self.underrun_samples = 0
+        self.samples_played = 0
+        self.pulls = 0
+        self.min_buffer_depth = None
+        self.max_buffer_depth = 0
+        self._total_depth = 0
+
+    def record_pull(self, depth: int):
+        self.pulls += 1
+        self._total_depth += depth
+        self.max_buffer_depth = max(self.max_buffer_depth, depth)
+        if self.min_buffer_depth is None or depth < self.min_buffer_depth:
+            self.min_buffer_depth = depth
+
+    @property
+    def mean_buffer_depth(self):
+        return self._total_depth / self.pulls if self.pulls else 0.0
+
+    def as_dict(self):
+        return {
+            "startup_latency": self.startup_latency,
+            "underruns": self.underruns,
+            "underrun_seconds": self.underrun_samples / self.sample_rate,
+            "seconds_played": self.samples_played / self.sample_rate,
+            "min_buffer_seconds": (self.min_buffer_depth or 0) / self.sample_rate,
+            "mean_buffer_seconds": self.mean_buffer_depth / self.sample_rate,
+            "max_buffer_seconds": self.max_buffer_depth / self.sample_rate,
+        }
+
+    def __repr__(self):
+        latency = self.startup_latency or 0.0
+        return (
+            "playback: started after {:.3f}s, {} underruns ({:.3f}s of silence), "
+            "mean buffer {:.3f}s".format(
+                latency,
+                self.underruns,
+                self.underrun_samples / self.sample_rate,
+                self.mean_buffer_depth / self.sample_rate,
+            )
+        )
+
+
+class FakeSink(object):
+    """Sink pulling blocks in a thread at speed times real time,
+    recording what it got.
+
+    Keyword Arguments:
+        block_samples {int} -- samples pulled at a time (default: {1024})
+        speed {float} -- how many times faster than real time the
+        samples are consumed, 0 for as fast as possible (default: {1.0})
+        record {bool} -- keep the samples in self.samples (default: {True})
+    """
+
+    def __init__(self, block_samples: int = 1024, speed: float = 1.0, record=True):
+        super(FakeSink, self).__init__()
+        self.block_samples = block_samples
+        self.speed = speed
+        self.record = record
+        self.blocks = []
+        self._thread = None
+        self._stopped = threading.Event()
+
+    @property
+    def samples(self):
+        if not self.blocks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(self.blocks)
+
+    def start(self, sample_rate: int, pull):
+        """Starts pulling blocks with pull(num_samples) until it
+        returns no samples.
+        """
+
+        def consume():
+            period = self.block_samples / sample_rate
+            deadline = time.perf_counter()
+            while not self._stopped.is_set():
+                block = pull(self.block_samples)
+                if not len(block):
+                    break
+                if self.record:
+                    self.blocks.append(block)
+                if self.speed:
+                    deadline += period / self.speed
+                    time.sleep(max(0.0, deadline - time.perf_counter()))
+
+        self._thread = threading.Thread(target=consume, daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        self._thread.join()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class SoundDeviceSink(object):
+    """Sink playing through the sound card with the optional
+    sounddevice package.
+
+    Keyword Arguments:
+        block_samples {int} -- samples per callback (default: {1024})
+    """
+
+    def __init__(self, block_samples: int = 1024):
+        super(SoundDeviceSink, self).__init__()
+        if sounddevice is None:
+            raise ImportError("progressive playback needs the sounddevice package.")
+        self.block_samples = block_samples
+        self._stream = None
+        self._finished = threading.Event()
+
+    def start(self, sample_rate: int, pull):
+        def callback(outdata, frames, time_info, status):
+            block = pull(frames)
+            outdata[: len(block), 0] = block
+            outdata[len(block) :, 0] = 0
+            if len(block) < frames:
+                raise sounddevice.CallbackStop
+
+        self._stream = sounddevice.OutputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype="int16",
+            blocksize=self.block_samples,
+            callback=callback,
+            finished_callback=self._finished.set,
+        )
+        self._stream.start()
+
+    def wait(self):
+        self._finished.wait()
+        self._stream.close()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.abort()
+
+
+class ProgressivePlayer(object):
+    """Plays a SpectroGraphic while it is rendered.
+
+    Arguments:
+        sg {SpectroGraphic} -- what to play
+        sink {object} -- audio sink with start(sample_rate, pull),
+        wait() and stop()
+
+    Keyword Arguments:
+        buffer_seconds {float} -- how far the render may run ahead of
+        the playhead (default: {2.0})
+        prebuffer_columns {int} -- columns buffered before the sink is
+        started (default: {4})
+        normalization {str} -- normalization of the render, must allow
+        streaming in a single pass (default: {"bound"})
+    """
+
+    def __init__(
+        self,
+        sg,
+        sink,
+        buffer_seconds: float = 2.0,
+        prebuffer_columns: int = 4,
+        normalization: str = "bound",
+    ):
+        super(ProgressivePlayer, self).__init__()
+        if normalization == "peak":
+            raise ValueError("peak normalization needs the whole sound first.")
+
+        self.sg = sg
+        self.sink = sink
+        self.normalization = normalization
+
+        column_samples = sg.col_to_sound.NUM_SAMPLES
+        self.prebuffer_columns = prebuffer_columns
+        self.prebuffer = min(prebuffer_columns * column_samples, sg.NUM_SAMPLES)
+
+        capacity = max(int(buffer_seconds * sg.SAMPLE_RATE), self.prebuffer, 1)
+        self.ring = RingBuffer(capacity)
+        self.metrics = PlaybackMetrics(sg.SAMPLE_RATE)
+
+        self._done = threading.Event()
+        self._error = None
+
+    def _produce(self):
+        """Renders into the ring buffer, runs in its own thread."""
+        try:
+            chunks = self.sg.iter_chunks(
+                chunk_samples=self.sg.col_to_sound.NUM_SAMPLES,
+                normalization=self.normalization,
+                lead_columns=self.prebuffer_columns,
+            )
+            for chunk in chunks:
+                if not self.ring.write(chunk):
+                    chunks.close()
+                    break
+        except BaseException as error:
+            self._error = error
+        finally:
+            self._done.set()
+            # wake up wait_for once everything is buffered
+            self.ring.close()
+
+    def _pull(self, num_samples: int):
+        """Hands the sink the next num_samples samples, padded with
+        silence if the render is behind. No samples once it is done.
+        """
+        # once the producer is done, a short read is the end of the sound
+        done = self._done.is_set()
+        self.metrics.record_pull(len(self.ring))
+
+        samples = self.ring.read(num_samples)
+        if len(samples) < num_samples and not done:
+            missing = num_samples - len(samples)
+            self.metrics.underruns += 1
+            self.metrics.underrun_samples += missing
+            samples = np.concatenate((samples, np.zeros(missing, dtype=samples.dtype)))
+
+        if self.metrics.startup_latency is None and len(samples):
+            self.metrics.startup_latency = time.perf_counter() - self._start
+        self.metrics.samples_played += len(samples)
+        return samples
+
+    def play(self):
+        """Plays the sound and waits until the sink has played it all.
+
+        Returns:
+            PlaybackMetrics -- how it went
+        """
+
+        self._start = time.perf_counter()
+        producer = threading.Thread(target=self._produce, daemon=True)
+        producer.start()
+
+        try:
+            self.ring.wait_for(self.prebuffer)
+            if self._error is None:
+                self.sink.start(self.sg.SAMPLE_RATE, self._pull)
+                self.sink.wait()
+        except BaseException:
+            self.sink.stop()
+            raise
+        finally:
+            self.ring.close()
+            producer.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return self.metrics
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Per-stage instrumentation of a render.
+
+A render goes through these stages, in this order:
+
+    resize        -- LANCZOS resize of the image to the target height
+    convert       -- grey-scale conversion and extraction of the columns
+    synthesis     -- turning the columns into raw sound walls
+    normalization -- scaling the raw sound to full scale and 16-bit data
+    write         -- writing the samples to the .wav file
+"""
+import time
+from collections import OrderedDict
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+STAGES = ("resize", "convert", "synthesis", "normalization", "write")
+
+
+class _Stage(object):
+    """Context manager adding its wall time to one stage of a RenderStats."""
+
+    __slots__ = ("stats", "name", "start")
+
+    def __init__(self, stats, name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add(self.name, seconds=time.perf_counter() - self.start)
+
+
+class RenderStats(object):
+    """Wall time and bytes of every stage of a render, along with the
+    columns rendered, of which synthesized or copied from an identical
+    column, the oscillators evaluated and the pixels silenced by the
+    prune threshold.
+
+    The bytes of a stage are those of the arrays it allocated,
+    or for the write stage the bytes of samples written.
+    """
+
+    def __init__(self):
+        super(RenderStats, self).__init__()
+
+        # stage name -> {"seconds": float, "bytes": int, "calls": int}
+        self.stages = OrderedDict(
+            (name, {"seconds": 0.0, "bytes": 0, "calls": 0}) for name in STAGES
+        )
+
+        self.columns_rendered = 0
+        self.oscillators_evaluated = 0
+        self.oscillators_skipped = 0
+        self.pixels_pruned = 0
+        self.columns_synthesized = 0
+        self.columns_deduplicated = 0
+
+    def stage(self, name: str):
+        """Context manager timing one call of the stage name."""
+        return _Stage(self, name)
+
+    def add(self, name: str, seconds: float = 0.0, nbytes: int = 0):
+        """Adds the wall time of a call or the bytes allocated to a stage."""
+        stage = self.stages[name]
+        if seconds:
+            stage["seconds"] += seconds
+            stage["calls"] += 1
+        stage["bytes"] += int(nbytes)
+
+    @property
+    def dedup_ratio(self):
+        """Fraction of the columns copied from an identical one."""
+        total = self.columns_synthesized + self.columns_deduplicated
+        return self.columns_deduplicated / total if total else 0.0
+
+    @property
+    def total_seconds(self):
+        return sum(stage["seconds"] for stage in self.stages.values())
+
+    def as_dict(self):
+        return {
+            "stages": {name: dict(stage) for name, stage in self.stages.items()},
+            "total_seconds": self.total_seconds,
+            "columns_rendered": self.columns_rendered,
+            "oscillators_evaluated": self.oscillators_evaluated,
+            "oscillators_skipped": self.oscillators_skipped,
+            "pixels_pruned": self.pixels_pruned,
+            "columns_synthesized": self.columns_synthesized,
+            "columns_deduplicated": self.columns_deduplicated,
+            "dedup_ratio": self.dedup_ratio,
+        }
+
+    def __repr__(self):
+        stages = ", ".join(
+            "{} {:.3f}s".format(name, stage["seconds"])
+            for name, stage in self.stages.items()
+            if stage["calls"]
+        )
+        return "render: {:.3f}s ({}), {} columns ({:.0%} deduplicated)".format(
+            self.total_seconds, stages, self.columns_rendered, self.dedup_ratio
+        )
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Progress reporting and cooperative cancellation of a render.
+
+The renderers call back after every batch of columns. That is where
+progress is reported and where a cancelled render stops.
+"""
+import sys
+import threading
+import time
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class RenderCancelled(Exception):
+    """Raised out of a render whose CancellationToken was cancelled."""
+
+
+class CancellationToken(object):
+    """Flag asking a render to stop at the next batch of columns.
+    It may be cancelled from any thread.
+
+    Keyword Arguments:
+        parent {CancellationToken} -- this token counts as cancelled
+        once its parent is (default: {None})
+    """
+
+    def __init__(self, parent=None):
+        super(CancellationToken, self).__init__()
+        self._event = threading.Event()
+        self.parent = parent
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        return self.parent is not None and self.parent.cancelled
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RenderCancelled("render was cancelled.")
+
+
+class Progress(object):
+    """Snapshot of a render's progress.
+
+    Arguments:
+        columns_done {int} -- columns rendered so far
+        columns_total {int} -- columns the render needs
+        elapsed {float} -- seconds since the render started
+    """
+
+    def __init__(self, columns_done: int, columns_total: int, elapsed: float):
+        super(Progress, self).__init__()
+        self.columns_done = columns_done
+        self.columns_total = columns_total
+        self.elapsed = elapsed
+
+    @property
+    def fraction(self):
+        return self.columns_done / self.columns_total if self.columns_total else 1.0
+
+    @property
+    def eta(self):
+        """Estimated seconds until the render is done, None until
+        the first columns are rendered.
+        """
+        if not self.columns_done:
+            return None
+        remaining = self.columns_total - self.columns_done
+        return self.elapsed * remaining / self.columns_done
+
+    def __repr__(self):
+        eta = "?" if self.eta is None else "{:.1f}s".format(self.eta)
+        return "{}/{} columns ({:.0%}), eta {}".format(
+            self.columns_done, self.columns_total, self.fraction, eta
+        )
+
+
+class ProgressTracker(object):
+    """Counts the columns of one render, reports its Progress
+    and stops it once the token is cancelled.
+
+    Arguments:
+        columns_total {int} -- columns the render needs
+
+    Keyword Arguments:
+        callback {callable} -- called with a Progress after every
+        batch (default: {None})
+        token {CancellationToken} -- token checked after every batch
+        (default: {None})
+    """
+
+    def __init__(self, columns_total: int, callback=None, token=None):
+        super(ProgressTracker, self).__init__()
+        self.columns_total = columns_total
+        self.columns_done = 0
+        self.callback = callback
+        self.token = token
+        self.start = time.perf_counter()
+
+        if token is not None:
+            token.raise_if_cancelled()
+
+    def advance(self, columns: int):
+        """Counts columns as rendered. Passed to the renderers as on_batch.
+
+        Raises:
+            RenderCancelled
+        """
+        self.columns_done += columns
+
+        if self.token is not None:
+            self.token.raise_if_cancelled()
+
+        if self.callback is not None:
+            self.callback(
+                Progress(
+                    self.columns_done,
+                    self.columns_total,
+                    time.perf_counter() - self.start,
+                )
+            )
+
+
+class ProgressBar(object):
+    """Progress callback drawing a bar on a terminal.
+
+    Keyword Arguments:
+        file {file} -- terminal to draw on (default: {sys.stderr})
+        width {int} -- number of characters of the bar (default: {30})
+    """
+
+    def __init__(self, file=None, width: int = 30):
+        super(ProgressBar, self).__init__()
+        self.file = sys.stderr if file is None else file
+        self.width = width
+
+    def __call__(self, progress: Progress):
+        filled = int(self.width * min(progress.fraction, 1.0))
+        self.file.write(
+            "\r[{}{}] {!r}\033[K".format(
+                "#" * filled, "." * (self.width - filled), progress
+            )
+        )
+        if progress.columns_done >= progress.columns_total:
+            self.file.write("\n")
+        self.file.flush()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache of rendered sounds.
+
+A sound is stored under a hash of the image bytes and every parameter
+that changes the rendered samples, as a .npy file of 16-bit samples.
+Hits are memory mapped, so they are read straight from the page cache.
+
+Several processes may share a cache directory: entries are written to a
+temporary file and atomically renamed into place, and every reader and
+evicter tolerates entries that disappear under its feet. The least
+recently used entries are evicted once the directory exceeds max_bytes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+# bumped whenever the rendered samples of a parameter set change
+CACHE_VERSION = 4
+
+# temporary files older than this are left overs of crashed writers
+STALE_SECONDS = 3600
+
+
+def image_digest(path: Path):
+    """SHA-256 of the bytes of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(2 ** 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def render_key(image: Path, params: dict):
+    """Key of the sound rendered from the image with the params.
+
+    Arguments:
+        image {Path} -- path of the image
+        params {dict} -- JSON serializable parameters that determine
+        the rendered samples
+
+    Returns:
+        str -- hex digest
+    """
+    description = json.dumps(
+        {"version": CACHE_VERSION, "image": image_digest(image), "params": params},
+        sort_keys=True,
+    )
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class RenderCache(object):
+    """Size-bounded LRU cache of rendered sounds in a directory.
+
+    Arguments:
+        directory {Path} -- where the sounds are stored, created if needed
+
+    Keyword Arguments:
+        max_bytes {int} -- size cap of the directory in bytes
+        (default: {1 GiB})
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 2 ** 30):
+        super(RenderCache, self).__init__()
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        # counters of this instance
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str):
+        return self.directory / (key + ".npy")
+
+    def get(self, key: str):
+        """Memory mapped, read-only samples stored under key,
+        None on a miss.
+        """
+        path = self._path(key)
+        try:
+            sound = np.load(path, mmap_mode="r")
+            # a hit counts as a use for the LRU order
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except ValueError:
+            # not a valid .npy file, drop it and render again
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return sound
+
+    @contextmanager
+    def storing(self, key: str, num_samples: int, dtype=np.int16):
+        """Context manager yielding a writable memory map of num_samples
+        samples to be filled. The entry only appears under key once the
+        block completes without an error.
+
+        A sound larger than max_bytes is not stored at all, the context
+        manager yields None instead, since storing it would evict every
+        other entry and then the sound itself.
+        """
+        if np.dtype(dtype).itemsize * num_samples > self.max_bytes:
+            yield None
+            return
+
+        descriptor, temp = tempfile.mkstemp(
+            dir=self.directory, prefix=key, suffix=".tmp"
+        )
+        os.close(descriptor)
+        try:
+            sound = np.lib.format.open_memmap(
+                temp, mode="w+", dtype=dtype, shape=(num_samples,)
+            )
+            yield sound
+            sound.flush()
+            del sound
+            os.replace(temp, self._path(key))
+        except BaseException:
+            self._remove(Path(temp))
+            raise
+
+        self.evict()
+
+    def put(self, key: str, sound: np.ndarray):
+        """Stores the samples under key, unless they are larger
+        than max_bytes.
+        """
+        with self.storing(key, len(sound), sound.dtype) as entry:
+            if entry is not None:
+                entry[:] = sound
+
+    def _remove(self, path: Path):
+        """Removes path if it still exists, returns whether it did. An
+        entry another process has mapped cannot be removed on Windows.
+        """
+        try:
+            path.unlink()
+        except (FileNotFoundError, PermissionError):
+            return False
+        return True
+
+    def _entries(self):
+        """(mtime, size, path) of every entry, oldest first."""
+        entries = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """Removes least recently used entries until the directory
+        is below max_bytes, as well as stale temporary files.
+        """
+        for temp in self.directory.glob("*.tmp"):
+            try:
+                stale = time.time() - temp.stat().st_mtime > STALE_SECONDS
+            except FileNotFoundError:
+                continue
+            if stale:
+                self._remove(temp)
+
+        entries = self._entries()
+        nbytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if nbytes <= self.max_bytes:
+                break
+            if self._remove(path):
+                self.evictions += 1
+            nbytes -= size
+
+    def clear(self):
+        """Removes every entry. Counters are kept."""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    @property
+    def nbytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def __len__(self):
+        return len(self._entries())
+
+    @property
+    def stats(self):
+        """Counters and disk usage of the cache as a dict."""
+        entries = self._entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "nbytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def __repr__(self):
+        return (
+            "render cache: {hits} hits, {misses} misses, {evictions} evictions, "
+            "{entries} entries of {nbytes} bytes".format(**self.stats)
+        )
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Continuous sound from animated images and image sequences.
+
+The frames are decoded, preprocessed and rendered one at a time while
+the sound is streamed, so memory use stays flat however many frames
+there are. All frames share the ColumnToSound and, within a render, the
+renderer of the sequence.
+"""
+import glob
+import hashlib
+import json
+import re
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.normalization import analytic_bound
+from spectrographic.rendercache import image_digest
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+def _natural_key(path: Path):
+    """Sort key ordering frame_2.png before frame_10.png."""
+    return [
+        int(part) if part.isdigit() else part.lower()
+        for part in re.split(r"(\d+)", str(path))
+    ]
+
+
+def frame_paths(source):
+    """Image files of a sequence, in order.
+
+    Arguments:
+        source {Path} -- an image file, which may have several frames,
+        a directory of images, a glob pattern such as "frames/*.png"
+        or a list of image files
+
+    Returns:
+        [Path] -- the files, numbered ones ordered by their number
+    """
+
+    if isinstance(source, (list, tuple)):
+        return [Path(path) for path in source]
+
+    path = Path(source)
+    if path.is_dir():
+        extensions = Image.registered_extensions()
+        paths = [
+            child for child in path.iterdir() if child.suffix.lower() in extensions
+        ]
+    elif glob.has_magic(str(source)):
+        paths = [Path(match) for match in glob.glob(str(source))]
+    else:
+        return [path]
+
+    return sorted(paths, key=_natural_key)
+
+
+def iter_frames(paths):
+    """Yields the frames of the image files one after the other,
+    decoding them one at a time.
+
+    A frame is only valid until the next one is requested.
+    """
+    for path in paths:
+        with Image.open(path) as image:
+            for frame in ImageSequence.Iterator(image):
+                yield frame
+
+
+class SpectroSequence(SpectroGraphic):
+    """
+    Takes an animated image or a sequence of images and creates one
+    continuous sound that draws the frames one after the other.
+
+    [description]
+    Every frame is resized to the size of the first one and lasts
+    frame_duration seconds. Palette frames, e.g. those of a GIF, are
+    converted to RGB (or RGBA if they have transparency) first.
+
+    Caching, saving and streaming work like for a SpectroGraphic. With
+    peak normalization every frame is decoded and rendered twice, the
+    other normalizations render a single pass.
+
+    Arguments:
+        source {Path} -- an animated image, a directory of images, a glob
+        pattern such as "frames/*.png" or a list of image files, see
+        frame_paths
+
+    Keyword Arguments:
+        frame_duration {float} -- duration of each frame in seconds
+        (default: {1.0})
+
+        Any other keyword argument of SpectroGraphic but duration.
+
+    Raises:
+        ValueError -- if there are no frames
+    """
+
+    def __init__(self, source, frame_duration: float = 1.0, **kwargs):
+        self.paths = frame_paths(source)
+        if not self.paths:
+            raise ValueError("no images found in {}.".format(source))
+
+        super(SpectroSequence, self).__init__(
+            self.paths[0], duration=frame_duration, **kwargs
+        )
+        self.image.close()
+
+        self.FRAME_DURATION = frame_duration
+        self.NUM_FRAMES = 0
+        for path in self.paths:
+            with Image.open(path) as image:
+                self.NUM_FRAMES += getattr(image, "n_frames", 1)
+
+        self.DURATION = self.FRAME_DURATION * self.NUM_FRAMES
+        self.NUM_COLUMNS = self.WIDTH * self.NUM_FRAMES
+        self.NUM_SAMPLES = self.NUM_COLUMNS * self.col_to_sound.NUM_SAMPLES
+
+    @property
+    def _windowed(self):
+        """The frames are always rendered one at a time."""
+        return True
+
+    def iter_columns(self):
+        """Yields the (WIDTH, HEIGHT) columns of every frame in turn,
+        each only valid until the next one is requested.
+        """
+        for frame in iter_frames(self.paths):
+            if frame.mode == "P":
+                frame = frame.convert("RGBA" if "transparency" in frame.info else "RGB")
+            self.image = frame
+            self._preprocess()
+            yield self.columns
+
+    def _iter_soundwalls(self, lead_columns: int = 0):
+        """Renders the frames one after the other with a single renderer,
+        see SpectroGraphic._iter_soundwalls.
+        """
+        with self._renderer() as renderer:
+            for columns in self.iter_columns():
+                yield from self._windows(renderer, columns, lead_columns)
+                lead_columns = 0
+
+    def _scale(self, mode: str, full_scale: float):
+        """Factor that scales the raw sound walls of every frame to
+        full_scale, see SpectroGraphic._scale.
+        """
+
+        if mode == "fixed":
+            return super(SpectroSequence, self)._scale(mode, full_scale)
+
+        if mode == "peak":
+            peak = self._peak()
+        elif mode == "bound":
+            col_to_sound = self.col_to_sound
+            peak = max(
+                analytic_bound(col_to_sound.weights(columns), col_to_sound.NUM_TONES)
+                for columns in self.iter_columns()
+            )
+        else:
+            # every step-th column of the whole sequence, copied so
+            # that the frames they come from can be freed
+            step = self._sample_step()
+            sample = np.concatenate(
+                [
+                    columns[-index * self.WIDTH % step :: step].copy()
+                    for index, columns in enumerate(self.iter_columns())
+                ]
+            )
+            peak = self._peak(sample)
+
+        # a silent sequence stays silent
+        return full_scale / peak if peak else 0.0
+
+    @property
+    def cache_key(self):
+        """Key of the sound in the render cache, which also covers the
+        bytes of every image of the sequence.
+        """
+        if self._cache_key is None:
+            key = super(SpectroSequence, self).cache_key
+            frames = [image_digest(path) for path in self.paths[1:]]
+            self._cache_key = hashlib.sha256(
+                json.dumps([key, frames]).encode()
+            ).hexdigest()
+        return self._cache_key
@@ -0,0 +1,599 @@
+# -*- coding: utf-8 -*-
+"""
+Local HTTP rendering service, started with
+
+    spectrographic serve --port 8000 --workers 4
+
+POST an image to /render with the parameters of the command line tool
+in the query string, e.g. /render?duration=10&resolution=150, and the
+.wav file is streamed back with chunked transfer encoding as the columns
+are rendered. GET /metrics returns the queue depth, counters and render
+latency percentiles as JSON.
+
+Renders run in a bounded pool of threads. Requests beyond max_queue
+waiting renders are turned away with 503. Identical requests that come
+in while a render is in flight share it. A render only runs max_ahead
+chunks ahead of its slowest client, and it is cancelled once every
+client has gone. Clients that stall for client_timeout seconds, be it
+sending their upload, reading the response or holding back a shared
+render, are dropped. Peak normalization needs a full pass before the first
+sample, use e.g. normalization=bound to stream right away.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+from spectrographic import cli
+from spectrographic.base import SpectroGraphic
+from spectrographic.progress import CancellationToken, RenderCancelled
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+# query parameters of /render and the command line options they set
+OPTIONS = {
+    "duration": "--duration",
+    "min_freq": "--min_freq",
+    "max_freq": "--max_freq",
+    "resolution": "--resolution",
+    "contrast": "--contrast",
+    "engine": "--engine",
+    "normalization": "--normalization",
+    "gain": "--gain",
+    "prune_db": "--prune-db",
+    "float32": "--float32",
+}
+
+# largest accepted upload
+MAX_UPLOAD_BYTES = 64 * 2 ** 20
+
+
+class QueueFull(Exception):
+    """Raised when a render cannot be queued anymore."""
+
+
+class BadRequest(Exception):
+    """Raised for requests that cannot be rendered."""
+
+
+class SlowClient(Exception):
+    """Raised to a client that was dropped for holding back its render."""
+
+
+def synthesis_params(query: dict):
+    """SpectroGraphic keyword arguments from the query parameters,
+    parsed and checked like the command line parameters.
+
+    Raises:
+        BadRequest
+    """
+
+    argv = ["--image", "upload"]
+    for name, value in query.items():
+        if name not in OPTIONS:
+            raise BadRequest("unknown parameter {}.".format(name))
+        if name == "float32":
+            if value.lower() in ("1", "true", "yes"):
+                argv.append(OPTIONS[name])
+        else:
+            argv += [OPTIONS[name], value]
+
+    try:
+        args = cli.parse_args(argv, exit_on_error=False)
+    except argparse.ArgumentError as error:
+        raise BadRequest(str(error))
+    return cli.synthesis_params(args)
+
+
+class SharedRender(object):
+    """A render in flight, shared by every client of identical requests.
+
+    It is the binary file the .wav file is saved to: the first write is
+    the header, every later one a chunk of samples that the clients read
+    in turn. Chunks are dropped once every client has read them, the
+    header is kept so clients can join as long as the first chunk has
+    not been dropped.
+
+    Arguments:
+        key {str} -- hash of the image and parameters
+        max_ahead {int} -- chunks the render may be ahead of the slowest
+        client before write waits
+
+    Keyword Arguments:
+        timeout {float} -- seconds write waits for the slowest clients
+        before it drops them (default: {None, forever})
+    """
+
+    def __init__(self, key: str, max_ahead: int, timeout: float = None):
+        super(SharedRender, self).__init__()
+        self.key = key
+        self.max_ahead = max_ahead
+        self.timeout = timeout
+        self.token = CancellationToken()
+        self.created = time.perf_counter()
+
+        # number of clients dropped for being too slow
+        self.dropped = 0
+
+        self._header = None
+        self._chunks = []
+        # position of self._chunks[0] in the stream of chunks
+        self._offset = 0
+        # client id -> position of its next chunk
+        self._clients = {}
+        self._next_client = 0
+        self._done = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    def join(self):
+        """Adds a client, returns its id or None if it is too late to join."""
+        with self._condition:
+            if self._offset or self._done or self.token.cancelled:
+                return None
+            client = self._next_client
+            self._next_client += 1
+            self._clients[client] = 0
+            return client
+
+    def leave(self, client: int):
+        """Removes a client, cancelling the render if it was the last."""
+        with self._condition:
+            # dropped clients are gone already
+            self._clients.pop(client, None)
+            if not self._clients and not self._done:
+                self.token.cancel()
+            self._drop_read_chunks()
+            self._condition.notify_all()
+
+    def _drop_read_chunks(self):
+        if not self._clients:
+            return
+        read = min(self._clients.values()) - self._offset
+        if read > 0:
+            del self._chunks[:read]
+            self._offset += read
+
+    def _behind(self):
+        """Chunks the slowest client is behind the render."""
+        return self._offset + len(self._chunks) - min(self._clients.values())
+
+    def write(self, data):
+        """Publishes a chunk, waiting while the slowest client is
+        max_ahead chunks behind. Clients that are still that far behind
+        after timeout seconds are dropped.
+
+        Raises:
+            RenderCancelled -- once every client has gone
+        """
+        with self._condition:
+            if self._header is None:
+                self._header = bytes(data)
+                self._condition.notify_all()
+                return
+
+            if self.timeout is not None:
+                deadline = time.monotonic() + self.timeout
+            while self._clients and self._behind() >= self.max_ahead:
+                if self.timeout is None:
+                    self._condition.wait()
+                elif not self._condition.wait(deadline - time.monotonic()):
+                    self._drop_slow_clients()
+            if not self._clients:
+                raise RenderCancelled("every client has gone.")
+            self._chunks.append(bytes(data))
+            self._condition.notify_all()
+
+    def _drop_slow_clients(self):
+        """Drops the clients max_ahead chunks behind, see write."""
+        position = self._offset + len(self._chunks) - self.max_ahead
+        for client, next_chunk in list(self._clients.items()):
+            if next_chunk <= position:
+                del self._clients[client]
+                self.dropped += 1
+        self._drop_read_chunks()
+        self._condition.notify_all()
+
+    def flush(self):
+        pass
+
+    def seekable(self):
+        return False
+
+    def finish(self, error: BaseException = None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    def read(self, client: int):
+        """Yields the chunks for a client, raising the error of a
+        failed render when it gets to it.
+
+        Raises:
+            SlowClient -- if the client was dropped, see write
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._header is not None or self._done)
+            header = self._header
+        if header is not None:
+            yield header
+
+        while True:
+            with self._condition:
+                position = self._clients.get(client)
+                if position is None:
+                    raise SlowClient("dropped for holding back the render.")
+                self._condition.wait_for(
+                    lambda: position < self._offset + len(self._chunks)
+                    or self._done
+                    or client not in self._clients
+                )
+                if client not in self._clients:
+                    raise SlowClient("dropped for holding back the render.")
+                if position < self._offset + len(self._chunks):
+                    chunk = self._chunks[position - self._offset]
+                    self._clients[client] = position + 1
+                    self._drop_read_chunks()
+                    self._condition.notify_all()
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield chunk
+
+
+class RenderService(object):
+    """Renders uploaded images in a bounded pool of threads.
+
+    Keyword Arguments:
+        workers {int} -- renders running at the same time (default: {2})
+        max_queue {int} -- renders waiting for a worker before requests
+        are turned away (default: {16})
+        max_ahead {int} -- chunks a render may be ahead of its slowest
+        client (default: {16})
+        client_timeout {float} -- seconds a client may stall, sending its
+        upload, reading the response or holding back a render, before it
+        is dropped (default: {60})
+    """
+
+    # number of recent renders the latency percentiles are taken over
+    LATENCY_WINDOW = 1000
+
+    def __init__(
+        self,
+        workers: int = 2,
+        max_queue: int = 16,
+        max_ahead: int = 16,
+        client_timeout: float = 60,
+    ):
+        super(RenderService, self).__init__()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_ahead = max_ahead
+        self.client_timeout = client_timeout
+
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+        self.queued = 0
+        self.running = 0
+        self.counters = dict.fromkeys(
+            (
+                "requests",
+                "coalesced",
+                "rejected",
+                "completed",
+                "failed",
+                "cancelled",
+                "dropped",
+            ),
+            0,
+        )
+
+    def submit(self, image: bytes, params: dict):
+        """Starts rendering the image or joins an identical render
+        in flight.
+
+        Returns:
+            tuple -- the SharedRender and the id of this client
+
+        Raises:
+            QueueFull
+        """
+
+        key = hashlib.sha256(
+            hashlib.sha256(image).digest() + json.dumps(params, sort_keys=True).encode()
+        ).hexdigest()
+
+        with self._lock:
+            self.counters["requests"] += 1
+
+            render = self._in_flight.get(key)
+            client = None if render is None else render.join()
+            if client is not None:
+                self.counters["coalesced"] += 1
+                return render, client
+
+            if self.queued >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise QueueFull("{} renders are waiting.".format(self.queued))
+
+            render = SharedRender(key, self.max_ahead, self.client_timeout)
+            client = render.join()
+            self._in_flight[key] = render
+            self.queued += 1
+
+        self._pool.submit(self._render, render, image, params)
+        return render, client
+
+    def _render(self, render: SharedRender, image: bytes, params: dict):
+        """Renders into the SharedRender, runs in the pool."""
+
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+
+        outcome = "completed"
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                path = Path(directory) / "upload"
+                path.write_bytes(image)
+                sg = SpectroGraphic(path, cancel_token=render.token, **params)
+                sg.save(render)
+        except RenderCancelled as error:
+            outcome = "cancelled"
+            render.finish(error)
+        except BaseException as error:
+            outcome = "failed"
+            render.finish(error)
+        else:
+            render.finish()
+
+        with self._lock:
+            self.running -= 1
+            self.counters[outcome] += 1
+            self.counters["dropped"] += render.dropped
+            if outcome == "completed":
+                self._latencies.append(time.perf_counter() - render.created)
+            if self._in_flight.get(render.key) is render:
+                del self._in_flight[render.key]
+
+    @property
+    def metrics(self):
+        """Queue depth, counters and render latency percentiles."""
+        with self._lock:
+            latencies = np.array(self._latencies)
+            metrics = dict(
+                self.counters,
+                queue_depth=self.queued,
+                running=self.running,
+                in_flight=len(self._in_flight),
+            )
+
+        for percentile in (50, 90, 99):
+            metrics["latency_p{}".format(percentile)] = (
+                float(np.percentile(latencies, percentile)) if latencies.size else None
+            )
+        return metrics
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handles /render and /metrics for the RenderService in
+    self.server.service.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # socket reads and writes time out, so a stalled client cannot
+        # hold on to its thread
+        self.timeout = self.server.service.client_timeout
+        super(RequestHandler, self).setup()
+
+    def _send(self, status: int, body: bytes, content_type: str, **headers):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name.replace("_", "-"), value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, **headers):
+        body = json.dumps({"error": message}).encode()
+        self._send(status, body, "application/json", **headers)
+
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            return self._send_error(404, "not found.")
+        body = json.dumps(self.server.service.metrics).encode()
+        self._send(200, body, "application/json")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/render":
+            return self._send_error(404, "not found.")
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            return self._send_error(411, "Content-Length is required.")
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            return self._send_error(400, "invalid Content-Length.")
+        if length > MAX_UPLOAD_BYTES:
+            self.close_connection = True
+            return self._send_error(413, "image is too large.")
+        image = self.rfile.read(length)
+
+        try:
+            params = synthesis_params(dict(parse_qsl(url.query)))
+            render, client = self.server.service.submit(image, params)
+        except BadRequest as error:
+            return self._send_error(400, str(error))
+        except QueueFull as error:
+            return self._send_error(503, str(error), Retry_After="1")
+
+        try:
+            self._stream(render.read(client))
+        finally:
+            render.leave(client)
+
+    def _stream(self, chunks):
+        """Streams the chunks of a render, or reports why it failed
+        if it did so before the first one.
+        """
+        try:
+            first = next(chunks)
+        except StopIteration:
+            first = b""
+        except UnidentifiedImageError:
+            return self._send_error(400, "cannot identify the image.")
+        except ValueError as error:
+            return self._send_error(400, str(error))
+        except Exception as error:
+            return self._send_error(500, str(error))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        try:
+            for chunk in _chain(first, chunks):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        except Exception:
+            # a render failing mid-stream leaves the response unfinished
+            self.close_connection = True
+
+
+def _chain(first: bytes, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def parse_args(args):
+    """Parse the command line parameters of spectrographic serve
+
+    Args:
+      args ([str]): command line parameters as list of strings
+
+    Returns:
+      :obj:`argparse.Namespace`: command line parameters namespace
+    """
+    parser = argparse.ArgumentParser(
+        prog="spectrographic serve", description="Render images over HTTP."
+    )
+    parser.add_argument(
+        "--host",
+        dest="host",
+        help="Address to listen on.",
+        action="store",
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "--port",
+        dest="port",
+        help="Port to listen on.",
+        action="store",
+        default=8000,
+        type=int,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        help="Number of renders running at the same time.",
+        action="store",
+        default=2,
+        type=int,
+    )
+    parser.add_argument(
+        "--max-queue",
+        dest="max_queue",
+        help="Number of renders waiting for a worker before requests "
+        "are turned away.",
+        action="store",
+        default=16,
+        type=int,
+    )
+    parser.add_argument(
+        "--client-timeout",
+        dest="client_timeout",
+        help="Seconds a client may stall before it is dropped.",
+        action="store",
+        default=60,
+        type=float,
+    )
+    return parser.parse_args(args)
+
+
+def make_server(service: RenderService, host: str = "127.0.0.1", port: int = 8000):
+    """HTTP server of the service, port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def main(args):
+    """Main entry point of spectrographic serve
+
+    Args:
+      args ([str]): command line parameter list
+    """
+    args = parse_args(args)
+
+    service = RenderService(
+        workers=args.workers,
+        max_queue=args.max_queue,
+        client_timeout=args.client_timeout,
+    )
+    server = make_server(service, args.host, args.port)
+    print(
+        "serving on http://{}:{}".format(*server.server_address[:2]), file=sys.stderr
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def run():
+    """Entry point for console_scripts
+    """
+    main(sys.argv[1:])
+
+
+if __name__ == "__main__":
+    run()
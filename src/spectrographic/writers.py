@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming writers for the rendered sound.
+
+Every writer takes the file, the sample rate and optionally the number
+of samples up front, then consumes blocks of 16-bit samples with write
+until it is closed:
+
+    wav  -- WavWriter, uncompressed RIFF WAV
+    flac -- FlacWriter, lossless FLAC through the optional soundfile package
+    raw  -- RawWriter, headerless little-endian 16-bit PCM
+"""
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+class SampleWriter(object):
+    """Base of the writers of mono 16-bit samples, block by block.
+
+    Arguments:
+        file {Path or file object} -- Path of the file, "-" for stdout
+        or a binary file object (which is not closed)
+        sample_rate {int} -- Sample rate of the sound
+
+    Keyword Arguments:
+        num_samples {int} -- Number of samples that will be written
+        (default: {None})
+    """
+
+    def __init__(self, file, sample_rate: int, num_samples: int = None):
+        super(SampleWriter, self).__init__()
+
+        self.SAMPLE_RATE = sample_rate
+        self.NUM_SAMPLES = num_samples
+
+        # number of samples written so far
+        self.samples_written = 0
+
+        if file == "-":
+            self._file = sys.stdout.buffer
+            self._owns_file = False
+        elif isinstance(file, (str, Path)):
+            self._file = open(file, "wb")
+            self._owns_file = True
+        else:
+            self._file = file
+            self._owns_file = False
+
+    def write(self, block: np.ndarray):
+        """Appends a block of 16-bit samples.
+
+        Arguments:
+            block {np.ndarray} -- samples, converted to 16-bit if needed
+        """
+        block = np.asarray(block).astype("<i2", copy=False)
+        self._write(block)
+        self.samples_written += block.size
+
+    def _write(self, block: np.ndarray):
+        self._file.write(block.tobytes())
+        self._file.flush()
+
+    def close(self):
+        """Closes the file if we opened it."""
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        try:
+            self.close()
+        except ValueError:
+            # a short file is expected when writing was interrupted,
+            # the error that interrupted it is the one to raise
+            if exc_type is None:
+                raise
+
+
+class RawWriter(SampleWriter):
+    """Writes headerless little-endian 16-bit PCM data block by block,
+    see SampleWriter.
+    """
+
+
+class WavWriter(SampleWriter):
+    """Writes mono 16-bit PCM WAV data block by block.
+
+    The RIFF header is written up front. If the number of samples is
+    known in advance the sizes in the header are exact right away, which
+    allows writing to pipes. Otherwise they are patched on close, which
+    requires a seekable file.
+
+    Arguments:
+        file {Path or file object} -- Path of the .wav file, "-" for
+        stdout or a binary file object (which is not closed)
+        sample_rate {int} -- Sample rate of the sound
+
+    Keyword Arguments:
+        num_samples {int} -- Number of samples that will be written
+        (default: {None})
+    """
+
+    # header size up to and including the size field of the data chunk
+    HEADER_SIZE = 44
+
+    def __init__(self, file, sample_rate: int, num_samples: int = None):
+        super(WavWriter, self).__init__(file, sample_rate, num_samples)
+
+        self._write_header(num_samples or 0)
+        self._file.flush()
+
+    def _write_header(self, num_samples: int):
+        data_size = 2 * num_samples
+        self._file.write(
+            struct.pack(
+                "<4sI4s4sIHHIIHH4sI",
+                b"RIFF",
+                self.HEADER_SIZE - 8 + data_size,
+                b"WAVE",
+                b"fmt ",
+                16,  # size of the fmt chunk
+                1,  # PCM
+                1,  # mono
+                self.SAMPLE_RATE,
+                2 * self.SAMPLE_RATE,  # bytes per second
+                2,  # bytes per frame
+                16,  # bits per sample
+                b"data",
+                data_size,
+            )
+        )
+
+    def close(self):
+        """Fixes up the header if needed and closes the file
+        if we opened it.
+
+        Raises:
+            ValueError -- if the header cannot be fixed up
+        """
+
+        try:
+            if self.samples_written != (self.NUM_SAMPLES or 0):
+                if not self._file.seekable():
+                    raise ValueError(
+                        "Wrote {} samples but announced {} to a "
+                        "non-seekable file.".format(
+                            self.samples_written, self.NUM_SAMPLES
+                        )
+                    )
+                end = self._file.tell()
+                self._file.seek(0)
+                self._write_header(self.samples_written)
+                self._file.seek(end)
+            self._file.flush()
+        finally:
+            super(WavWriter, self).close()
+
+
+class FlacWriter(SampleWriter):
+    """Writes mono 16-bit FLAC data block by block with the optional
+    soundfile package. FLAC compresses the sound losslessly, usually to
+    about half of the WAV size, at the cost of encoding time.
+
+    The stream info is completed on close, so the file must be
+    seekable, i.e. FLAC cannot be streamed to a pipe.
+
+    Arguments:
+        file {Path or file object} -- Path of the .flac file or a
+        seekable binary file object (which is not closed)
+        sample_rate {int} -- Sample rate of the sound
+
+    Keyword Arguments:
+        num_samples {int} -- Number of samples that will be written
+        (default: {None})
+
+    Raises:
+        ImportError -- without the soundfile package
+        ValueError -- if the file is not seekable
+    """
+
+    def __init__(self, file, sample_rate: int, num_samples: int = None):
+        if soundfile is None:
+            raise ImportError("FLAC output needs the soundfile package.")
+        super(FlacWriter, self).__init__(file, sample_rate, num_samples)
+
+        if not self._file.seekable():
+            super(FlacWriter, self).close()
+            raise ValueError("FLAC needs a seekable file.")
+
+        self._sound_file = soundfile.SoundFile(
+            self._file,
+            mode="w",
+            samplerate=sample_rate,
+            channels=1,
+            format="FLAC",
+            subtype="PCM_16",
+        )
+
+    def _write(self, block: np.ndarray):
+        self._sound_file.write(block)
+
+    def close(self):
+        """Finishes the stream and closes the file if we opened it."""
+        try:
+            if not self._sound_file.closed:
+                self._sound_file.close()
+            self._file.flush()
+        finally:
+            super(FlacWriter, self).close()
+
+
+# writer of every output format
+FORMATS = {"wav": WavWriter, "flac": FlacWriter, "raw": RawWriter}
+
+# output format of every file suffix
+SUFFIXES = {
+    ".wav": "wav",
+    ".wave": "wav",
+    ".flac": "flac",
+    ".raw": "raw",
+    ".pcm": "raw",
+}
+
+
+def output_format(file, format: str = None):
+    """Output format of a file, from its suffix unless given.
+
+    Arguments:
+        file {Path or file object} -- where the sound goes
+
+    Keyword Arguments:
+        format {str} -- one of FORMATS, overrides the suffix
+        (default: {None})
+
+    Returns:
+        str -- the format, "wav" for stdout, file objects and
+        unknown suffixes
+
+    Raises:
+        ValueError -- if the format is unknown
+    """
+
+    if format is None:
+        if file != "-" and isinstance(file, (str, Path)):
+            format = SUFFIXES.get(Path(file).suffix.lower(), "wav")
+        else:
+            format = "wav"
+
+    if format not in FORMATS:
+        raise ValueError("format must be one of {}.".format(", ".join(FORMATS)))
+    return format
+
+
+def open_writer(file, sample_rate: int, num_samples: int = None, format: str = None):
+    """Writer for the file in the format from output_format.
+
+    Arguments:
+        file {Path or file object} -- see SampleWriter
+        sample_rate {int} -- Sample rate of the sound
+
+    Keyword Arguments:
+        num_samples {int} -- Number of samples that will be written
+        (default: {None})
+        format {str} -- one of FORMATS (default: {from the suffix})
+
+    Returns:
+        SampleWriter
+    """
+    writer = FORMATS[output_format(file, format)]
+    return writer(file, sample_rate, num_samples)
@@ -11,11 +11,11 @@ python spectrographic.py -h
 """
 import argparse
 import sys
+import wave
 from pathlib import Path
 
 import numpy as np
 import simpleaudio as sa
-import wavio
 from PIL import Image
 
 __author__ = "Levi Borodenko"
@@ -167,10 +167,14 @@ class SpectroGraphic(object):
     def save(self, wav_file: Path = "SpectroGraphic.wav"):
         """saves the spectrographic to a .wav file
 
-        We use the wavio module
+        We use the wave module of the standard library
         """
 
-        wavio.write(wav_file, self.sound_array, self.SAMPLE_RATE)
+        with wave.open(str(wav_file), "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SAMPLE_RATE)
+            wav.writeframes(self.sound_array.astype("<i2").tobytes())
 
 
 class ColumnToSound(object):
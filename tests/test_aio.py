@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from spectrographic.aio import RenderLimiter
+from spectrographic.base import SpectroGraphic
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+@pytest.fixture
+def image(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 256, (30, 400), dtype=np.uint8)
+    path = tmp_path / "noise.png"
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+class Pause(object):
+    """Progress callback holding the render after its first batch
+    until released.
+    """
+
+    def __init__(self):
+        self.paused = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, progress):
+        self.paused.set()
+        self.released.wait()
+
+    async def cancel(self, task):
+        """Cancels task once the render is paused, then lets it go on."""
+        await asyncio.get_running_loop().run_in_executor(None, self.paused.wait)
+        task.cancel()
+        self.released.set()
+
+
+def test_overlapping_renders_keep_the_cancel_token(image):
+    pause = Pause()
+    sg = SpectroGraphic(image, height=30, duration=20, progress=pause)
+    expected = SpectroGraphic(image, height=30, duration=20).sound_array
+
+    async def render_twice():
+        limiter = RenderLimiter(2)
+        first = asyncio.ensure_future(sg.render_async(limiter))
+        second = asyncio.ensure_future(sg.render_async(limiter))
+        await pause.cancel(first)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert np.array_equal(asyncio.run(render_twice()), expected)
+    assert sg.cancel_token is None
+
+
+def test_cancelled_render_can_be_rendered_again(image):
+    pause = Pause()
+    sg = SpectroGraphic(image, height=30, duration=20, progress=pause)
+
+    async def cancel_then_render():
+        task = asyncio.ensure_future(sg.render_async())
+        await pause.cancel(task)
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert sg.cancel_token is None
+        return await sg.render_async()
+
+    sound = asyncio.run(cancel_then_render())
+    assert len(sound) == sg.NUM_SAMPLES
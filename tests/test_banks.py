@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from spectrographic.banks import BankCache
+from spectrographic.base import ColumnToSound
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+def builder(num_bytes: int, built: list):
+    """Build function of a bank of num_bytes bytes, recording its calls."""
+
+    def build():
+        built.append(num_bytes)
+        return np.zeros(num_bytes // 8)
+
+    return build
+
+
+def test_hits_skip_building():
+    cache, built = BankCache(max_bytes=1000), []
+
+    first = cache.get("a", builder(400, built))
+    second = cache.get("a", builder(400, built))
+
+    assert second is first
+    assert built == [400]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not first.flags.writeable
+
+
+def test_least_recently_used_bank_is_evicted():
+    cache, built = BankCache(max_bytes=1000), []
+    cache.get("a", builder(400, built))
+    cache.get("b", builder(400, built))
+    # a is now more recently used than b
+    cache.get("a", builder(400, built))
+    cache.get("c", builder(400, built))
+
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+    assert cache.evictions == 1
+    assert cache.nbytes == 800 <= cache.max_bytes
+
+
+def test_banks_larger_than_the_cap_are_not_cached():
+    cache, built = BankCache(max_bytes=1000), []
+    cache.get("a", builder(400, built))
+
+    large = cache.get("large", builder(1600, built))
+
+    assert large.nbytes == 1600
+    assert "large" not in cache and "a" in cache
+    assert cache.evictions == 0
+
+
+def test_lowering_the_cap_evicts():
+    cache, built = BankCache(max_bytes=1000), []
+    cache.get("a", builder(400, built))
+    cache.get("b", builder(400, built))
+
+    cache.max_bytes = 500
+
+    assert len(cache) == 1 and "b" in cache
+    assert cache.stats["evictions"] == 1
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_col_to_sounds_with_the_same_parameters_share_a_bank(dtype):
+    cache = BankCache()
+    first = ColumnToSound(0.05, y_resolution=20, bank_cache=cache, dtype=dtype)
+    second = ColumnToSound(0.05, y_resolution=20, bank_cache=cache, dtype=dtype)
+    other = ColumnToSound(0.05, y_resolution=21, bank_cache=cache, dtype=dtype)
+
+    assert second.oscillator_bank is first.oscillator_bank
+    assert other.oscillator_bank is not first.oscillator_bank
+    assert first.oscillator_bank.dtype == dtype
+    assert cache.stats["banks"] == 2
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+
+import io
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from spectrographic.base import ColumnToSound, SpectroGraphic
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+def reference_sound(sg: SpectroGraphic):
+    """The sound of sg the way it was rendered before there were
+    engines: one pixel_to_sound per pixel, added up column by column.
+    """
+    col_to_sound = sg.col_to_sound
+
+    walls = []
+    for column in np.asarray(sg.columns) / 255:
+        wave = col_to_sound.pixel_to_sound(0, 0)
+        for idx, intensity in enumerate(column):
+            wave += col_to_sound.pixel_to_sound(idx, intensity)
+        walls.append(wave)
+
+    audio = np.hstack(walls)
+    audio *= 32767 / np.max(np.abs(audio))
+    return audio.astype(np.int16)
+
+
+@pytest.mark.parametrize(
+    "image", sorted(EXAMPLES.glob("*.png")), ids=lambda path: path.stem
+)
+@pytest.mark.parametrize("height,duration", [(20, 1), (40, 3)])
+def test_bank_matches_pixel_to_sound(image, height, duration):
+    sg = SpectroGraphic(image, height=height, duration=duration, engine="bank")
+    sg._preprocess()
+
+    assert np.array_equal(sg.sound_array, reference_sound(sg))
+
+
+@pytest.mark.parametrize("engine", ["bank", "phasor"])
+@pytest.mark.parametrize("normalization", ["peak", "bound"])
+@pytest.mark.parametrize("duration", [5, 120])
+def test_float32_within_one_lsb_of_float64(engine, normalization, duration):
+    params = dict(
+        height=60, duration=duration, engine=engine, normalization=normalization
+    )
+    single = SpectroGraphic(EXAMPLES / "shrek.png", dtype=np.float32, **params)
+    double = SpectroGraphic(EXAMPLES / "shrek.png", **params)
+
+    assert single.col_to_sound.DTYPE == np.float32
+    difference = single.sound_array.astype(int) - double.sound_array
+    assert np.abs(difference).max() <= 1
+
+
+HEIGHT = 100
+
+
+def sparse_columns(weights: list, num_columns: int = 50, seed: int = 0):
+    """Distinct columns with one pixel each on, at one of the weights."""
+    rng = np.random.default_rng(seed)
+    columns = np.zeros((num_columns, HEIGHT))
+    rows = rng.permutation(HEIGHT)[:num_columns]
+    columns[np.arange(num_columns), rows] = rng.choice(weights, num_columns)
+    return columns
+
+
+def col_to_sound(dense: bool = False, **params):
+    """ColumnToSound of HEIGHT pixels, never adding up bank rows one
+    by one if dense.
+    """
+    col_to_sound = ColumnToSound(
+        0.05, y_resolution=HEIGHT, contrast=1, engine="bank", **params
+    )
+    if dense:
+        col_to_sound.BITMASK_DENSITY = 0
+    return col_to_sound
+
+
+@pytest.mark.parametrize("weights", [[1.0], [0.3, 0.6, 1.0]], ids=["mask", "grey"])
+def test_sparse_columns_match_the_dense_render(weights):
+    columns = sparse_columns(weights)
+    sparse = col_to_sound()
+
+    waves = sparse.gen_soundwalls(columns)
+
+    expected = col_to_sound(dense=True).gen_soundwalls(columns)
+    assert np.allclose(waves, expected, rtol=0, atol=1e-12)
+    tones = sparse.NUM_TONES + 1
+    assert sparse.counters == {
+        "oscillators_evaluated": 50 * tones,
+        "oscillators_skipped": 50 * (HEIGHT - 1) * tones,
+        "pixels_pruned": 0,
+        "columns_synthesized": 50,
+        "columns_deduplicated": 0,
+    }
+
+
+def test_pruned_pixels_are_skipped_and_counted():
+    columns = sparse_columns([1.0]) + sparse_columns([1e-4], seed=1)
+    pruned = col_to_sound(prune_threshold=1e-3)
+
+    waves = pruned.gen_soundwalls(columns)
+
+    expected = col_to_sound(dense=True).gen_soundwalls(
+        np.where(columns < 1e-3, 0, columns)
+    )
+    assert np.allclose(waves, expected, rtol=0, atol=1e-12)
+    # the quiet pixels do not cost an oscillator
+    tones = pruned.NUM_TONES + 1
+    assert pruned.pixels_pruned == np.count_nonzero((columns > 0) & (columns < 1e-3))
+    assert pruned.pixels_pruned > 0
+    assert pruned.oscillators_evaluated == np.count_nonzero(columns >= 1e-3) * tones
+
+
+def test_pixels_pruned_inside_the_product_are_counted():
+    columns = np.random.default_rng(0).uniform(0, 1, (20, HEIGHT))
+    pruned = col_to_sound(prune_threshold=0.1)
+
+    waves = pruned.gen_soundwalls(columns)
+
+    expected = col_to_sound(dense=True).gen_soundwalls(
+        np.where(columns < 0.1, 0, columns)
+    )
+    assert np.allclose(waves, expected, rtol=0, atol=1e-12)
+    assert pruned.pixels_pruned == np.count_nonzero(columns < 0.1)
+    # the GEMM still multiplies the pixels silenced in some column only
+    assert pruned.oscillators_skipped == 0
+
+
+@pytest.mark.parametrize("normalization", ["bound", "sampled"])
+def test_batches_stay_within_batch_samples(monkeypatch, normalization):
+    params = dict(height=40, duration=20, engine="bank", normalization=normalization)
+    expected = SpectroGraphic(EXAMPLES / "happy.png", **params).sound_array
+
+    monkeypatch.setattr(SpectroGraphic, "BATCH_SAMPLES", 30000)
+    sg = SpectroGraphic(EXAMPLES / "happy.png", **params)
+    column_samples = int(sg.DURATION_COL * sg.SAMPLE_RATE)
+    assert sg.COLUMNS_PER_BATCH == 30000 // column_samples < sg.BATCH_COLUMNS
+
+    assert all(
+        waves.size <= sg.BATCH_SAMPLES for waves in sg._iter_soundwalls()
+    )
+    # smaller matrix products may round differently
+    assert np.abs(sg.sound_array.astype(int) - expected).max() <= 1
+
+
+def test_peak_normalized_save_renders_every_column_once():
+    sg = SpectroGraphic(EXAMPLES / "happy.png", height=40, duration=3, profile=True)
+    file = io.BytesIO()
+    sg.save(file)
+
+    assert sg.stats.columns_rendered == sg.WIDTH
+    streamed = SpectroGraphic(EXAMPLES / "happy.png", height=40, duration=3)
+    chunks = list(streamed.iter_chunks())
+    with wave.open(io.BytesIO(file.getvalue())) as wav:
+        frames = wav.readframes(wav.getnframes())
+    assert frames == np.concatenate(chunks).tobytes()
+
+
+@pytest.fixture(scope="module")
+def large_image():
+    """The shrek example blown up to about 8 megapixels."""
+    image = Image.open(EXAMPLES / "shrek.png").convert("RGB")
+    scale = (8e6 / (image.width * image.height)) ** 0.5
+    return image.resize(
+        (int(image.width * scale), int(image.height * scale)), Image.BICUBIC
+    )
+
+
+@pytest.mark.parametrize("suffix,options", [(".jpg", {"quality": 90}), (".png", {})])
+def test_reduced_resize_stays_close_to_a_full_resample(
+    tmp_path, large_image, suffix, options
+):
+    path = tmp_path / ("large" + suffix)
+    large_image.save(path, **options)
+
+    sg = SpectroGraphic(path, height=150)
+    sg._preprocess()
+
+    # full decode, LANCZOS resample of all channels, then grey-scale
+    image = Image.open(path).resize((sg.WIDTH, sg.HEIGHT), resample=Image.LANCZOS)
+    expected = np.transpose(np.array(image.convert(mode="L")))
+
+    difference = np.abs(sg.columns.astype(int) - expected)
+    assert difference.max() <= 6
+    assert difference.mean() <= 0.5
+
+
+def repeated_columns():
+    """Ten columns of three kinds, one of them blank."""
+    distinct = np.random.default_rng(0).integers(0, 256, (3, 40), dtype=np.uint8)
+    distinct[0] = 0
+    return distinct[[0, 1, 0, 2, 1, 0, 0, 2, 2, 0]]
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+@pytest.mark.parametrize("engine", ["bank", "phasor", "fft"])
+def test_deduplicated_columns_match_synthesizing_all(engine, dtype):
+    col_to_sound = ColumnToSound(0.05, y_resolution=40, engine=engine, dtype=dtype)
+    columns = repeated_columns()
+
+    deduplicated = col_to_sound.gen_soundwalls(columns)
+    synthesized = col_to_sound._synthesize(columns)
+
+    # the phasor engine's product over fewer columns may round differently
+    tolerance = 1e-12 if dtype == np.float64 else 1e-5
+    assert np.abs(deduplicated - synthesized).max() <= tolerance
+    assert deduplicated.dtype == dtype
+
+
+def test_dedup_ratio():
+    col_to_sound = ColumnToSound(0.05, y_resolution=40)
+    col_to_sound.gen_soundwalls(repeated_columns())
+
+    assert col_to_sound.columns_synthesized == 3
+    assert col_to_sound.columns_deduplicated == 7
+    assert col_to_sound.dedup_ratio == 0.7
+
+    # a single column has nothing to share
+    col_to_sound.gen_soundwall(repeated_columns()[0])
+    assert col_to_sound.columns_deduplicated == 7
+    assert col_to_sound.dedup_ratio == 7 / 11
+
+
+def test_render_stats_count_deduplicated_columns(tmp_path):
+    pixels = np.full((40, 100), 255, dtype=np.uint8)
+    pixels[:, 30:40] = np.arange(40)[:, None] * 6
+    Image.fromarray(pixels).save(tmp_path / "margins.png")
+
+    sg = SpectroGraphic(tmp_path / "margins.png", height=40, duration=1, profile=True)
+    sg.sound_array
+
+    # the first batch of 64 columns holds a blank and a striped kind,
+    # the second one only blank columns
+    assert sg.WIDTH == 100 and sg.COLUMNS_PER_BATCH == 64
+    assert sg.stats.columns_synthesized == 3
+    assert sg.stats.columns_deduplicated == 97
+    assert sg.stats.dedup_ratio == 0.97
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("normalization", ["peak", "bound", "sampled"])
+def test_scratch_dir_matches_the_in_memory_render(tmp_path, normalization, workers):
+    params = dict(height=40, duration=3, normalization=normalization, workers=workers)
+    expected = SpectroGraphic(EXAMPLES / "shrek.png", **params).sound_array
+
+    sg = SpectroGraphic(EXAMPLES / "shrek.png", scratch_dir=tmp_path, **params)
+    sound = sg.sound_array
+
+    assert isinstance(sound, np.memmap)
+    assert np.array_equal(sound, expected)
+    # the scratch file has no name
+    assert list(tmp_path.iterdir()) == []
+
+    sg.close()
+
+    file = io.BytesIO()
+    sg = SpectroGraphic(EXAMPLES / "shrek.png", scratch_dir=tmp_path, **params)
+    sg.save(file)
+    with wave.open(io.BytesIO(file.getvalue())) as wav:
+        assert wav.readframes(wav.getnframes()) == expected.astype("<i2").tobytes()
+    sg.close()
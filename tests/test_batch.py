@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.batch import RenderJob, load_manifest, render_many
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+
+@pytest.fixture
+def images(tmp_path):
+    """Two of the examples, copied next to where the manifests go."""
+    for name in ("happy.png", "python.png"):
+        shutil.copy(EXAMPLES / name, tmp_path / name)
+    return tmp_path
+
+
+def test_csv_manifest(images):
+    manifest = images / "jobs.csv"
+    manifest.write_text(
+        "image,output,height,engine\n"
+        "happy.png,,20,\n"
+        "python.png,sounds/python.raw,,bank\n"
+    )
+
+    jobs = load_manifest(
+        manifest, defaults=dict(height=30, duration=1.0), output_dir=images / "out"
+    )
+
+    assert [job.image for job in jobs] == [images / "happy.png", images / "python.png"]
+    assert [job.output for job in jobs] == [
+        images / "out" / "happy.wav",
+        images / "out" / "sounds" / "python.raw",
+    ]
+    assert jobs[0].params == dict(height=20, duration=1.0)
+    assert jobs[1].params == dict(height=30, duration=1.0, engine="bank")
+
+
+def test_jsonl_manifest(images):
+    manifest = images / "jobs.jsonl"
+    # blank lines are skipped
+    row = dict(image="happy.png", use_black_and_white="yes")
+    manifest.write_text(json.dumps(row) + "\n\n")
+
+    (job,) = load_manifest(manifest, suffix=".flac")
+
+    assert job.output == images / "happy.flac"
+    assert job.params == dict(use_black_and_white=True)
+
+
+@pytest.mark.parametrize(
+    "name,content",
+    [
+        ("jobs.csv", "output\nsound.wav\n"),
+        ("jobs.csv", "image,bogus\nhappy.png,1\n"),
+        ("jobs.txt", "happy.png\n"),
+    ],
+)
+def test_bad_manifests(images, name, content):
+    (images / name).write_text(content)
+    with pytest.raises(ValueError):
+        load_manifest(images / name)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_render_many_reports_every_job(images, workers):
+    params = dict(height=20, duration=1.0)
+    jobs = [
+        RenderJob(images / "happy.png", images / "happy.wav", **params),
+        RenderJob(images / "missing.png", images / "missing.wav", **params),
+        RenderJob(images / "python.png", images / "python.raw", **params),
+    ]
+
+    results = {result.job.image.name: result for result in render_many(jobs, workers)}
+
+    assert {name: result.status for name, result in results.items()} == {
+        "happy.png": "ok",
+        "missing.png": "failed",
+        "python.png": "ok",
+    }
+    assert "missing.png" in results["missing.png"].error
+    assert results["happy.png"].error is None
+
+    expected = SpectroGraphic(images / "python.png", **params).sound_array
+    raw = np.frombuffer((images / "python.raw").read_bytes(), dtype="<i2")
+    assert np.array_equal(raw, expected)
+    assert (images / "happy.wav").exists()
+
+
+@pytest.mark.parametrize("workers", [0, -1])
+def test_render_many_needs_a_worker(images, workers):
+    job = RenderJob(images / "happy.png", images / "happy.wav")
+    with pytest.raises(ValueError):
+        render_many([job], workers)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from spectrographic.banks import BankCache
+from spectrographic.base import ColumnToSound
+from spectrographic.engines import PhasorEngine
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+def col_to_sound(engine: str, duration: float, height: int):
+    """ColumnToSound with its own bank cache."""
+    return ColumnToSound(
+        duration, y_resolution=height, engine=engine, bank_cache=BankCache()
+    )
+
+
+def random_columns(num_columns: int, height: int, seed: int = 0):
+    return np.random.default_rng(seed).random((num_columns, height))
+
+
+def reference_soundwall(col_to_sound, column):
+    """Sound wall of a column added up from pixel_to_sound."""
+    wave = col_to_sound.pixel_to_sound(0, 0)
+    for idx, intensity in enumerate(column):
+        wave += col_to_sound.pixel_to_sound(idx, intensity)
+    return wave
+
+
+# short columns fit into one block of the phasor engine,
+# long ones take many blocks and resynchronisations
+COLUMNS = [(1, 0.01), (2, 0.05), (5, 0.02), (3, 2.0), (8, 1.0)]
+
+
+@pytest.mark.parametrize("engine", ["bank", "phasor"])
+@pytest.mark.parametrize("height,duration", COLUMNS)
+def test_engine_matches_pixel_to_sound(engine, height, duration):
+    converter = col_to_sound(engine, duration, height)
+    if engine == "phasor":
+        converter.engine = PhasorEngine(converter, block_size=256)
+
+    columns = random_columns(3, height)
+    columns[0] = 0
+    columns[1, 0] = 1
+
+    oscillators = height * (converter.NUM_TONES + 1)
+    for column in columns:
+        reference = reference_soundwall(converter, column)
+        wall = converter.gen_soundwall(column)
+        assert wall.shape == reference.shape
+        assert np.max(np.abs(wall - reference), initial=0) <= 1e-9 * oscillators
+
+
+@pytest.mark.parametrize("height,duration", COLUMNS)
+def test_phasor_matches_bank_in_batches(height, duration):
+    bank = col_to_sound("bank", duration, height)
+    phasor = col_to_sound("phasor", duration, height)
+    columns = random_columns(5, height, seed=1)
+
+    oscillators = height * (bank.NUM_TONES + 1)
+    error = np.abs(phasor.gen_soundwalls(columns) - bank.gen_soundwalls(columns))
+    assert error.max() <= 1e-9 * oscillators
+
+
+@pytest.mark.parametrize(
+    "duration,height,params",
+    [
+        (0.2, 100, {}),
+        (0.05, 500, {}),
+        (1.0, 30, {}),
+        (0.01, 500, {}),
+        # tones next to the DC bin and above the Nyquist frequency
+        (0.05, 50, dict(min_freq=0, max_freq=7000, sample_rate=8000)),
+    ],
+)
+def test_fft_tones_within_max_tone_error(duration, height, params):
+    fft = ColumnToSound(duration, y_resolution=height, engine="fft", **params)
+    bank = ColumnToSound(
+        duration, y_resolution=height, engine="bank", bank_cache=BankCache(), **params
+    )
+    columns = random_columns(8, height)
+
+    # every unit tone is within MAX_TONE_ERROR of its cosine
+    tones = bank.weights(columns).sum(axis=1) * (bank.NUM_TONES + 1)
+    bound = tones * fft.engine.MAX_TONE_ERROR
+
+    error = np.abs(fft.gen_soundwalls(columns) - bank.gen_soundwalls(columns))
+    assert np.all(error.max(axis=1) <= bound + 1e-9)
+
+
+def test_fft_terms_and_size():
+    fft = col_to_sound("fft", 0.0371, 100)
+    engine = fft.engine
+
+    size = engine.size
+    assert fft.NUM_SAMPLES <= size < 2 * fft.NUM_SAMPLES
+    for prime in (2, 3, 5):
+        while size % prime == 0:
+            size //= prime
+    assert size == 1
+
+    # |J_m(z)| <= (pi / 4)^m / m! for |z| <= pi / 2
+    z = np.linspace(-np.pi / 2, np.pi / 2, 101)
+    tail = sum(
+        2 * np.abs(engine.bessel(m, z)) for m in range(engine.num_terms, 30)
+    )
+    assert tail.max() <= engine.MAX_TONE_ERROR
+
+
+def test_banks_larger_than_the_cache_are_not_picked():
+    # a 20 x 2205 bank of doubles takes 352800 bytes
+    large = ColumnToSound(0.05, y_resolution=20, bank_cache=BankCache(300000))
+    assert large.ENGINE != "bank"
+    assert large.engine_estimates["bank"] is None
+
+    fits = ColumnToSound(0.05, y_resolution=20, bank_cache=BankCache(400000))
+    assert fits.engine_estimates["bank"] is not None
+
+    # unless asked for
+    chosen = ColumnToSound(
+        0.05, y_resolution=20, engine="bank", bank_cache=BankCache(300000)
+    )
+    assert chosen.ENGINE == "bank"
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from spectrographic.base import SpectroGraphic
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+@pytest.fixture
+def spectrographic(tmp_path):
+    """Makes SpectroGraphics of a noise image that is wide enough for
+    a few batches and small enough to be quick.
+    """
+    pixels = np.random.default_rng(0).integers(0, 256, (30, 200), dtype=np.uint8)
+    pixels[:, 100:140] = 0
+    path = tmp_path / "noise.png"
+    Image.fromarray(pixels).save(path)
+
+    def make(**kwargs):
+        return SpectroGraphic(path, height=30, duration=2, **kwargs)
+
+    return make
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+@pytest.mark.parametrize("engine", ["bank", "phasor", "fft"])
+@pytest.mark.parametrize("normalization", ["peak", "bound"])
+def test_workers_match_serial(spectrographic, backend, engine, normalization):
+    serial = spectrographic(engine=engine, normalization=normalization)
+    parallel = spectrographic(
+        engine=engine, normalization=normalization, workers=2, backend=backend
+    )
+    assert serial.WIDTH > 2 * serial.BATCH_COLUMNS
+
+    assert np.array_equal(parallel.sound_array, serial.sound_array)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("normalization", ["peak", "bound", "sampled"])
+@pytest.mark.parametrize("chunk_samples", [1000, 2 ** 16])
+def test_chunks_add_up_to_sound_array(
+    spectrographic, workers, normalization, chunk_samples
+):
+    streamed = spectrographic(normalization=normalization, workers=workers)
+    chunks = [chunk.copy() for chunk in streamed.iter_chunks(chunk_samples)]
+
+    assert all(len(chunk) == chunk_samples for chunk in chunks[:-1])
+    assert 0 < len(chunks[-1]) <= chunk_samples
+
+    rendered = spectrographic(normalization=normalization, workers=workers)
+    assert np.array_equal(np.concatenate(chunks), rendered.sound_array)
+
+
+@pytest.mark.parametrize("blas_threads", [None, 2])
+def test_blas_threads_match_serial(spectrographic, blas_threads):
+    serial = spectrographic(engine="bank")
+    threaded = spectrographic(
+        engine="bank", workers=2, backend="thread", blas_threads=blas_threads
+    )
+    assert threaded.BLAS_THREADS == blas_threads
+    assert np.array_equal(threaded.sound_array, serial.sound_array)
+
+
+def test_blas_threads_must_be_positive(spectrographic):
+    with pytest.raises(ValueError):
+        spectrographic(workers=2, backend="thread", blas_threads=0)
+
+
+def test_worker_processes_are_kept_between_renders(spectrographic):
+    sg = spectrographic(engine="bank", workers=2)
+    first = sg.sound_array.copy()
+    pool = sg._pool
+    pids = set(pool._processes)
+
+    # the bank was built before the workers were forked off
+    assert sg.col_to_sound._oscillator_bank is not None
+
+    chunks = list(sg.iter_chunks(dtype=np.float32))
+    assert sg._pool is pool and set(pool._processes) == pids
+    assert len(np.concatenate(chunks)) == len(first)
+
+    sg.close()
+    assert sg._pool is None
+    sg.is_processed = False
+    assert np.array_equal(sg.sound_array, first)
+    assert sg._pool is not pool
+    sg.close()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import numpy as np
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.playback import FakeSink, RingBuffer
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+IMAGE = Path(__file__).resolve().parent.parent / "examples" / "happy.png"
+
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(5)
+    assert buffer.write(np.arange(4, dtype=np.int16))
+    assert np.array_equal(buffer.read(3), [0, 1, 2])
+
+    assert buffer.write(np.arange(4, 7, dtype=np.int16))
+    assert len(buffer) == 4
+    assert np.array_equal(buffer.read(10), [3, 4, 5, 6])
+    assert len(buffer.read(1)) == 0
+
+
+def test_closed_ring_buffer_turns_writers_away():
+    buffer = RingBuffer(2)
+    buffer.close()
+    assert not buffer.write(np.zeros(3, dtype=np.int16))
+    assert buffer.wait_for(1)
+
+
+def test_progressive_playback_plays_the_bound_normalized_sound():
+    sg = SpectroGraphic(IMAGE, height=50, duration=5)
+    sink = FakeSink(speed=20)
+
+    metrics = sg.play_progressive(sink)
+
+    assert metrics.underruns == 0
+    assert metrics.underrun_samples == 0
+
+    expected = SpectroGraphic(IMAGE, height=50, duration=5, normalization="bound")
+    assert np.array_equal(sink.samples, expected.sound_array)
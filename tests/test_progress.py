@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.progress import CancellationToken, RenderCancelled
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+IMAGE = Path(__file__).resolve().parent.parent / "examples" / "python.png"
+
+
+@pytest.fixture
+def spectrographic(monkeypatch):
+    """Makes SpectroGraphics of an image a few batches wide."""
+    monkeypatch.setattr(SpectroGraphic, "BATCH_COLUMNS", 8)
+
+    def make(**kwargs):
+        return SpectroGraphic(IMAGE, height=30, duration=2, **kwargs)
+
+    return make
+
+
+@pytest.mark.parametrize(
+    "workers,backend", [(1, "process"), (2, "thread"), (2, "process")]
+)
+def test_cancelled_render_is_not_processed(spectrographic, workers, backend):
+    token = CancellationToken()
+    done = []
+
+    def progress(progress):
+        done.append(progress.columns_done)
+        token.cancel()
+
+    sg = spectrographic(
+        workers=workers, backend=backend, progress=progress, cancel_token=token
+    )
+    with pytest.raises(RenderCancelled):
+        sg.sound_array
+
+    assert not sg.is_processed
+    assert done and done[-1] < sg.NUM_COLUMNS
+
+    # the next render with a fresh token starts over
+    sg.cancel_token = CancellationToken()
+    assert np.array_equal(sg.sound_array, spectrographic().sound_array)
+    assert sg.is_processed
+    sg.close()
+
+
+def test_cancelled_token_stops_before_rendering(tmp_path, spectrographic):
+    token = CancellationToken()
+    token.cancel()
+    done = []
+    sg = spectrographic(progress=done.append, cancel_token=token)
+
+    with pytest.raises(RenderCancelled):
+        sg.save(tmp_path / "never.wav")
+    with pytest.raises(RenderCancelled):
+        next(sg.iter_chunks())
+
+    assert done == []
+    assert not sg.is_processed
+    assert not (tmp_path / "never.wav").exists()
+
+
+def test_child_tokens_follow_their_parent():
+    parent = CancellationToken()
+    child = CancellationToken(parent)
+    assert not child.cancelled
+
+    parent.cancel()
+    assert child.cancelled
+    with pytest.raises(RenderCancelled):
+        child.raise_if_cancelled()
+
+
+@pytest.mark.parametrize(
+    "normalization,streaming,passes",
+    [
+        ("peak", False, 1),
+        ("peak", True, 2),
+        ("bound", False, 1),
+        ("bound", True, 1),
+        ("sampled", True, None),
+    ],
+)
+def test_progress_adds_up_to_the_total(
+    spectrographic, normalization, streaming, passes
+):
+    reports = []
+    sg = spectrographic(normalization=normalization, progress=reports.append)
+
+    if streaming:
+        list(sg.iter_chunks())
+    else:
+        sg.sound_array
+
+    if passes is None:
+        # every step-th column is rendered up front
+        passes = 1 + len(range(0, sg.NUM_COLUMNS, sg._sample_step())) / sg.NUM_COLUMNS
+
+    totals = {report.columns_total for report in reports}
+    assert totals == {passes * sg.NUM_COLUMNS}
+
+    done = [report.columns_done for report in reports]
+    assert done == sorted(done)
+    assert done[-1] == passes * sg.NUM_COLUMNS
+    assert reports[-1].fraction == 1.0 and reports[-1].eta == 0
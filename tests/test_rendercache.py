@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from spectrographic.rendercache import RenderCache
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+def sound(num_samples: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(-32768, 32768, num_samples, dtype=np.int16)
+
+
+def test_put_and_get(tmp_path):
+    cache = RenderCache(tmp_path)
+    cache.put("a", sound(1000))
+
+    assert np.array_equal(cache.get("a"), sound(1000))
+    assert cache.get("b") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = RenderCache(tmp_path, max_bytes=5000)
+    cache.put("a", sound(1000))
+    cache.put("b", sound(1000))
+    cache.put("c", sound(1000))
+
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+    assert cache.evictions == 1
+
+
+def test_entries_larger_than_max_bytes_are_not_stored(tmp_path):
+    cache = RenderCache(tmp_path, max_bytes=5000)
+    cache.put("small", sound(1000))
+    cache.put("large", sound(3000))
+
+    with cache.storing("streamed", 3000) as entry:
+        assert entry is None
+
+    assert cache.get("large") is None
+    assert cache.get("streamed") is None
+    assert np.array_equal(cache.get("small"), sound(1000))
+    assert cache.evictions == 0
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+from spectrographic.base import SpectroGraphic
+from spectrographic.sequence import SpectroSequence, frame_paths
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "examples"
+
+# renders every frame at the same fixed scale
+PARAMS = dict(height=20, normalization="fixed", gain=0.05)
+
+
+@pytest.fixture
+def frames(tmp_path):
+    """Three examples as frames of the same size, numbered out of
+    alphabetical order.
+    """
+    paths = []
+    for number, name in zip([1, 2, 10], ["happy", "python", "shrek"]):
+        path = tmp_path / "frame_{}.png".format(number)
+        image = Image.open(EXAMPLES / (name + ".png")).convert("RGB")
+        image.resize((60, 40)).save(path)
+        paths.append(path)
+    return paths
+
+
+def rendered_frames(paths):
+    """The frames rendered one by one and put one after the other."""
+    return np.concatenate(
+        [SpectroGraphic(path, duration=0.5, **PARAMS).sound_array for path in paths]
+    )
+
+
+def test_frames_are_in_natural_order(tmp_path, frames):
+    assert frame_paths(tmp_path) == frames
+    assert frame_paths(str(tmp_path / "frame_*.png")) == frames
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sequence_matches_the_rendered_frames(tmp_path, frames, workers):
+    sequence = SpectroSequence(tmp_path, frame_duration=0.5, workers=workers, **PARAMS)
+    expected = rendered_frames(frames)
+
+    assert sequence.NUM_FRAMES == 3
+    assert sequence.NUM_SAMPLES == len(expected)
+    assert np.array_equal(np.concatenate(list(sequence.iter_chunks(1000))), expected)
+    assert np.array_equal(sequence.sound_array, expected)
+    sequence.close()
+
+
+def test_animated_image_matches_its_rendered_frames(tmp_path, frames):
+    images = [Image.open(path) for path in frames]
+    images[0].save(tmp_path / "animation.gif", save_all=True, append_images=images[1:])
+
+    # the palette frames go to RGB first
+    paths = []
+    with Image.open(tmp_path / "animation.gif") as animation:
+        for index, frame in enumerate(ImageSequence.Iterator(animation)):
+            paths.append(tmp_path / "decoded_{}.png".format(index))
+            frame.convert("RGB").save(paths[-1])
+
+    sequence = SpectroSequence(tmp_path / "animation.gif", frame_duration=0.5, **PARAMS)
+
+    assert sequence.NUM_FRAMES == 3
+    assert np.array_equal(sequence.sound_array, rendered_frames(paths))
+
+
+def test_no_frames(tmp_path):
+    with pytest.raises(ValueError):
+        SpectroSequence(tmp_path / "*.png")
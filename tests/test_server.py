@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import http.client
+import io
+import json
+import socket
+import threading
+import time
+import wave
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pytest
+
+from spectrographic import cli
+from spectrographic.base import SpectroGraphic
+from spectrographic.server import (
+    QueueFull,
+    RenderService,
+    SlowClient,
+    make_server,
+    synthesis_params,
+)
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+IMAGE = Path(__file__).resolve().parent.parent / "examples" / "happy.png"
+
+
+@pytest.fixture
+def service():
+    service = RenderService(workers=1, max_queue=1, max_ahead=1)
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def server(service):
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method: str, path: str, body: bytes = None, headers=None):
+    """Status, headers and body of a request to the server."""
+    connection = http.client.HTTPConnection(*server.server_address[:2], timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def expected_wav(query: list):
+    """The .wav file the command line tool saves for the query."""
+    args = cli.parse_args(["--image", str(IMAGE)] + query)
+    file = io.BytesIO()
+    SpectroGraphic(IMAGE, **cli.synthesis_params(args)).save(file)
+    return file.getvalue()
+
+
+def wait_until(condition, timeout: float = 10):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+def test_render_streams_the_wav_file(server):
+    status, headers, body = request(
+        server,
+        "POST",
+        "/render?duration=2&resolution=40&normalization=bound",
+        IMAGE.read_bytes(),
+    )
+
+    assert status == 200
+    assert headers["Transfer-Encoding"] == "chunked"
+    assert body == expected_wav(
+        ["--duration", "2", "--resolution", "40", "--normalization", "bound"]
+    )
+
+    with wave.open(io.BytesIO(body)) as wav:
+        sg = SpectroGraphic(IMAGE, height=40, duration=2)
+        assert wav.getnframes() == sg.NUM_SAMPLES
+        assert wav.getframerate() == sg.SAMPLE_RATE
+
+
+@pytest.mark.parametrize(
+    "path,body,headers",
+    [
+        ("/render?bogus=1", None, None),
+        ("/render?duration=abc", None, None),
+        ("/render?engine=nope", None, None),
+        ("/render?duration=1", b"not an image", None),
+        ("/render", None, {"Content-Length": "abc"}),
+        ("/render", None, {"Content-Length": "-1"}),
+    ],
+)
+def test_bad_requests(server, capsys, path, body, headers):
+    body = IMAGE.read_bytes() if body is None else body
+    headers = dict({"Content-Length": str(len(body))}, **(headers or {}))
+
+    status, _, response = request(server, "POST", path, body, headers)
+
+    assert status == 400
+    assert "error" in json.loads(response)
+    assert "usage:" not in capsys.readouterr().err
+
+
+def test_unknown_path(server):
+    assert request(server, "GET", "/nothing")[0] == 404
+    assert request(server, "POST", "/nothing", b"")[0] == 404
+
+
+def test_full_queue_is_rejected(server, service):
+    image = IMAGE.read_bytes()
+
+    def submit(duration: str):
+        params = synthesis_params(dict(duration=duration, resolution="40"))
+        return service.submit(image, params)
+
+    # nobody reads the first render, so it stalls in the worker,
+    # and the second one waits in the queue
+    running, first = submit("30")
+    wait_until(lambda: service.running == 1)
+    queued, second = submit("31")
+
+    with pytest.raises(QueueFull):
+        submit("32")
+    status, headers, _ = request(server, "POST", "/render?duration=33", image)
+    assert status == 503
+    assert headers["Retry-After"] == "1"
+
+    running.leave(first)
+    queued.leave(second)
+    wait_until(lambda: service.running == 0 and service.queued == 0)
+
+    metrics = json.loads(request(server, "GET", "/metrics")[2])
+    assert metrics["rejected"] == 2
+    assert metrics["cancelled"] == 2
+    assert metrics["in_flight"] == 0
+
+
+def test_identical_requests_share_a_render(server, service):
+    query = dict(duration="3", resolution="40", normalization="bound")
+    path = "/render?" + urlencode(query)
+    image = IMAGE.read_bytes()
+
+    # the render cannot get past its first chunk until both have joined
+    render, client = service.submit(image, synthesis_params(query))
+    wait_until(lambda: service.running == 1)
+
+    responses = []
+    threads = [
+        threading.Thread(
+            target=lambda: responses.append(request(server, "POST", path, image))
+        )
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: service.counters["coalesced"] == 2)
+    render.leave(client)
+    for thread in threads:
+        thread.join()
+
+    expected = expected_wav(
+        ["--duration", "3", "--resolution", "40", "--normalization", "bound"]
+    )
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert all(body == expected for _, _, body in responses)
+
+    metrics = json.loads(request(server, "GET", "/metrics")[2])
+    assert metrics["requests"] == 3
+    assert metrics["coalesced"] == 2
+    assert metrics["completed"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["latency_p50"] is not None
+
+
+def test_stalled_client_is_dropped_from_a_shared_render():
+    service = RenderService(workers=1, max_ahead=1, client_timeout=0.2)
+    query = dict(duration="3", resolution="40", normalization="bound")
+    image = IMAGE.read_bytes()
+
+    render, stalled = service.submit(image, synthesis_params(query))
+    same, reader = service.submit(image, synthesis_params(query))
+    assert same is render
+
+    # the render holds back for the stalled client, then drops it
+    body = b"".join(render.read(reader))
+    render.leave(reader)
+    assert body == expected_wav(
+        ["--duration", "3", "--resolution", "40", "--normalization", "bound"]
+    )
+
+    with pytest.raises(SlowClient):
+        list(render.read(stalled))
+    render.leave(stalled)
+
+    wait_until(lambda: service.running == 0)
+    assert service.metrics["dropped"] == 1
+    assert service.metrics["completed"] == 1
+    service.close()
+
+
+def test_stalled_upload_is_dropped(server, service):
+    service.client_timeout = 0.5
+    connection = socket.create_connection(server.server_address[:2], timeout=10)
+    try:
+        connection.sendall(
+            b"POST /render HTTP/1.1\r\nContent-Length: 1000\r\n\r\nonly a bit"
+        )
+        start = time.perf_counter()
+        assert connection.recv(1024) == b""
+        assert time.perf_counter() - start < 5
+    finally:
+        connection.close()
+
+    assert request(server, "GET", "/metrics")[0] == 200
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import io
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from spectrographic import cli
+from spectrographic.base import SpectroGraphic
+from spectrographic.writers import (
+    FlacWriter,
+    RawWriter,
+    WavWriter,
+    open_writer,
+    output_format,
+)
+
+__author__ = "Levi Borodenko"
+__copyright__ = "Levi Borodenko"
+__license__ = "mit"
+
+
+IMAGE = Path(__file__).resolve().parent.parent / "examples" / "happy.png"
+
+SAMPLES = np.random.default_rng(0).integers(-32768, 32768, 1000).astype(np.int16)
+
+
+class Pipe(io.BytesIO):
+    """In-memory file that cannot seek, like a pipe."""
+
+    def seekable(self):
+        return False
+
+
+def write_blocks(writer, samples: np.ndarray, block: int = 300):
+    with writer:
+        for start in range(0, len(samples), block):
+            writer.write(samples[start : start + block])
+
+
+def read_wav(data: bytes):
+    """Sample rate and samples of a .wav file."""
+    with wave.open(io.BytesIO(data)) as wav:
+        assert (wav.getnchannels(), wav.getsampwidth()) == (1, 2)
+        frames = wav.readframes(wav.getnframes())
+        assert len(frames) == 2 * wav.getnframes()
+        return wav.getframerate(), np.frombuffer(frames, dtype="<i2")
+
+
+@pytest.mark.parametrize("file_class", [io.BytesIO, Pipe])
+def test_wav_matches_the_wave_module(file_class):
+    file = file_class()
+    write_blocks(WavWriter(file, 22050, num_samples=len(SAMPLES)), SAMPLES)
+
+    expected = io.BytesIO()
+    with wave.open(expected, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(22050)
+        wav.writeframes(SAMPLES.astype("<i2").tobytes())
+
+    assert file.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("num_samples", [None, 2 * len(SAMPLES)])
+def test_short_write_to_a_seekable_file_patches_the_header(num_samples):
+    file = io.BytesIO()
+    write_blocks(WavWriter(file, 8000, num_samples=num_samples), SAMPLES)
+
+    sample_rate, samples = read_wav(file.getvalue())
+    assert sample_rate == 8000
+    assert np.array_equal(samples, SAMPLES)
+
+
+def test_short_write_to_a_non_seekable_file_raises():
+    writer = WavWriter(Pipe(), 8000, num_samples=2 * len(SAMPLES))
+    with pytest.raises(ValueError):
+        write_blocks(writer, SAMPLES)
+
+    # the error that cut the sound short wins
+    writer = WavWriter(Pipe(), 8000, num_samples=2 * len(SAMPLES))
+    with pytest.raises(KeyboardInterrupt):
+        with writer:
+            writer.write(SAMPLES)
+            raise KeyboardInterrupt
+
+
+def test_raw_is_little_endian_16_bit_pcm():
+    file = io.BytesIO()
+    write_blocks(RawWriter(file, 8000), SAMPLES.astype(np.float64))
+
+    assert file.getvalue() == SAMPLES.astype("<i2").tobytes()
+
+
+@pytest.mark.parametrize(
+    "file,format,expected",
+    [
+        ("sound.wav", None, "wav"),
+        ("sound.FLAC", None, "flac"),
+        ("sound.pcm", None, "raw"),
+        ("sound.ogg", None, "wav"),
+        ("-", None, "wav"),
+        (io.BytesIO(), None, "wav"),
+        ("sound.wav", "raw", "raw"),
+        ("sound.flac", "wav", "wav"),
+    ],
+)
+def test_output_format(file, format, expected):
+    assert output_format(file, format) == expected
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        output_format("sound.wav", "mp3")
+
+
+@pytest.mark.parametrize(
+    "name,format,expected",
+    [
+        ("sound.raw", None, "raw"),
+        ("sound.wav", "raw", "raw"),
+        ("sound.raw", "wav", "wav"),
+        (None, "raw", "raw"),
+    ],
+)
+def test_format_option_beats_the_suffix(tmp_path, monkeypatch, name, format, expected):
+    monkeypatch.chdir(tmp_path)
+    args = ["--image", str(IMAGE), "--duration", "1", "--resolution", "20"]
+    if name is not None:
+        args += ["--save", name]
+    if format is not None:
+        args += ["--format", format]
+    cli.main(args)
+
+    sg = SpectroGraphic(IMAGE, **cli.synthesis_params(cli.parse_args(args)))
+    data = Path(name or "SoundGraphic.raw").read_bytes()
+    if expected == "raw":
+        assert data == sg.sound_array.astype("<i2").tobytes()
+    else:
+        assert np.array_equal(read_wav(data)[1], sg.sound_array)
+
+
+def test_flac_round_trip(tmp_path):
+    soundfile = pytest.importorskip("soundfile")
+    path = tmp_path / "sound.flac"
+
+    write_blocks(open_writer(path, 8000, len(SAMPLES)), SAMPLES)
+
+    samples, sample_rate = soundfile.read(path, dtype="int16")
+    assert sample_rate == 8000
+    assert np.array_equal(samples, SAMPLES)
+
+
+def test_flac_needs_a_seekable_file():
+    pytest.importorskip("soundfile")
+    with pytest.raises(ValueError):
+        FlacWriter(Pipe(), 8000)